@@ -3,3 +3,14 @@
 from django.contrib import admin
 
 # Register your models here.
+from .models import AnnotationSet, Annotation
+
+@admin.register(AnnotationSet)
+class AnnotationSetAdmin(admin.ModelAdmin):
+    list_display = ('file_path', 'version', 'updated_at')
+    search_fields = ('file_path',)
+
+@admin.register(Annotation)
+class AnnotationAdmin(admin.ModelAdmin):
+    list_display = ('annotation_set', 'sequence', 'start_index', 'end_index', 'label', 'color')
+    list_filter = ('label',)
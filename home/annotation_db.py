@@ -0,0 +1,257 @@
+
+# home/annotation_db.py
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from .models import AnnotationSet, Annotation
+from .annotation_journal import annotation_key, annotation_row, write_annotation_csv, StaleAnnotationVersion
+from .annotation_index import NAT_NS, boundaries_to_epoch_ns
+from .series_store import to_epoch_ns
+
+# Setup logger
+logger = logging.getLogger('home')
+
+BULK_CREATE_BATCH_SIZE = 2000
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+def _epoch_ns_to_datetime(epoch_ns: int):
+    # Microsecond precision, the precision of the DateTimeFields
+    return None if epoch_ns == NAT_NS else EPOCH + timedelta(microseconds=int(epoch_ns) // 1000)
+
+def parse_boundaries(values: list, tz: str = None) -> list:
+    """
+    Parses annotation boundaries ('2024-01-01T00:00:00+00:00' or with a space) for the ranged indexes,
+    as the interval index does (see home.annotation_index.boundaries_to_epoch_ns).
+
+    Parameters:
+    - values (list[str]): The boundaries.
+    - tz (str, optional): Time zone of the data of the file, naive boundaries are wall clock times of it
+                          (UTC by default, i.e. naive data).
+
+    Returns:
+    - list[datetime | None]: Aware datetimes, None for the values that are not timestamps.
+    """
+    return [_epoch_ns_to_datetime(epoch_ns) for epoch_ns in boundaries_to_epoch_ns(list(values), tz)]
+
+def parse_boundary(value: str, tz: str = None):
+    return parse_boundaries([value], tz)[0]
+
+def _range_bound(value, tz: str = None):
+    # Bound of a ranged query: a datetime, pd.Timestamp or ISO string, naive ones taken in tz like the boundaries
+    return None if value is None else _epoch_ns_to_datetime(to_epoch_ns(value, tz or 'UTC'))
+
+def _new_annotations(annotation_set: AnnotationSet, annotations: list[dict], tz: str = None) -> list[Annotation]:
+    rows = [annotation_row(annotation) for annotation in annotations]
+    start_times = parse_boundaries([row[0] for row in rows], tz)
+    end_times = parse_boundaries([row[1] for row in rows], tz)
+    new_rows = []
+    for (start_index, end_index, label, color), start_time, end_time in zip(rows, start_times, end_times):
+        new_rows.append(Annotation(annotation_set=annotation_set, sequence=annotation_set.next_sequence,
+                                   start_index=start_index, end_index=end_index,
+                                   start_time=start_time, end_time=end_time,
+                                   label=label, color=color))
+        annotation_set.next_sequence += 1
+    return new_rows
+
+def _locked_annotation_set(relative_file_path: str, expected_version: int = None) -> AnnotationSet:
+    # Must run inside transaction.atomic(): concurrent edits of the same file wait for each other
+    annotation_set, _ = AnnotationSet.objects.select_for_update().get_or_create(file_path=relative_file_path)
+    if expected_version is not None and int(expected_version) != annotation_set.version:
+        raise StaleAnnotationVersion(relative_file_path, int(expected_version), annotation_set.version)
+    return annotation_set
+
+def _bump_version(annotation_set: AnnotationSet):
+    annotation_set.version += 1
+    annotation_set.save(update_fields=['version', 'next_sequence', 'updated_at'])
+
+def _with_positions(queryset):
+    """
+    Annotates each row with its item number (1-based position in sequence order within its set),
+    counted on the (annotation_set, sequence) index, so it stays right when only a range of rows is selected.
+    """
+    earlier_rows = (Annotation.objects
+                    .filter(annotation_set=OuterRef('annotation_set'), sequence__lte=OuterRef('sequence'))
+                    .order_by().values('annotation_set').annotate(count=Count('id')).values('count'))
+    return queryset.annotate(position=Subquery(earlier_rows))
+
+def _as_dict(item_number, annotation: Annotation) -> dict:
+    return {
+        'Item Number': str(item_number),
+        'Start Index': annotation.start_index,
+        'End Index': annotation.end_index,
+        'Label': annotation.label,
+        'Color': annotation.color,
+    }
+
+def add_annotations(relative_file_path: str, annotations: list[dict], tz: str = None) -> list[dict]:
+    """
+    Parameters:
+    - tz (str, optional): Time zone of the data of the file, see parse_boundaries.
+
+    Returns:
+    - list[dict]: The added annotations, with their 'Item Number'.
+    """
+    with transaction.atomic():
+        annotation_set = _locked_annotation_set(relative_file_path)
+        new_rows = Annotation.objects.bulk_create(_new_annotations(annotation_set, annotations, tz), batch_size=BULK_CREATE_BATCH_SIZE)
+        _bump_version(annotation_set)
+        first_item_number = annotation_set.annotations.count() - len(new_rows) + 1
+    return [_as_dict(item_number, annotation) for item_number, annotation in enumerate(new_rows, start=first_item_number)]
+
+def replace_annotations(relative_file_path: str, annotations: list[dict], tz: str = None):
+    """
+    Replaces every annotation of the file at once (auto labeling), in one transaction with bulk inserts.
+    """
+    with transaction.atomic():
+        annotation_set = _locked_annotation_set(relative_file_path)
+        annotation_set.annotations.all().delete()
+        Annotation.objects.bulk_create(_new_annotations(annotation_set, annotations, tz), batch_size=BULK_CREATE_BATCH_SIZE)
+        _bump_version(annotation_set)
+    logger.info(f"Stored {len(annotations)} annotations for {relative_file_path} in the database.")
+
+def delete_annotations(relative_file_path: str, delete_data: list[dict], expected_version: int = None) -> int:
+    """
+    Deletes the annotations matching every field of a delete_data item (its 'Item Number' included),
+    each item deleting at most one row.
+
+    Returns:
+    - int: The number of annotations deleted.
+    """
+    with transaction.atomic():
+        annotation_set = _locked_annotation_set(relative_file_path, expected_version)
+        pending = Counter(tuple(annotation_key(item)) for item in delete_data)
+        candidates = _with_positions(annotation_set.annotations.filter(
+            start_index__in={key[1] for key in pending}, label__in={key[3] for key in pending}))
+        deleted_ids = []
+        for annotation in candidates:
+            key = (str(annotation.position), annotation.start_index, annotation.end_index, annotation.label, annotation.color)
+            if pending[key] > 0:
+                pending[key] -= 1
+                deleted_ids.append(annotation.id)
+        if deleted_ids:
+            Annotation.objects.filter(id__in=deleted_ids).delete()
+            _bump_version(annotation_set)
+    return len(deleted_ids)
+
+def apply_annotation_batch(relative_file_path: str, record: dict, expected_version: int = None, tz: str = None) -> dict:
+    """
+    Applies a 'batch' record (see home.annotation_journal.batch_record) in one transaction:
+    one bulk delete, one bulk update, one bulk insert and a single version bump.
+    Naive boundaries are wall clock times of tz, the time zone of the data (see parse_boundaries).
+
+    Returns:
+    - dict: The number of annotations 'added', 'deleted' and 'updated'.
+    """
+    with transaction.atomic():
+        annotation_set = _locked_annotation_set(relative_file_path, expected_version)
+        deletes = Counter(tuple(key) for key in record['delete'])
+        updates = {}
+        for key, new_row in record['update']:
+            updates.setdefault(tuple(key), []).append(new_row)
+        deleted_ids, updated_rows = [], []
+        if deletes or updates:
+            for position, annotation in enumerate(annotation_set.annotations.order_by('sequence'), start=1):
+                key = (str(position), annotation.start_index, annotation.end_index, annotation.label, annotation.color)
+                if deletes[key] > 0:
+                    deletes[key] -= 1
+                    deleted_ids.append(annotation.id)
+                elif updates.get(key):
+                    start_index, end_index, label, color = updates[key].pop(0)
+                    annotation.start_index, annotation.end_index, annotation.label, annotation.color = start_index, end_index, label, color
+                    annotation.start_time, annotation.end_time = parse_boundaries([start_index, end_index], tz)
+                    updated_rows.append(annotation)
+        if deleted_ids:
+            Annotation.objects.filter(id__in=deleted_ids).delete()
+        if updated_rows:
+            Annotation.objects.bulk_update(updated_rows, ['start_index', 'end_index', 'start_time', 'end_time', 'label', 'color'],
+                                           batch_size=BULK_CREATE_BATCH_SIZE)
+        added_rows = [dict(zip(['Start Index', 'End Index', 'Label', 'Color'], row)) for row in record['add']]
+        if added_rows:
+            Annotation.objects.bulk_create(_new_annotations(annotation_set, added_rows, tz), batch_size=BULK_CREATE_BATCH_SIZE)
+        if deleted_ids or updated_rows or added_rows:
+            _bump_version(annotation_set)
+    return {'added': len(added_rows), 'deleted': len(deleted_ids), 'updated': len(updated_rows)}
+
+def refresh_annotations(relative_file_path: str, expected_version: int = None):
+    with transaction.atomic():
+        annotation_set = _locked_annotation_set(relative_file_path, expected_version)
+        annotation_set.annotations.all().delete()
+        _bump_version(annotation_set)
+
+def retrieve_annotations(relative_file_path: str, start_time=None, end_time=None, tz: str = None) -> list[dict]:
+    """
+    Retrieves the annotations of a file, in the format of retrieve_existing_annotations.
+
+    Parameters:
+    - relative_file_path (str): Data file path relative to MEDIA_ROOT.
+    - start_time, end_time (datetime | str, optional): Only the annotations overlapping this range are returned
+                                                       (ranged query on the (annotation_set, start_time) index).
+    - tz (str, optional): Time zone of the data of the file: naive bounds are wall clock times of it, as the
+                          boundaries (same range as AnnotationIndex.overlapping).
+
+    Returns:
+    - list[dict]: 'Item Number', 'Start Index', 'End Index', 'Label' and 'Color' of each annotation.
+    """
+    annotations = Annotation.objects.filter(annotation_set__file_path=relative_file_path).order_by('sequence')
+    if start_time is None and end_time is None:
+        return [_as_dict(item_number, annotation) for item_number, annotation in enumerate(annotations, start=1)]
+    start_time, end_time = _range_bound(start_time, tz), _range_bound(end_time, tz)
+    if end_time is not None:
+        annotations = annotations.filter(start_time__lte=end_time)
+    if start_time is not None:
+        annotations = annotations.filter(end_time__gte=start_time)
+    return [_as_dict(annotation.position, annotation) for annotation in _with_positions(annotations)]
+
+def find_annotations(label: str = None, start_time=None, end_time=None, file_path_prefix: str = None, tz: str = None) -> list[dict]:
+    """
+    Cross-file query: the annotations with a label and/or overlapping a time range, in every matching file
+    (naive bounds are taken in tz, UTC by default).
+
+    Returns:
+    - list[dict]: Same keys as retrieve_annotations, plus 'File-path'.
+    """
+    annotations = Annotation.objects.select_related('annotation_set')
+    if label is not None:
+        annotations = annotations.filter(label=label)
+    start_time, end_time = _range_bound(start_time, tz), _range_bound(end_time, tz)
+    if end_time is not None:
+        annotations = annotations.filter(start_time__lte=end_time)
+    if start_time is not None:
+        annotations = annotations.filter(end_time__gte=start_time)
+    if file_path_prefix:
+        annotations = annotations.filter(annotation_set__file_path__startswith=file_path_prefix)
+    return [{**_as_dict(annotation.position, annotation), 'File-path': annotation.annotation_set.file_path}
+            for annotation in _with_positions(annotations)]
+
+def current_annotation_version(relative_file_path: str) -> int:
+    """
+    Returns:
+    - int: The AnnotationSet version clients must send with their edits (see StaleAnnotationVersion).
+    """
+    return AnnotationSet.objects.filter(file_path=relative_file_path).values_list('version', flat=True).first() or 0
+
+def annotation_set_version(relative_file_path: str) -> str:
+    return f"db-{current_annotation_version(relative_file_path)}"
+
+def annotation_set_versions(file_path_prefix: str = '') -> dict[str, str]:
+    """
+    Returns:
+    - dict[str, str]: {file path: annotation_set_version} of every annotated file under the prefix, in one query.
+    """
+    return {file_path: f"db-{version}" for file_path, version in
+            AnnotationSet.objects.filter(file_path__startswith=file_path_prefix).values_list('file_path', 'version')}
+
+def export_annotations_to_csv(relative_file_path: str, csv_file_path) -> int:
+    """
+    Writes the annotations of a file to a CSV file, in the format of the working/saving CSV files.
+
+    Returns:
+    - int: The number of annotations exported.
+    """
+    rows = [[annotation.start_index, annotation.end_index, annotation.label, annotation.color]
+            for annotation in Annotation.objects.filter(annotation_set__file_path=relative_file_path).order_by('sequence')]
+    write_annotation_csv(csv_file_path, rows)
+    return len(rows)
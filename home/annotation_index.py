@@ -0,0 +1,199 @@
+
+# home/annotation_index.py
+import numpy as np
+import pandas as pd
+from .series_store import to_epoch_ns
+
+NAT_NS = np.iinfo(np.int64).min  # pd.NaT as epoch ns (boundaries that are not timestamps)
+
+def boundaries_to_epoch_ns(values: list, tz: str = None) -> np.ndarray:
+    """
+    Vectorized conversion of annotation boundaries (ISO strings) to int64 epoch ns, naive ones taken in
+    the tz time zone (UTC by default, i.e. the wall clock of naive data). Values that are not timestamps
+    become NAT_NS.
+    """
+    if len(values) == 0:
+        return np.empty(0, dtype=np.int64)
+    values = pd.Index(values, dtype=object)
+    if not tz or tz == 'UTC':
+        timestamps = pd.to_datetime(values, utc=True, format='ISO8601', errors='coerce')
+        return np.asarray(timestamps.as_unit('ns').asi8, dtype=np.int64)
+    # Boundaries with an offset are absolute, naive ones (e.g. plotly clicks) are wall clock times of tz
+    aware = np.asarray(values.str.contains(r'(?:Z|[+-]\d{2}:?\d{2})$', regex=True, na=False), dtype=bool)
+    epoch_ns = np.full(len(values), NAT_NS, dtype=np.int64)
+    if aware.any():
+        epoch_ns[aware] = pd.to_datetime(values[aware], utc=True, format='ISO8601', errors='coerce').as_unit('ns').asi8
+    if not aware.all():
+        naive_timestamps = pd.to_datetime(values[~aware], format='ISO8601', errors='coerce')
+        epoch_ns[~aware] = naive_timestamps.tz_localize(tz, ambiguous='NaT', nonexistent='NaT').as_unit('ns').asi8
+    return epoch_ns
+
+class AnnotationIndex:
+    """
+    Interval index over the annotations of one file, for viewport queries, click hit-testing and gap search.
+
+    The [start, end] epoch ns of each annotation are kept in item order, so add, delete, undo and redo update
+    them without reparsing the other annotations (append, np.delete, np.insert, assignment, slice). The sorted
+    views (starts sorted, running maximum of the ends, union of the covered ranges) are rebuilt lazily with
+    numpy after an edit, then every query is a few binary searches: O(log n + k) for non-nested annotations.
+    The arrays are never modified in place, so copy() gives a consistent snapshot for free.
+
+    tz is the time zone naive boundaries are read in: the time zone of the data of the file (plotly clicks on
+    a tz-aware x axis are naive wall clock times), None for UTC (naive data). Query bounds take the same tz.
+    """
+
+    def __init__(self, starts_ns: np.ndarray = None, ends_ns: np.ndarray = None, tz: str = None):
+        starts_ns = np.empty(0, dtype=np.int64) if starts_ns is None else np.asarray(starts_ns, dtype=np.int64)
+        ends_ns = np.empty(0, dtype=np.int64) if ends_ns is None else np.asarray(ends_ns, dtype=np.int64)
+        # Clicks are sorted, but an annotation could still have been written end first
+        self.starts = np.minimum(starts_ns, ends_ns)
+        self.ends = np.maximum(starts_ns, ends_ns)
+        self.tz = None if tz in (None, 'UTC') else tz
+        self._sorted = None
+        self._unions = {}
+
+    @classmethod
+    def from_rows(cls, rows: list[list[str]], tz: str = None) -> 'AnnotationIndex':
+        """
+        Builds the index from [Start Index, End Index, ...] rows (see home.annotation_journal), naive
+        boundaries taken in the tz time zone (UTC by default).
+        """
+        return cls(boundaries_to_epoch_ns([row[0] for row in rows], tz), boundaries_to_epoch_ns([row[1] for row in rows], tz), tz)
+
+    @classmethod
+    def from_annotations(cls, annotations: list[dict], tz: str = None) -> 'AnnotationIndex':
+        return cls.from_rows([[item['Start Index'], item['End Index']] for item in annotations], tz)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def copy(self) -> 'AnnotationIndex':
+        snapshot = AnnotationIndex.__new__(AnnotationIndex)
+        snapshot.starts, snapshot.ends, snapshot.tz = self.starts, self.ends, self.tz
+        snapshot._sorted, snapshot._unions = self._sorted, self._unions
+        return snapshot
+
+    def _replace(self, starts_ns: np.ndarray, ends_ns: np.ndarray):
+        self.starts, self.ends = starts_ns, ends_ns
+        self._sorted = None
+        self._unions = {}
+
+    def append(self, rows: list[list[str]], tz: str = None):
+        """
+        Appends the annotations of the rows (naive boundaries taken in tz, the index time zone by default).
+        """
+        added = AnnotationIndex.from_rows(rows, tz or self.tz)
+        self._replace(np.concatenate([self.starts, added.starts]), np.concatenate([self.ends, added.ends]))
+
+    def remove(self, positions: list[int]):
+        """
+        Removes the annotations at these 0-based item positions (the following ones move up).
+        """
+        self._replace(np.delete(self.starts, positions), np.delete(self.ends, positions))
+
+    def update(self, positions: list[int], rows: list[list[str]], tz: str = None):
+        """
+        Replaces the boundaries of the annotations at these 0-based item positions by those of the new rows
+        (naive boundaries taken in tz, the index time zone by default).
+        """
+        updated = AnnotationIndex.from_rows(rows, tz or self.tz)
+        starts_ns, ends_ns = self.starts.copy(), self.ends.copy()
+        starts_ns[positions], ends_ns[positions] = updated.starts, updated.ends
+        self._replace(starts_ns, ends_ns)
+
+    def insert(self, positions: list[int], rows: list[list[str]], tz: str = None):
+        """
+        Inserts the annotations of the rows so that they end up at these 0-based item positions (ascending),
+        naive boundaries taken in tz (the index time zone by default).
+        """
+        inserted = AnnotationIndex.from_rows(rows, tz or self.tz)
+        before = np.asarray(positions, dtype=np.int64) - np.arange(len(positions))  # Positions in the current arrays
+        self._replace(np.insert(self.starts, before, inserted.starts), np.insert(self.ends, before, inserted.ends))
+
+    def pop(self, count: int = 1):
+        self._replace(self.starts[:len(self.starts) - count], self.ends[:len(self.ends) - count])
+
+    def clear(self):
+        self._replace(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    def _sorted_view(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns:
+        - tuple: (order, sorted_starts, running_max_ends) over the annotations with valid boundaries.
+        """
+        if self._sorted is None:
+            valid_positions = np.flatnonzero((self.starts != NAT_NS) & (self.ends != NAT_NS))
+            order = valid_positions[np.argsort(self.starts[valid_positions], kind='stable')]
+            running_max_ends = np.maximum.accumulate(self.ends[order]) if len(order) else np.empty(0, dtype=np.int64)
+            self._sorted = (order, self.starts[order], running_max_ends)
+        return self._sorted
+
+    def _union(self, join_ns: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+        - tuple: (starts, ends) of the disjoint covered ranges, sorted; annotations at most join_ns apart are joined.
+        """
+        if join_ns not in self._unions:
+            _, sorted_starts, running_max_ends = self._sorted_view()
+            if len(sorted_starts) == 0:
+                self._unions[join_ns] = (sorted_starts, running_max_ends)
+            else:
+                # A new covered range starts where an annotation begins after everything before it ended
+                new_range = np.empty(len(sorted_starts), dtype=bool)
+                new_range[0] = True
+                new_range[1:] = sorted_starts[1:] - running_max_ends[:-1] > join_ns
+                range_starts = np.flatnonzero(new_range)
+                range_ends = np.append(range_starts[1:], len(sorted_starts)) - 1
+                self._unions[join_ns] = (sorted_starts[range_starts], running_max_ends[range_ends])
+        return self._unions[join_ns]
+
+    def overlapping(self, start, end, tz: str = None) -> np.ndarray:
+        """
+        Annotations overlapping [start, end] (both included), e.g. the visible window.
+
+        Parameters:
+        - start, end: Timestamp-like bounds (see home.series_store.to_epoch_ns), None for an open bound.
+        - tz (str, optional): Time zone of naive bounds, the index time zone by default.
+
+        Returns:
+        - np.ndarray: Their 0-based item positions, in item order.
+        """
+        tz = tz or self.tz or 'UTC'
+        order, sorted_starts, running_max_ends = self._sorted_view()
+        last = len(order) if end is None else int(np.searchsorted(sorted_starts, to_epoch_ns(end, tz), side='right'))
+        if start is None:
+            return np.sort(order[:last])
+        start_ns = to_epoch_ns(start, tz)
+        # Every annotation before 'first' ended before start (running maximum of the ends)
+        first = int(np.searchsorted(running_max_ends, start_ns, side='left'))
+        candidates = order[first:last]
+        return np.sort(candidates[self.ends[candidates] >= start_ns])
+
+    def hit(self, timestamp, tz: str = None) -> np.ndarray:
+        """
+        Annotations under a clicked timestamp, in item order (the last one is drawn on top).
+        """
+        return self.overlapping(timestamp, timestamp, tz)
+
+    def next_gap(self, after, join_ns: int = 0, tz: str = None) -> tuple[int, int | None]:
+        """
+        First unlabelled stretch at or after a timestamp.
+
+        Parameters:
+        - after: Timestamp-like value where the search starts.
+        - join_ns (int): Annotations separated by at most this much are contiguous (e.g. the sampling interval,
+                         auto-labeled ranges end one row before the next one starts).
+        - tz (str, optional): Time zone of a naive 'after', the index time zone by default.
+
+        Returns:
+        - tuple[int, int | None]: (gap_start_ns, gap_end_ns) in epoch ns; gap_end_ns (the start of the next annotation)
+                                  is None when nothing is annotated after the gap. gap_start_ns is 'after' itself
+                                  when it is not annotated, else the end of the annotations covering it.
+        """
+        after_ns = to_epoch_ns(after, tz or self.tz or 'UTC')
+        range_starts, range_ends = self._union(int(join_ns))
+        current = int(np.searchsorted(range_starts, after_ns, side='right')) - 1
+        next_start = int(range_starts[current + 1]) if current + 1 < len(range_starts) else None
+        if current >= 0 and range_ends[current] >= after_ns:
+            return int(range_ends[current]), next_start
+        return after_ns, next_start
@@ -0,0 +1,758 @@
+
+# home/annotation_journal.py
+import os
+import csv
+import json
+import time
+import logging
+import tempfile
+import threading
+import traceback
+from pathlib import Path
+from collections import Counter, OrderedDict, deque
+from django.conf import settings  # Import Django settings
+from .annotation_index import AnnotationIndex
+
+try:
+    import fcntl  # Advisory file locks (Linux, macOS)
+except ImportError:
+    fcntl = None
+    import msvcrt  # Windows
+
+# Setup logger
+logger = logging.getLogger('home')
+
+ANNOTATION_HEADERS = ['Item Number', 'Start Index', 'End Index', 'Label', 'Color']
+DEFAULT_ANNOTATION_COLOR = '#d604a2'
+JOURNAL_SUFFIX = '.journal'
+VERSION_SUFFIX = '.version'  # Annotation version of the CSV file, written when a journal is folded into it
+LOCK_SUFFIX = '.lock'
+FSYNC_WRITES = getattr(settings, 'ANNOTATION_JOURNAL_FSYNC', True)  # Durable appends and flushes (survive a power loss)
+UNDO_DEPTH = getattr(settings, 'ANNOTATION_UNDO_DEPTH', 100)  # Edits that can be undone per file
+
+def journal_path_for(working_csv_file_path) -> Path:
+    """
+    Path of the operation journal of a working CSV file (next to it, e.g. 'my_data.journal').
+    """
+    return Path(working_csv_file_path).with_suffix(JOURNAL_SUFFIX)
+
+class StaleAnnotationVersion(Exception):
+    """
+    Raised when an edit was made against an older annotation version than the current one
+    (another tab, user or worker edited the file since the client last received its annotations).
+    """
+
+    def __init__(self, file_path, expected_version: int, current_version: int):
+        super().__init__(f"Annotations of {file_path} are at version {current_version}, the edit was made on version {expected_version}.")
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+class AnnotationFileLock:
+    """
+    Per-file lock serializing the edits of one working file across threads (RLock) and processes
+    (advisory lock on '<file>.lock': fcntl.flock, or msvcrt.locking on Windows), so several Daphne
+    workers can serve the same files. Reentrant within a thread.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = Path(lock_path)
+        self._thread_lock = threading.RLock()
+        self._lock_file = None
+        self._depth = 0
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            if self._depth == 0:
+                if self._lock_file is None:
+                    self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+                    self._lock_file = open(self.lock_path, mode='a+b')
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    self._lock_file.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue  # LK_LOCK gives up after 10 seconds
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    self._lock_file.seek(0)
+                    msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._thread_lock.release()
+
+    def close(self):
+        with self._thread_lock:
+            if self._depth == 0 and self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+def read_version_file(version_path) -> int:
+    try:
+        with open(version_path, mode='r') as version_file:
+            return int(version_file.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def write_version_file(version_path, annotation_version: int):
+    version_path = Path(version_path)
+    file_descriptor, temp_file_path = tempfile.mkstemp(dir=version_path.parent, prefix=version_path.stem, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, mode='w') as temp_file:
+            temp_file.write(str(annotation_version))
+        os.replace(temp_file_path, version_path)
+    except BaseException:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+
+def file_version(file_path) -> str:
+    """
+    Returns:
+    - str: 'mtime_ns-size' of the file, or '' if it does not exist.
+    """
+    try:
+        stat_result = os.stat(file_path)
+        return f"{stat_result.st_mtime_ns}-{stat_result.st_size}"
+    except OSError:
+        return ''
+
+def _cell(value) -> str:
+    # Same text as csv.writer would store for the value
+    return '' if value is None else str(value)
+
+def annotation_row(annotation: dict) -> list[str]:
+    """
+    Converts an annotation dictionary to the [Start Index, End Index, Label, Color] row stored in the view.
+    """
+    return [_cell(annotation.get('Start Index', '')),
+            _cell(annotation.get('End Index', '')),
+            _cell(annotation.get('Label', '')),
+            _cell(annotation.get('Color', DEFAULT_ANNOTATION_COLOR))]
+
+def annotation_key(annotation: dict) -> list[str]:
+    """
+    [Item Number, Start Index, End Index, Label, Color] of an annotation, identifying it for deletes and updates.
+    """
+    return [_cell(annotation['Item Number'])] + annotation_row(annotation)
+
+def batch_record(operations: list[dict]) -> dict:
+    """
+    Validates a list of edit operations and converts it to one 'batch' journal record.
+
+    Parameters:
+    - operations (list[dict]): Each one is
+        - {'op': 'add', 'annotation': {...}}: new annotation ('Start Index', 'End Index', 'Label', 'Color').
+        - {'op': 'delete', 'annotation': {...}}: existing annotation, 'Item Number' included (all fields must match).
+        - {'op': 'update', 'annotation': {...}, 'changes': {...}}: existing annotation and the fields to change.
+
+    Returns:
+    - dict: {'op': 'batch', 'delete': [key, ...], 'update': [[key, new row], ...], 'add': [row, ...]}.
+
+    Raises:
+    - ValueError: For an unknown operation or a missing field, before anything is applied.
+    """
+    record = {'op': 'batch', 'delete': [], 'update': [], 'add': []}
+    for operation in operations:
+        kind = operation.get('op') if isinstance(operation, dict) else None
+        annotation = operation.get('annotation') if kind else None
+        if kind not in ('add', 'delete', 'update') or not isinstance(annotation, dict):
+            raise ValueError(f"Invalid annotation batch operation: {operation}")
+        try:
+            if kind == 'add':
+                record['add'].append(annotation_row(annotation))
+            elif kind == 'delete':
+                record['delete'].append(annotation_key(annotation))
+            else:
+                record['update'].append([annotation_key(annotation), annotation_row({**annotation, **operation.get('changes', {})})])
+        except KeyError as missing_field:
+            raise ValueError(f"Annotation batch operation without {missing_field}: {operation}")
+    return record
+
+def _splice(rows: list[list[str]], record: dict, index: AnnotationIndex = None, undo_log: list = None) -> dict:
+    """
+    Positional edit: removes the rows at the 0-based positions 'remove' (ascending), then replaces the rows at
+    the 'set' positions (counted after the removal) and appends the 'append' rows. Its inverse is an 'unsplice'.
+    """
+    removed_positions = record.get('remove', [])
+    updated_rows = record.get('set', [])
+    added_rows = [list(row) for row in record.get('append', [])]
+    removed_rows = []
+    if removed_positions:
+        removed = set(removed_positions)
+        removed_rows = [rows[position] for position in removed_positions]
+        rows[:] = [row for position, row in enumerate(rows) if position not in removed]
+    previous_rows = []
+    for position, row in updated_rows:
+        previous_rows.append([position, rows[position]])
+        rows[position] = list(row)
+    rows.extend(added_rows)
+    if index is not None:
+        if removed_positions:
+            index.remove(removed_positions)
+        if updated_rows:
+            index.update([position for position, _ in updated_rows], [row for _, row in updated_rows])
+        if added_rows:
+            index.append(added_rows)
+    if undo_log is not None:
+        undo_log.append({'op': 'unsplice', 'pop': len(added_rows), 'set': previous_rows,
+                         'insert': [[position, row] for position, row in zip(removed_positions, removed_rows)]})
+    return {'added': len(added_rows), 'deleted': len(removed_positions), 'updated': len(updated_rows)}
+
+def _unsplice(rows: list[list[str]], record: dict, index: AnnotationIndex = None, undo_log: list = None) -> dict:
+    """
+    Inverse of _splice: removes the last 'pop' rows (O(1) for undoing an add), restores the 'set' rows and
+    inserts the 'insert' rows back at their 0-based positions (ascending). Its inverse is a 'splice'.
+    """
+    pop_count = record.get('pop', 0)
+    popped_rows = rows[len(rows) - pop_count:] if pop_count else []
+    if pop_count:
+        del rows[len(rows) - pop_count:]
+    previous_rows = []
+    for position, row in record.get('set', []):
+        previous_rows.append([position, rows[position]])
+        rows[position] = list(row)
+    inserted = record.get('insert', [])
+    for position, row in inserted:
+        rows.insert(position, list(row))
+    if index is not None:
+        if pop_count:
+            index.pop(pop_count)
+        if record.get('set'):
+            index.update([position for position, _ in record['set']], [row for _, row in record['set']])
+        if inserted:
+            index.insert([position for position, _ in inserted], [row for _, row in inserted])
+    if undo_log is not None:
+        undo_log.append({'op': 'splice', 'remove': [position for position, _ in inserted], 'set': previous_rows, 'append': popped_rows})
+    return {'added': len(inserted), 'deleted': pop_count, 'updated': len(previous_rows)}
+
+def _apply_batch(rows: list[list[str]], record: dict, index: AnnotationIndex = None, undo_log: list = None) -> dict:
+    """
+    Applies deletes, updates and adds in one pass over the rows: the deletes and updates are looked up in
+    hash tables keyed by annotation_key (O(rows + operations)), their item numbers refer to the rows before
+    the batch, the adds go after the remaining rows and the item numbers are renumbered once.
+    """
+    deletes = Counter(tuple(key) for key in record.get('delete', []))
+    updates = {}
+    for key, new_row in record.get('update', []):
+        updates.setdefault(tuple(key), []).append(list(new_row))
+    removed_positions, updated_rows = [], []
+    if deletes or updates:
+        for position, row in enumerate(rows, start=1):
+            key = (str(position), *row)
+            if deletes[key] > 0:
+                deletes[key] -= 1  # Each delete item removes at most one row
+                removed_positions.append(position - 1)
+            elif updates.get(key):
+                updated_rows.append([position - 1 - len(removed_positions), updates[key].pop(0)])
+    return _splice(rows, {'remove': removed_positions, 'set': updated_rows, 'append': record.get('add', [])}, index, undo_log)
+
+def apply_operation(rows: list[list[str]], record: dict, index: AnnotationIndex = None, undo_log: list = None) -> dict:
+    """
+    Applies one journal record to the annotation rows, with the semantics of the former whole-file rewrites:
+    item numbers are always the 1-based row positions.
+
+    Parameters:
+    - rows (list[list[str]]): [Start Index, End Index, Label, Color] of each annotation, in item order (modified in place).
+    - record (dict): {'op': 'add' | 'delete' | 'undo' | 'refresh' | 'batch' | 'splice' | 'unsplice', ...}.
+                     'add' items are rows, 'delete' items are annotation keys (all fields must match),
+                     see batch_record for 'batch', _splice and _unsplice for the positional edits of undo/redo.
+    - index (AnnotationIndex, optional): Interval index of the rows, kept in sync.
+    - undo_log (list, optional): The record reverting this one is appended to it.
+
+    Returns:
+    - dict: The number of annotations 'added', 'deleted' and 'updated'.
+    """
+    operation = record.get('op')
+    if operation == 'add':
+        return _splice(rows, {'append': record['items']}, index, undo_log)
+    if operation == 'delete':
+        return _apply_batch(rows, {'delete': record['items']}, index, undo_log)
+    if operation == 'batch':
+        return _apply_batch(rows, record, index, undo_log)
+    if operation == 'splice':
+        return _splice(rows, record, index, undo_log)
+    if operation == 'unsplice':
+        return _unsplice(rows, record, index, undo_log)
+    if operation == 'undo':
+        # Removes the last annotation (kept for the journals written before the undo history)
+        return _unsplice(rows, {'pop': min(1, len(rows))}, index, undo_log)
+    if operation == 'refresh':
+        return _splice(rows, {'remove': list(range(len(rows)))}, index, undo_log)
+    raise ValueError(f"Unknown annotation journal operation: {operation}")
+
+def _read_annotation_rows(csv_file_path) -> tuple[list[list[str]], int]:
+    """
+    Returns:
+    - tuple[list[list[str]], int]: The annotation rows of a CSV file, and the number of blank rows skipped
+                                   (rows without an item number, left by the former undo and refresh).
+    """
+    rows, blank_rows = [], 0
+    if not os.path.exists(csv_file_path):
+        return rows, blank_rows
+    with open(csv_file_path, mode='r', newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        headers = next(reader, None)
+        if not headers:
+            return rows, blank_rows
+        item_col_index = headers.index('Item Number')
+        columns = [headers.index(name) for name in ANNOTATION_HEADERS[1:]]
+        for row in reader:
+            if len(row) > item_col_index and row[item_col_index]:
+                rows.append([row[col] if col < len(row) else '' for col in columns])
+            else:
+                blank_rows += 1
+    return rows, blank_rows
+
+def read_annotation_csv(csv_file_path) -> list[list[str]]:
+    """
+    Reads the annotation rows of a canonical CSV file (rows without an item number are blank and skipped).
+    """
+    return _read_annotation_rows(csv_file_path)[0]
+
+def write_annotation_csv(csv_file_path, rows: list[list[str]]):
+    """
+    Atomically writes the annotation rows as the canonical CSV file (temporary file in the same folder, then os.replace).
+    """
+    csv_file_path = Path(csv_file_path)
+    csv_file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temp_file_path = tempfile.mkstemp(dir=csv_file_path.parent, prefix=csv_file_path.stem, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, mode='w', newline='') as temp_file:
+            writer = csv.writer(temp_file)
+            writer.writerow(ANNOTATION_HEADERS)
+            for item_number, row in enumerate(rows, start=1):
+                writer.writerow([item_number] + row)
+            if FSYNC_WRITES:
+                temp_file.flush()
+                os.fsync(temp_file.fileno())  # The content must be on disk before the rename makes it the CSV file
+        os.replace(temp_file_path, csv_file_path)
+    except BaseException:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+
+class AnnotationJournal:
+    """
+    Append-only operation journal of one working annotation CSV file, with its materialized view.
+
+    Each edit appends one JSON line (O(1) disk I/O) instead of rewriting the whole CSV file. The first line
+    records the version of the CSV file the journal applies to, so a journal that was already folded into the
+    CSV (crash between the CSV replacement and the journal removal) or that predates an external rewrite of the
+    CSV is recognized and discarded. The view is kept in memory and only the new journal lines are replayed,
+    so reads cost two stats. compact() folds the journal back into the CSV file.
+
+    revision is the per-process version number of the view: it increases with every change, whatever its origin
+    (edit, replayed journal of another process, reload), and keys the cached annotations() list.
+
+    annotation_version is the per-file edit counter shared by every process: the journal header holds the
+    version of the CSV file and each record adds one, the '.version' file keeps it once the journal is folded.
+    Clients send the version their edit was made on: edits against an older version raise StaleAnnotationVersion.
+    Every read and edit holds the per-file AnnotationFileLock.
+
+    Every edit also records the operation reverting it (see apply_operation), so undo and redo are journaled
+    edits too: undo_stack holds the last UNDO_DEPTH reverting operations, redo_stack the operations reverting
+    the undos. The history is kept in memory only and starts over when the view is reloaded.
+    """
+
+    def __init__(self, working_csv_file_path):
+        self.csv_path = Path(working_csv_file_path)
+        self.journal_path = journal_path_for(self.csv_path)
+        self.rows = []
+        self.index = AnnotationIndex()  # Interval index of self.rows
+        self.csv_version = None  # Version of the CSV file the view was loaded from
+        self.journal_offset = 0  # Bytes of the journal replayed into the view
+        self.pending_operations = 0  # Journal records not folded into the CSV file yet
+        self.revision = 0
+        self.last_append = 0.0
+        self.dirty_since = 0.0  # When the first record not folded into the CSV file was appended
+        self.last_access = time.monotonic()
+        self._annotations_cache = (None, [])  # (revision, annotations() list)
+        self.undo_stack = deque(maxlen=UNDO_DEPTH)
+        self.redo_stack = []
+        self.version_path = self.csv_path.with_suffix(VERSION_SUFFIX)
+        self.annotation_version = 0
+        # Dash callbacks, the consumers and the compactor run in different threads, other workers in other processes
+        self.lock = AnnotationFileLock(self.csv_path.with_suffix(LOCK_SUFFIX))
+
+    def _load(self):
+        self.rows, blank_rows = _read_annotation_rows(self.csv_path)
+        self.index = AnnotationIndex.from_rows(self.rows, self.index.tz)
+        self.csv_version = file_version(self.csv_path)
+        self.annotation_version = read_version_file(self.version_path)
+        self.journal_offset = 0
+        self.pending_operations = 0
+        self.revision += 1
+        self._clear_history()
+        self._replay()
+        if blank_rows:
+            # Working file written by the former undo/refresh, which blanked rows instead of removing them
+            self.compact(force=True)
+            logger.info(f"Removed {blank_rows} blank row(s) from {self.csv_path}")
+
+    def _clear_history(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+    def _replay(self):
+        """
+        Applies the journal records written after journal_offset (by this or another process) to the view.
+        """
+        try:
+            with open(self.journal_path, mode='rb') as journal_file:
+                journal_file.seek(self.journal_offset)
+                new_bytes = journal_file.read()
+        except FileNotFoundError:
+            return
+        complete_length = new_bytes.rfind(b'\n') + 1  # A torn last line (crash during an append) is ignored
+        for line in new_bytes[:complete_length].splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'base' in record:
+                if record['base'] != self.csv_version:
+                    logger.warning(f"Discarding stale annotation journal {self.journal_path}: "
+                                   f"written for CSV version '{record['base']}', found '{self.csv_version}'.")
+                    self._remove_journal()
+                    return
+                self.annotation_version = record.get('version', self.annotation_version)
+            else:
+                apply_operation(self.rows, record, self.index)
+                self.pending_operations += 1
+                self.revision += 1
+                self.annotation_version += 1
+                self._clear_history()  # Edited by another process: the recorded positions may no longer match
+        self.journal_offset += complete_length
+
+    def _sync(self):
+        """
+        Brings the view up to date with the files on disk (reloads it after an external change of the CSV file).
+        """
+        journal_size = os.path.getsize(self.journal_path) if self.journal_path.exists() else 0
+        if self.csv_version is None or file_version(self.csv_path) != self.csv_version or journal_size < self.journal_offset:
+            self._load()
+        elif journal_size > self.journal_offset:
+            self._replay()
+
+    def _check_version(self, expected_version: int = None):
+        if expected_version is not None and int(expected_version) != self.annotation_version:
+            raise StaleAnnotationVersion(self.csv_path, int(expected_version), self.annotation_version)
+
+    def _append(self, record: dict, history: str = 'edit', expected_version: int = None) -> dict:
+        """
+        Journals one record and applies it to the view, then records its reverting operation:
+        on the undo stack for an 'edit' (which also clears the redo stack) or a 'redo', on the redo stack for an 'undo'.
+        Raises StaleAnnotationVersion if expected_version is given and is not the current annotation version.
+        """
+        with self.lock:
+            self._sync()
+            self._check_version(expected_version)
+            lines = []
+            if self.journal_offset == 0:
+                # Drop a torn line left by a crash before starting a fresh journal
+                self._remove_journal()
+                lines.append(json.dumps({'base': self.csv_version, 'version': self.annotation_version}))
+            elif os.path.getsize(self.journal_path) > self.journal_offset:
+                os.truncate(self.journal_path, self.journal_offset)  # Same for a torn last line
+            lines.append(json.dumps(record))
+            data = ('\n'.join(lines) + '\n').encode()
+            self.csv_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_path, mode='ab') as journal_file:
+                journal_file.write(data)
+                if FSYNC_WRITES:
+                    journal_file.flush()
+                    os.fsync(journal_file.fileno())
+            reverting = []
+            applied = apply_operation(self.rows, record, self.index, undo_log=reverting)
+            if history == 'undo':
+                self.redo_stack.append(reverting[0])
+            else:
+                self.undo_stack.append(reverting[0])
+                if history == 'edit':
+                    self.redo_stack.clear()
+            self.journal_offset += len(data)
+            if not self.pending_operations:
+                self.dirty_since = time.monotonic()
+            self.pending_operations += 1
+            self.revision += 1
+            self.annotation_version += 1
+            self.last_append = self.last_access = time.monotonic()
+        annotation_states.schedule(self)
+        return applied
+
+    def is_dirty(self) -> bool:
+        return self.pending_operations > 0
+
+    def add(self, annotations: list[dict]) -> list[dict]:
+        """
+        Returns:
+        - list[dict]: The added annotations, with their 'Item Number' (see annotations()).
+        """
+        with self.lock:
+            self._append({'op': 'add', 'items': [annotation_row(annotation) for annotation in annotations]})
+            first_item_number = len(self.rows) - len(annotations) + 1
+            return [dict(zip(ANNOTATION_HEADERS, [str(item_number)] + row))
+                    for item_number, row in enumerate(self.rows[first_item_number - 1:], start=first_item_number)]
+
+    def delete(self, delete_data: list[dict], expected_version: int = None) -> int:
+        """
+        Returns:
+        - int: The number of annotations deleted.
+        """
+        return self._append({'op': 'delete', 'items': [annotation_key(item) for item in delete_data]},
+                            expected_version=expected_version)['deleted']
+
+    def batch(self, operations: list[dict], expected_version: int = None) -> dict:
+        """
+        Applies a list of add/delete/update operations at once: one journal record, one pass over the rows
+        (see batch_record and _apply_batch). Invalid operations raise ValueError and nothing is applied.
+
+        Returns:
+        - dict: The number of annotations 'added', 'deleted' and 'updated'.
+        """
+        return self._append(batch_record(operations), expected_version=expected_version)
+
+    def undo(self, expected_version: int = None) -> bool:
+        """
+        Reverts the last edit (its reverting operation is journaled, O(1) for an add). Without history
+        (e.g. after a restart, or once another process edited the file) nothing is changed: the last
+        annotation is not necessarily the last edit.
+
+        Returns:
+        - bool: False if there was nothing to undo.
+        """
+        with self.lock:
+            self._sync()
+            self._check_version(expected_version)
+            if not self.undo_stack:
+                return False
+            self._append(self.undo_stack.pop(), history='undo')
+            return True
+
+    def redo(self, expected_version: int = None) -> bool:
+        """
+        Reapplies the last undone edit, as long as no other edit was made since.
+
+        Returns:
+        - bool: False if there was nothing to redo.
+        """
+        with self.lock:
+            self._sync()
+            self._check_version(expected_version)
+            if not self.redo_stack:
+                return False
+            self._append(self.redo_stack.pop(), history='redo')
+            return True
+
+    def refresh(self, expected_version: int = None):
+        self._append({'op': 'refresh'}, expected_version=expected_version)
+
+    def current_version(self) -> int:
+        """
+        Returns:
+        - int: The annotation version clients must send with their edits (see StaleAnnotationVersion).
+        """
+        with self.lock:
+            self._sync()
+            return self.annotation_version
+
+    def annotations(self) -> list[dict]:
+        """
+        Returns:
+        - list[dict]: The current annotations, with 'Item Number', 'Start Index', 'End Index', 'Label' and 'Color' (str).
+        """
+        with self.lock:
+            self._sync()
+            cached_revision, cached_annotations = self._annotations_cache
+            if cached_revision != self.revision:
+                cached_annotations = [dict(zip(ANNOTATION_HEADERS, [str(item_number)] + row)) for item_number, row in enumerate(self.rows, start=1)]
+                self._annotations_cache = (self.revision, cached_annotations)
+            return list(cached_annotations)  # The dictionaries are shared between callers, treat them as read-only
+
+    def annotations_with_index(self, tz: str = None) -> tuple[list[dict], AnnotationIndex]:
+        """
+        Parameters:
+        - tz (str, optional): Time zone of the data of the file, naive boundaries are read in it (UTC by default).
+                              The index is rebuilt once when it changes, then kept up to date in that time zone.
+
+        Returns:
+        - tuple[list[dict], AnnotationIndex]: The current annotations (see annotations()) and a snapshot of
+                                              their interval index (index positions are list positions).
+        """
+        with self.lock:
+            annotations = self.annotations()
+            if (self.index.tz or 'UTC') != (tz or 'UTC'):
+                self.index = AnnotationIndex.from_rows(self.rows, tz)
+            return annotations, self.index.copy()
+
+    def version(self) -> str:
+        """
+        Returns:
+        - str: Changes with every edit, whether it is still in the journal or already folded into the CSV file.
+        """
+        return f"{file_version(self.csv_path)}+{file_version(self.journal_path)}"
+
+    def replace(self, annotations: list[dict]):
+        """
+        Replaces every annotation at once (auto labeling): the CSV file is written directly and the journal dropped.
+        """
+        with self.lock:
+            self._sync()
+            rows = [annotation_row(annotation) for annotation in annotations]
+            self.annotation_version += 1
+            write_version_file(self.version_path, self.annotation_version)
+            write_annotation_csv(self.csv_path, rows)
+            self._remove_journal()
+            self.rows = rows
+            self.index = AnnotationIndex.from_rows(rows, self.index.tz)
+            self.csv_version = file_version(self.csv_path)
+            self.journal_offset = 0
+            self.pending_operations = 0
+            self.revision += 1
+            self._clear_history()
+
+    def compact(self, force: bool = False) -> bool:
+        """
+        Folds the journal into the canonical CSV file, then removes it.
+
+        Parameters:
+        - force (bool): Rewrite the CSV file even without a journal (e.g. to drop blank rows).
+
+        Returns:
+        - bool: True if there was something to fold.
+        """
+        with self.lock:
+            self._sync()  # Even when forced: another process may have journaled edits since the last read
+            if not force and not self.journal_path.exists():
+                return False
+            folded_operations = self.pending_operations
+            # The version first: until the journal is removed, its header and records give the same version
+            write_version_file(self.version_path, self.annotation_version)
+            write_annotation_csv(self.csv_path, self.rows)
+            self._remove_journal()
+            self.csv_version = file_version(self.csv_path)
+            self.journal_offset = 0
+            self.pending_operations = 0
+        logger.info(f"Compacted {folded_operations} journaled operation(s) into {self.csv_path}")
+        return True
+
+    def _remove_journal(self):
+        try:
+            os.remove(self.journal_path)
+        except FileNotFoundError:
+            pass
+        self.journal_offset = 0
+        self.pending_operations = 0
+
+class AnnotationStates:
+    """
+    Process-wide in-memory annotation states: one AnnotationJournal per open working file, so edits are
+    serialized per file and reads are served from memory. A background thread flushes the dirty states
+    (folds their journals into the CSV files) and evicts the idle ones, so memory stays bounded:
+
+    - flush once idle for ANNOTATION_JOURNAL_COMPACT_IDLE_SECONDS, once dirty for ANNOTATION_FLUSH_INTERVAL_SECONDS
+      (even while the user keeps editing), or once the journal holds ANNOTATION_JOURNAL_COMPACT_OPS operations;
+    - evict the states not used for ANNOTATION_STATE_IDLE_SECONDS, and the least recently used clean ones
+      beyond ANNOTATION_STATE_MAX_FILES (a dirty state is flushed before being evicted).
+    """
+
+    def __init__(self, idle_seconds: float, flush_interval_seconds: float, max_operations: int,
+                 evict_idle_seconds: float, max_files: int):
+        self.idle_seconds = idle_seconds
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_operations = max_operations
+        self.evict_idle_seconds = evict_idle_seconds
+        self.max_files = max_files
+        self._journals = OrderedDict()  # absolute csv path -> AnnotationJournal, least recently used first
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def get(self, working_csv_file_path) -> AnnotationJournal:
+        key = os.path.abspath(working_csv_file_path)
+        with self._condition:
+            journal = self._journals.get(key)
+            if journal is None:
+                journal = self._journals[key] = AnnotationJournal(key)
+                self._evict_over_capacity_locked(keep=key)
+            self._journals.move_to_end(key)
+            journal.last_access = time.monotonic()
+            return journal
+
+    def schedule(self, journal: AnnotationJournal):
+        """
+        Wakes the background thread up after an edit (starting it on first use).
+        """
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='annotation-state-flusher', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {'files': len(self._journals), 'dirty': sum(1 for journal in self._journals.values() if journal.is_dirty())}
+
+    def _flush_due_at(self, journal: AnnotationJournal) -> float:
+        if journal.pending_operations >= self.max_operations:
+            return 0.0
+        return min(journal.last_append + self.idle_seconds, journal.dirty_since + self.flush_interval_seconds)
+
+    def _evict_over_capacity_locked(self, keep: str = None):
+        # keep: the state being opened, returned to the caller (even if all the others are dirty)
+        for key in [key for key, journal in self._journals.items() if not journal.is_dirty() and key != keep]:
+            if len(self._journals) <= self.max_files:
+                break
+            self._journals.pop(key).lock.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                dirty = [journal for journal in self._journals.values() if journal.is_dirty()]
+                due = [journal for journal in dirty if self._flush_due_at(journal) <= now]
+                idle = [key for key, journal in self._journals.items()
+                        if not journal.is_dirty() and now - journal.last_access >= self.evict_idle_seconds]
+                for key in idle:
+                    self._journals.pop(key).lock.close()
+                if not due:
+                    if not self._journals:
+                        self._condition.wait()  # Nothing open, until the next edit
+                    else:
+                        wake_ups = [self._flush_due_at(journal) for journal in dirty]
+                        wake_ups.append(min(journal.last_access for journal in self._journals.values()) + self.evict_idle_seconds)
+                        self._condition.wait(timeout=max(min(wake_ups) - now, 0.05))
+                    continue
+            for journal in due:
+                try:
+                    journal.compact()
+                except Exception:
+                    logger.error(f"Error flushing the annotation state of {journal.csv_path}: \n\t{traceback.format_exc()}\n")
+                    journal.dirty_since = time.monotonic()  # Retried after another flush interval
+
+annotation_states = AnnotationStates(
+    idle_seconds=getattr(settings, 'ANNOTATION_JOURNAL_COMPACT_IDLE_SECONDS', 30),
+    flush_interval_seconds=getattr(settings, 'ANNOTATION_FLUSH_INTERVAL_SECONDS', 120),
+    max_operations=getattr(settings, 'ANNOTATION_JOURNAL_COMPACT_OPS', 500),
+    evict_idle_seconds=getattr(settings, 'ANNOTATION_STATE_IDLE_SECONDS', 900),
+    max_files=getattr(settings, 'ANNOTATION_STATE_MAX_FILES', 64),
+)
+
+def get_annotation_journal(working_csv_file_path) -> AnnotationJournal:
+    """
+    Returns the in-memory state (journal and view) of a working CSV file, see AnnotationStates.
+    """
+    return annotation_states.get(working_csv_file_path)
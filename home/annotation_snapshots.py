@@ -0,0 +1,188 @@
+
+# home/annotation_snapshots.py
+import os
+import json
+import uuid
+import errno
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+try:
+    import fcntl  # Reflinks (copy-on-write clones), Linux only
+except ImportError:
+    fcntl = None
+
+# Setup logger
+logger = logging.getLogger('home')
+
+SNAPSHOTS_DIR_NAME = 'Snapshots'  # Next to the 'Working_Folder' and 'Saving_Folder' of an annotations directory
+HEAD_NAME = 'HEAD.json'  # {saved file path relative to the 'Saving_Folder': content hash} of the current saved state
+FICLONE = 0x40049409  # ioctl cloning a whole file (btrfs, XFS, ...)
+_head_lock = threading.Lock()
+
+def snapshot_root_for(annotations_dir) -> Path:
+    return Path(annotations_dir) / SNAPSHOTS_DIR_NAME
+
+def object_path(snapshot_root, digest: str) -> Path:
+    return Path(snapshot_root) / 'objects' / digest[:2] / digest
+
+def file_digest(file_path) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, mode='rb') as source_file:
+        for chunk in iter(lambda: source_file.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def _temporary_name(target_file: Path) -> Path:
+    # A name that does not exist yet (os.link and reflinks need to create the file themselves)
+    return target_file.with_name(f".{target_file.name}.{uuid.uuid4().hex}.tmp")
+
+def _reflink(source_file: Path, target_file: Path):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported on this platform')
+    with open(source_file, mode='rb') as source, open(target_file, mode='wb') as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+def link_or_copy(source_file: Path, target_file: Path, hardlink: bool = True) -> str:
+    """
+    Atomically makes target_file a file with the content of source_file, as cheaply as the filesystem allows:
+    a hardlink, else a reflink, else a copy (shutil.copy2).
+
+    Parameters:
+    - hardlink (bool): False for a private copy (reflink or copy), whose content does not change with source_file.
+
+    Returns:
+    - str: 'hardlink', 'reflink' or 'copy'.
+    """
+    target_file.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = _temporary_name(target_file)
+    methods = (('hardlink', os.link), ('reflink', _reflink), ('copy', shutil.copy2))
+    try:
+        for method, make in methods if hardlink else methods[1:]:
+            try:
+                make(source_file, temp_file)
+                break
+            except OSError:
+                if method == 'copy':
+                    raise
+                if temp_file.exists():
+                    os.remove(temp_file)
+        os.replace(temp_file, target_file)
+        return method
+    except BaseException:
+        if temp_file.exists():
+            os.remove(temp_file)
+        raise
+
+def store_object(snapshot_root, source_file) -> str:
+    """
+    Adds a file to the content-addressed store (objects/<sha256[:2]>/<sha256>), once per content.
+    A private copy (reflink or copy) of the file is staged in the store, then hashed: the stored object never
+    shares its inode with the live working file, only the saving files are hardlinked to it.
+
+    Returns:
+    - str: The sha256 hex digest of the content.
+    """
+    objects_dir = Path(snapshot_root) / 'objects'
+    objects_dir.mkdir(parents=True, exist_ok=True)
+    staged_file = _temporary_name(objects_dir / Path(source_file).name)
+    link_or_copy(Path(source_file), staged_file, hardlink=False)
+    try:
+        digest = file_digest(staged_file)
+        stored_file = object_path(snapshot_root, digest)
+        if stored_file.exists():
+            return digest  # Identical content already stored
+        stored_file.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(staged_file, stored_file)
+        return digest
+    finally:
+        if staged_file.exists():
+            os.remove(staged_file)
+
+def save_snapshot_file(snapshot_root, source_file, saving_file) -> str:
+    """
+    Saves a working file in snapshot mode: stores its content, then materializes the saving file from the store.
+    Stored objects must never be modified in place: the saving files share their inode when hardlinked.
+
+    Returns:
+    - str: The sha256 hex digest of the saved content.
+    """
+    digest = store_object(snapshot_root, source_file)
+    method = link_or_copy(object_path(snapshot_root, digest), Path(saving_file))
+    logger.info(f"Saved {Path(source_file).name} as snapshot object {digest[:12]} ({method}) \n\tto {saving_file}")
+    return digest
+
+def load_head(snapshot_root) -> dict:
+    try:
+        with open(Path(snapshot_root) / HEAD_NAME, mode='r') as head_file:
+            return json.load(head_file)
+    except (OSError, ValueError):
+        return {}
+
+def _write_json(file_path: Path, data: dict):
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temp_file_path = tempfile.mkstemp(dir=file_path.parent, prefix=file_path.stem, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, mode='w') as temp_file:
+            json.dump(data, temp_file)
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+
+def update_head(snapshot_root, saved_digests: dict, keep_only: set = None, record_history: bool = False) -> Path | None:
+    """
+    Records the content hashes of the files just saved in HEAD.json.
+
+    Parameters:
+    - saved_digests (dict): {saved file path relative to the 'Saving_Folder' (posix): sha256 digest}.
+    - keep_only (set, optional): Relative paths still saved, the others are dropped.
+    - record_history (bool): Also keep a copy of the new HEAD as history/<UTC time>.json (a few bytes per file,
+                             the contents themselves are shared in the store).
+
+    Returns:
+    - Path | None: The history snapshot written, if any.
+    """
+    snapshot_root = Path(snapshot_root)
+    with _head_lock:
+        head = load_head(snapshot_root)
+        if keep_only is not None:
+            head = {relative_path: digest for relative_path, digest in head.items() if relative_path in keep_only}
+        head.update(saved_digests)
+        _write_json(snapshot_root / HEAD_NAME, head)
+        if not record_history:
+            return None
+        history_file = snapshot_root / 'history' / f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}.json"
+        _write_json(history_file, head)
+        return history_file
+
+def list_snapshots(annotations_dir) -> list[str]:
+    """
+    Returns:
+    - list[str]: Names of the history snapshots (Save All), oldest first.
+    """
+    history_dir = snapshot_root_for(annotations_dir) / 'history'
+    return sorted(path.stem for path in history_dir.glob('*.json')) if history_dir.is_dir() else []
+
+def restore_snapshot(annotations_dir, snapshot_name: str) -> int:
+    """
+    Materializes the 'Saving_Folder' as it was at a history snapshot (files missing from the snapshot are kept).
+
+    Returns:
+    - int: The number of files restored.
+    """
+    snapshot_root = snapshot_root_for(annotations_dir)
+    with open(snapshot_root / 'history' / f"{snapshot_name}.json", mode='r') as snapshot_file:
+        snapshot = json.load(snapshot_file)
+    saving_root = Path(annotations_dir) / 'Saving_Folder'
+    for relative_path, digest in snapshot.items():
+        link_or_copy(object_path(snapshot_root, digest), saving_root / relative_path)
+    update_head(snapshot_root, snapshot)
+    logger.info(f"Restored {len(snapshot)} saved file(s) of {annotations_dir} from snapshot {snapshot_name}")
+    return len(snapshot)
@@ -0,0 +1,299 @@
+
+# home/auto_label_jobs.py
+import os
+import json
+import time
+import uuid
+import queue
+import hashlib
+import logging
+import threading
+import traceback
+from collections import OrderedDict
+from django.conf import settings  # Import Django settings
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+from .utils import get_models, get_annotation_backend, creating_file_paths, predict_auto_labels, store_auto_labels
+from .annotation_journal import file_version
+
+# Setup logger
+logger = logging.getLogger('home')
+
+FINISHED_STATUSES = ('done', 'failed', 'cancelled')  # A job goes 'queued' -> 'running' -> one of these (or 'queued' -> 'cancelled')
+REDIS_KEY_PREFIX = 'auto_label'
+
+def _can_transition(job: dict | None, from_statuses: tuple, require: dict = None) -> bool:
+    """
+    Condition of the brokers' transition(): the job exists, is in one of from_statuses and has the required field values.
+    """
+    if job is None or job['Status'] not in from_statuses:
+        return False
+    return all(job.get(field) == value for field, value in (require or {}).items())
+
+class InProcessJobBroker:
+    """
+    Stand-in for RedisJobBroker within a single process (tests, development without Redis), with the same interface:
+    the jobs, their queue and the cached predictions are kept in memory.
+    """
+
+    def __init__(self, ttl_seconds: int, max_cached_results: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_cached_results = max_cached_results
+        self._jobs = {}
+        self._queue = queue.Queue()
+        self._results = OrderedDict()  # cache key -> ranges list, least recently used first
+        self._lock = threading.Lock()
+
+    def push(self, job: dict):
+        with self._lock:
+            # Finished jobs are only kept for ttl_seconds, as in Redis
+            expired = [job_id for job_id, old_job in self._jobs.items()
+                       if old_job['Status'] in FINISHED_STATUSES and time.time() - old_job['Finished_at'] > self.ttl_seconds]
+            for job_id in expired:
+                del self._jobs[job_id]
+            self._jobs[job['Job_id']] = dict(job)
+        self._queue.put(job['Job_id'])
+
+    def pop(self, timeout: float) -> str | None:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def transition(self, job_id: str, from_statuses: tuple, require: dict = None, **fields) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not _can_transition(job, from_statuses, require):
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def get_result(self, cache_key: str) -> list[dict] | None:
+        with self._lock:
+            ranges_list = self._results.get(cache_key)
+            if ranges_list is not None:
+                self._results.move_to_end(cache_key)
+            return ranges_list
+
+    def set_result(self, cache_key: str, ranges_list: list[dict]):
+        with self._lock:
+            self._results[cache_key] = ranges_list
+            self._results.move_to_end(cache_key)
+            while len(self._results) > self.max_cached_results:
+                self._results.popitem(last=False)
+
+class RedisJobBroker:
+    """
+    Keeps the jobs, their queue and the cached predictions in Redis (the server of the channel layer), so that
+    the web server and any number of `manage.py auto_label_worker` processes share them.
+
+    Keys: '<prefix>:queue' (list of job IDs), '<prefix>:job:<job ID>' and '<prefix>:result:<cache key>' (JSON strings,
+    expiring after ttl_seconds).
+    """
+
+    def __init__(self, host: str, port: int, db: int, ttl_seconds: int):
+        import redis  # Installed with channels_redis
+        self.ttl_seconds = ttl_seconds
+        self._redis = redis.Redis(host=host, port=port, db=db)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{REDIS_KEY_PREFIX}:job:{job_id}"
+
+    def push(self, job: dict):
+        with self._redis.pipeline() as pipe:
+            pipe.set(self._job_key(job['Job_id']), json.dumps(job), ex=self.ttl_seconds)
+            pipe.lpush(f"{REDIS_KEY_PREFIX}:queue", job['Job_id'])
+            pipe.execute()
+
+    def pop(self, timeout: float) -> str | None:
+        popped = self._redis.brpop(f"{REDIS_KEY_PREFIX}:queue", timeout=max(1, int(timeout)))
+        return popped[1].decode() if popped else None
+
+    def get(self, job_id: str) -> dict | None:
+        raw_job = self._redis.get(self._job_key(job_id))
+        return json.loads(raw_job) if raw_job else None
+
+    def transition(self, job_id: str, from_statuses: tuple, require: dict = None, **fields) -> dict | None:
+        key = self._job_key(job_id)
+
+        def apply(pipe):
+            # WATCHed: retried if another process changes the job in between (e.g. a cancel while a worker starts it)
+            raw_job = pipe.get(key)
+            job = json.loads(raw_job) if raw_job else None
+            if not _can_transition(job, from_statuses, require):
+                return None
+            job.update(fields)
+            pipe.multi()
+            pipe.set(key, json.dumps(job), ex=self.ttl_seconds)
+            return job
+        return self._redis.transaction(apply, key, value_from_callable=True)
+
+    def get_result(self, cache_key: str) -> list[dict] | None:
+        raw_result = self._redis.get(f"{REDIS_KEY_PREFIX}:result:{cache_key}")
+        return json.loads(raw_result) if raw_result else None
+
+    def set_result(self, cache_key: str, ranges_list: list[dict]):
+        self._redis.set(f"{REDIS_KEY_PREFIX}:result:{cache_key}", json.dumps(ranges_list), ex=self.ttl_seconds)
+
+def prediction_cache_key(relative_file_path: str, model_file, labels_list: list[dict]) -> str:
+    """
+    The predictions of a model for a file only depend on the data file, the model checkpoint and the labels:
+    the key changes as soon as one of them does (files by their 'mtime_ns-size' version, see file_version).
+
+    Returns:
+    - str: A sha256 hex digest.
+    """
+    data_file = os.path.join(os.path.normpath(settings.MEDIA_ROOT), relative_file_path)
+    key_parts = [relative_file_path, file_version(data_file), os.path.abspath(model_file), file_version(model_file), labels_list]
+    return hashlib.sha256(json.dumps(key_parts, sort_keys=True).encode()).hexdigest()
+
+def public_job(job: dict) -> dict:
+    """The job as sent to the client (without its labels list and user name)."""
+    return {key: value for key, value in job.items() if key not in ('Labels', 'User')}
+
+class AutoLabelJobQueue:
+    """
+    Auto labeling jobs, run off the Dash callback and websocket threads. A job predicts the annotations of one file
+    (or takes them from the cache of predictions), then replaces the annotations of the file with them.
+
+    Jobs are run by the worker threads of this process (worker_threads, started on the first submit) and/or by
+    `manage.py auto_label_worker` processes sharing a Redis broker. Every status change is sent to the
+    'ecg_analysis_{user}' group of the user who submitted the job, as an 'auto_label_job' message.
+    """
+
+    def __init__(self, broker, worker_threads: int = 0, poll_seconds: float = 1.0):
+        self.broker = broker
+        self.worker_threads = worker_threads
+        self.poll_seconds = poll_seconds
+        self._threads = []
+        self._threads_lock = threading.Lock()
+
+    def submit(self, user_name: str, relative_file_path: str, selected_model: str, labels_list: list[dict]) -> dict:
+        """
+        Returns:
+        - dict: The queued job ('Job_id', 'Status', 'File_path', 'Model', ...).
+        """
+        job = {
+            'Job_id': uuid.uuid4().hex,
+            'User': user_name,
+            'File_path': relative_file_path,
+            'Model': selected_model,
+            'Labels': labels_list,
+            'Status': 'queued',
+            'Message': '',
+            'Ranges': 0,
+            'Cached': False,
+            'Cancel_requested': False,
+            'Storing': False,  # Set once the predictions are being written, a cancel comes too late then
+            'Created_at': time.time(),
+            'Started_at': None,
+            'Finished_at': None,
+        }
+        self.broker.push(job)
+        logger.info(f"Queued auto labeling job {job['Job_id']} of {relative_file_path} with '{selected_model}' for {user_name}")
+        self.start_worker_threads()
+        return job
+
+    def status(self, job_id: str) -> dict | None:
+        return self.broker.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str) -> dict | None:
+        """
+        Cancels a queued job, or asks a running one to stop: its predictions are then dropped instead of written
+        (the inference itself runs to its end). Jobs already writing their predictions, and finished ones, are
+        left as they are.
+
+        Returns:
+        - dict | None: The job after the request, None if it does not exist (or expired).
+        """
+        job = self.broker.transition(job_id, ('queued',), Status='cancelled', Message='Cancelled before it started.',
+                                     Finished_at=time.time())
+        if job is not None:
+            self.notify(job)
+            return job
+        return (self.broker.transition(job_id, ('running',), require={'Storing': False}, Cancel_requested=True)
+                or self.broker.get(job_id))
+
+    def run_job(self, job_id: str) -> dict | None:
+        """
+        Runs a queued job (skipped if it was cancelled, or taken by another worker, in the meantime).
+        Storing the predictions is claimed with an atomic transition (Storing, unless Cancel_requested), so a
+        cancel either drops them or is refused, never both.
+
+        Returns:
+        - dict | None: The finished job, None if it was not run or expired while running.
+        """
+        job = self.broker.transition(job_id, ('queued',), Status='running', Started_at=time.time())
+        if job is None:
+            return None
+        self.notify(job)
+        try:
+            model_info = get_models().get(job['Model'])
+            if not model_info:
+                raise ValueError(f"Selected model '{job['Model']}' not found in available models.")
+            cache_key = prediction_cache_key(job['File_path'], model_info['Model File'], job['Labels'])
+            ranges_list = self.broker.get_result(cache_key)
+            cached = ranges_list is not None
+            if not cached:
+                ranges_list = predict_auto_labels(job['File_path'], job['Model'], job['Labels'])
+                if not ranges_list:
+                    raise ValueError(f"No predictions for {job['File_path']} (see the logs).")
+                self.broker.set_result(cache_key, ranges_list)
+            if self.broker.transition(job_id, ('running',), require={'Cancel_requested': False}, Storing=True) is None:
+                # Cancel requested, or the job expired in the meantime (then None, nothing to report)
+                job = self.broker.transition(job_id, ('running',), Status='cancelled', Finished_at=time.time(),
+                                             Message='Cancelled, the annotations were left unchanged.')
+            else:
+                working_csv_file_path = None if get_annotation_backend() == 'database' else creating_file_paths(job['File_path'])[0]
+                store_auto_labels(job['File_path'], working_csv_file_path, ranges_list)
+                job = self.broker.transition(job_id, ('running',), Status='done', Ranges=len(ranges_list), Cached=cached,
+                                             Finished_at=time.time(),
+                                             Message=f"Auto labeled {job['File_path']} with '{job['Model']}': {len(ranges_list)} range(s).")
+        except Exception as job_error:
+            logger.error(f"Auto labeling job {job_id} failed: \n{traceback.format_exc()}")
+            job = self.broker.transition(job_id, ('running',), Status='failed', Message=str(job_error), Finished_at=time.time())
+        if job is None:
+            logger.warning(f"Auto labeling job {job_id} expired before it finished (AUTO_LABEL_JOB_TTL_SECONDS).")
+            return None
+        logger.info(f"Auto labeling job {job_id}: {job['Status']}. {job['Message']}")
+        self.notify(job)
+        return job
+
+    def notify(self, job: dict):
+        try:
+            async_to_sync(get_channel_layer().group_send)(f"ecg_analysis_{job['User']}",
+                                                          {'type': 'auto_label_job', 'Job': public_job(job)})
+        except Exception:
+            # The client still gets the status by polling (Auto_Label_Job_Status)
+            logger.warning(f"Could not notify {job['User']} of auto labeling job {job['Job_id']}: \n{traceback.format_exc()}")
+
+    def work(self, stop_event: threading.Event = None):
+        """
+        Runs the queued jobs one after the other, until stop_event is set.
+        """
+        while stop_event is None or not stop_event.is_set():
+            job_id = self.broker.pop(timeout=self.poll_seconds)
+            if job_id is not None:
+                self.run_job(job_id)
+
+    def start_worker_threads(self):
+        with self._threads_lock:
+            while len(self._threads) < self.worker_threads:
+                worker = threading.Thread(target=self.work, name=f"auto-label-job-{len(self._threads)}", daemon=True)
+                worker.start()
+                self._threads.append(worker)
+
+def make_job_broker():
+    ttl_seconds = getattr(settings, 'AUTO_LABEL_JOB_TTL_SECONDS', 24 * 3600)
+    if getattr(settings, 'AUTO_LABEL_JOB_BROKER', 'redis') == 'inprocess':
+        return InProcessJobBroker(ttl_seconds)
+    return RedisJobBroker(getattr(settings, 'REDIS_HOST', 'localhost'), getattr(settings, 'REDIS_PORT', 6379),
+                          getattr(settings, 'REDIS_DB', 0), ttl_seconds)
+
+# Single job queue of this process
+auto_label_jobs = AutoLabelJobQueue(make_job_broker(), worker_threads=getattr(settings, 'AUTO_LABEL_JOB_WORKER_THREADS', 1))
@@ -5,7 +5,10 @@ import logging
 import html
 import asyncio
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .utils import get_models, convert_path, handle_annotation_to_csv
+from channels.db import database_sync_to_async
+from asgiref.sync import async_to_sync
+from .utils import get_models, convert_path, handle_annotation_to_csv, handle_annotation_batch, query_annotations, run_auto_labeling_batch, get_annotation_backend
+from .auto_label_jobs import auto_label_jobs, public_job, FINISHED_STATUSES
 from django_plotly_dash.consumers import async_send_to_pipe_channel
 
 # Setup logger
@@ -19,7 +22,7 @@ class ECGConsumer(AsyncWebsocketConsumer):
         else:
             logger.info(f"\nWebSocket connect called by {self.user.username}.\n")
             # Initialize instance variables: channels extracted from xml files, current file path, reset condition 
-            # for consecutive 'undo' or 'refresh' clicks, the consecutive excution count number, and past action.
+            # for consecutive 'undo', 'redo' or 'refresh' clicks, the consecutive excution count number, and past action.
             self.models_info = None
             self.current_file_path = None
             self.handle_condition = False # Update reset condition on receiving a new file path
@@ -27,6 +30,8 @@ class ECGConsumer(AsyncWebsocketConsumer):
             self.count_auto_label = 0
             self.count_number_empty_channel = 0
             self.past_action = None
+            self.auto_label_task = None # Batch auto labeling of a folder running for this client, if any
+            self.auto_label_job_ids = set() # Auto labeling jobs submitted by this client and not finished yet
 
             # Join the group that will receive messages from DjangoDash
             self.User_name = self.user.username
@@ -134,32 +139,29 @@ class ECGConsumer(AsyncWebsocketConsumer):
             path_variable = convert_path(html.unescape(data['RelativefilePath']))
             logger.info(f"\nDjango received \n-relative file path: {path_variable} \n-and selected model: {data['model']}\n")
 
-            if self.handle_condition:
-                if self.count_auto_label == 0: 
-                    self.count_auto_label += 10
-                else:
-                    self.count_auto_label = 0
+            # Queued, not run here: the graph is redrawn with the predictions once the job is done (see on_auto_label_job)
+            from .dash_apps.finished_apps.display_ecg_graph import get_list_of_labels  # Imports the Dash app, only when used
+            labels_list = await database_sync_to_async(get_list_of_labels)()
+            job = await database_sync_to_async(auto_label_jobs.submit)(self.User_name, path_variable, data['model'], labels_list)
+            self.auto_label_job_ids.add(job['Job_id'])
+            await self.send(text_data=json.dumps({'type': 'Auto_Label_Job', **public_job(job)}))
+            logger.info(f"\n----- Django queued auto labeling job {job['Job_id']} for {path_variable}\n")
 
-            # Send the User ID to Pipe
-            Data_to_Send = {'User_id': self.User_name}
-            await async_send_to_pipe_channel(
-                        channel_name = 'User_data_channel',  # Fixed channel name for the first pipe
-                        label = 'User_data_Label',  # Fixed label for the first pipe
-                        value = Data_to_Send)
-            logger.info(f"\n+++++ Django sent Message Channel data to dpd.Pipe: {Data_to_Send}\n\tfor self.User_name = {self.User_name}\n\tin conditional elif data['type'] == 'DashDisplayWithAutoLabel'")
-
-            # Sending message to Pipe in DjangoDash 
-            Data_to_Send = {'File-path': path_variable, 'SelectedModel': data['model'], 'Click_Order': self.count_auto_label}
-            await async_send_to_pipe_channel(
-                        channel_name = 'Receive_Django_Message_Channel',
-                        label = 'Path_and_Model_label',
-                        value = Data_to_Send)
-            logger.info(f"\n+++++ Django sent Message Channel data to ppd.Pipe: {Data_to_Send}\n\tfor self.User_name = {self.User_name}")
+        #______________________________________________________________________________
+        elif data_type in ('Auto_Label_Job_Status', 'Cancel_Auto_Label_Job'):
+            # Status polling, or cancellation, of an auto labeling job
+            job_id = data.get('Job_id')
+            if data_type == 'Cancel_Auto_Label_Job':
+                job = await database_sync_to_async(auto_label_jobs.cancel)(job_id)
+            else:
+                job = await database_sync_to_async(auto_label_jobs.status)(job_id)
+            if job is None:
+                self.auto_label_job_ids.discard(job_id)
+                await self.send(text_data=json.dumps({'type': 'Auto_Label_Job', 'Job_id': job_id, 'Status': 'unknown',
+                                                      'Message': 'No such auto labeling job (or it expired).'}))
+            else:
+                await self.on_auto_label_job(public_job(job))
 
-            # Update reset condition on receiving a new file path
-            self.handle_condition = True
-            logger.info(f"\nself.handle_condition is set to {self.handle_condition} in elif data['type'] == 'DashDisplayWithAutoLabel'\n")
-            
         #______________________________________________________________________________
         elif data_type == 'Refresh_Save_Undo_Delete':
             action_var = data['Action_var']
@@ -173,7 +175,13 @@ class ECGConsumer(AsyncWebsocketConsumer):
                         value = Data_to_Send)
             logger.info(f"\n+++++ Django sent Message Channel data to dpd.Pipe: {Data_to_Send}\n\tfor self.User_name = {self.User_name}\n\tin conditional elif data['type'] == 'Refresh_Save_Undo_Delete'")
 
-            if action_var in ('refresh', 'undo'):
+            if action_var in ('undo', 'redo') and get_annotation_backend() == 'database':
+                # The database backend keeps no edit history: undoing would have to guess the last edit
+                message = f"{action_var.capitalize()} is not available when the annotations are stored in the database."
+                logger.info(f"\t\t\tRefused '{action_var}': {message}\n")
+                await self.send(text_data=json.dumps({'type': 'Action_Refused', 'Action': action_var, 'Message': message}))
+
+            elif action_var in ('refresh', 'undo', 'redo'):
                 logger.info(f"\t\t\tConditional executed:\n\t\t\t\t\t\t-Action_var: {action_var}\n")
                 # Only send data if self.handle_condition is True
                 if self.handle_condition:
@@ -182,7 +190,8 @@ class ECGConsumer(AsyncWebsocketConsumer):
                     else:
                         self.count_number = 0
                     # Sending message to Pipe in DjangoDash 
-                    Data_to_Send = {'Action': action_var, 'Click_Order': self.count_number}
+                    # The annotation version the client last displayed: a stale edit is rejected (see StaleAnnotationVersion)
+                    Data_to_Send = {'Action': action_var, 'Click_Order': self.count_number, 'Annotation_Version': data.get('Annotation_Version')}
                     await async_send_to_pipe_channel(
                                 channel_name = 'This_Action_Channel',  # Fixed channel name for the second pipe
                                 label = 'This_Action',  # Fixed label for the second pipe
@@ -192,7 +201,7 @@ class ECGConsumer(AsyncWebsocketConsumer):
             elif action_var == 'delete':
                 logger.info(f"\t\t\tConditional executed:\n\t\t\t\t\t\t-Action_var: {action_var}\n")
                 if self.handle_condition:
-                    Data_to_Send = {'Action': action_var, 'Click_Order': data_var}
+                    Data_to_Send = {'Action': action_var, 'Click_Order': data_var, 'Annotation_Version': data.get('Annotation_Version')}
                     await async_send_to_pipe_channel(
                                 channel_name = 'This_Action_Channel',  # Fixed channel name for the second pipe
                                 label = 'This_Action',  # Fixed label for the second pipe
@@ -203,7 +212,12 @@ class ECGConsumer(AsyncWebsocketConsumer):
                 logger.info(f"\t\t\tConditional executed:\n\t\t\t\t\t\t-Action_var: {action_var}\n")
                 if self.current_file_path:
                     logger.info(f"\tCurrent file path: {self.current_file_path}")
-                    message, status = handle_annotation_to_csv(relative_file_path=self.current_file_path, task_to_do=action_var)
+                    # Off the event loop: file copies, or ORM queries with ANNOTATION_BACKEND = 'database'. In a thread of
+                    # its own (thread_sensitive=False): a long Save All must not hold the sync thread shared by every
+                    # consumer and view of the process
+                    progress_callback = self.make_save_progress_sender() if action_var == 'SaveAll' else None
+                    message, status = await database_sync_to_async(handle_annotation_to_csv, thread_sensitive=False)(
+                        relative_file_path=self.current_file_path, task_to_do=action_var, progress_callback=progress_callback)
                     await self.send(text_data=json.dumps({
                                                         'type': 'Save_Feedback',
                                                         'Message': message,
@@ -232,6 +246,61 @@ class ECGConsumer(AsyncWebsocketConsumer):
                         value = label_status)
             logger.info(f"\n+++++ Django sent Message updated_labels_status data to dpd.Pipe: {label_status}\n\tfor self.User_name = {self.User_name}\n\tin conditional elif data['type'] == 'labels_display_updated'")
 
+        #______________________________________________________________________________
+        elif data_type == 'Annotation_Query':
+            # Interval index queries: 'visible' (Start, End), 'hit' (Timestamp) or 'next_gap' (Timestamp)
+            query = data.get('Query')
+            if self.current_file_path:
+                result = await database_sync_to_async(query_annotations)(self.current_file_path, query,
+                                                                         start=data.get('Start'), end=data.get('End'),
+                                                                         timestamp=data.get('Timestamp'))
+            else:
+                result = {'error': 'No file is displayed'}
+            logger.info(f"\nAnswering Annotation_Query '{query}' for {self.current_file_path} with: {list(result)}\n")
+            await self.send(text_data=json.dumps({'type': 'Annotation_Query_Result', 'Query': query, **result}))
+
+        #______________________________________________________________________________
+        elif data_type == 'Annotation_Batch':
+            # Many add/delete/update edits at once, applied in one pass and one write (see handle_annotation_batch)
+            operations = data.get('Operations', [])
+            logger.info(f"\nDjango received an Annotation_Batch of {len(operations)} operation(s) for {self.current_file_path}\n")
+            if self.current_file_path:
+                summary = await database_sync_to_async(handle_annotation_batch)(self.current_file_path, operations,
+                                                                                data.get('Annotation_Version'))
+            else:
+                summary = {'added': 0, 'deleted': 0, 'updated': 0, 'Success': False, 'Message': 'No file is displayed'}
+            await self.send(text_data=json.dumps({'type': 'Annotation_Batch_Result', **summary}))
+
+            # Redraw the graph (and resend the annotations table) as after a 'delete'
+            if self.handle_condition and summary['Success']:
+                Data_to_Send = {'User_id': self.User_name}
+                await async_send_to_pipe_channel(
+                            channel_name = 'User_data_channel',
+                            label = 'User_data_Label',
+                            value = Data_to_Send)
+                self.count_number = 10 if self.count_number == 0 else 0
+                Data_to_Send = {'Action': 'batch', 'Click_Order': {**summary, 'Count': self.count_number}}
+                await async_send_to_pipe_channel(
+                            channel_name = 'This_Action_Channel',
+                            label = 'This_Action',
+                            value = Data_to_Send)
+                logger.info(f"\n+++++ Django sent Message Channel data to ppd.Pipe: {Data_to_Send}\n\tfor self.User_name = {self.User_name}")
+
+        #______________________________________________________________________________
+        elif data_type == 'BatchAutoLabel':
+            # Auto labels every data file of a folder (see run_auto_labeling_batch), in the background so this
+            # consumer keeps handling the other messages of the client meanwhile
+            folder = convert_path(html.unescape(data['Folder']))
+            logger.info(f"\nDjango received \n-folder to auto label: {folder} \n-and selected model: {data['model']}\n")
+            if self.auto_label_task and not self.auto_label_task.done():
+                await self.send(text_data=json.dumps({
+                    'type': 'Auto_Label_Batch_Result',
+                    'Success': False,
+                    'Message': 'A folder is already being auto labeled, wait for it to finish.',
+                }))
+            else:
+                self.auto_label_task = asyncio.create_task(self.auto_label_folder(folder, data['model']))
+
         #______________________________________________________________________________
         else:
             logger.error(f"\nUnknown message type received: {data_type}\n")
@@ -246,6 +315,7 @@ class ECGConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'type': 'DjangoDash_retrieved_data_message',
             'Existing_Data': existing_Data,
+            'Annotation_Version': event.get('Annotation_Version'),
         }))
         logger.info(f"\n----- Django sent retrieved_data to the client: \n{existing_Data}\n")
 
@@ -264,9 +334,23 @@ class ECGConsumer(AsyncWebsocketConsumer):
             'Click_indices': click_indices,
             'Item_number': item_number,
             'Color': segment_color,
+            'Annotation_Version': event.get('Annotation_Version'),
         }))
         logger.info(f"\n----- Django sent form submission annotation, click indices and item number to the client: \n{annotation}, \n{click_indices}, \n{item_number}\n")
 
+    async def annotation_conflict(self, event):
+        # This method is called when a message of type 'annotation_conflict' is sent to the group:
+        # an edit was made on annotations that changed since they were displayed, so it was not applied
+        logger.info(f"\n+++++ Django received an annotation conflict: {event['Message']}\n")
+
+        # Send the current annotations to the client, so the user can redo the edit on them
+        await self.send(text_data=json.dumps({
+            'type': 'Annotation_Conflict',
+            'Message': event['Message'],
+            'Annotation_Version': event['Annotation_Version'],
+            'Existing_Data': event['Existing_Data'],
+        }))
+
     async def labels_submission(self, event):
         # This method is called when a message of type 'labels_submission' is sent to the group
         labels_data = event['list_labels_display_status']
@@ -278,3 +362,98 @@ class ECGConsumer(AsyncWebsocketConsumer):
             'Labels_data': labels_data,
         }))
         logger.info(f"\n----- Django sent Labels_Pipe data to the client: {labels_data}\n")
+
+    async def ingest_progress(self, event):
+        # This method is called when a message of type 'ingest_progress' is sent to the group (chunked CSV ingest)
+        logger.info(f"\n+++++ Django received ingest progress: {event['file_path']}: {event['percent']}% ({event['rows']} rows), done: {event['done']}\n")
+
+        # Send the progress to the client
+        await self.send(text_data=json.dumps({
+            'type': 'Ingest_Progress',
+            'File_path': event['file_path'],
+            'Rows': event['rows'],
+            'Percent': event['percent'],
+            'Done': event['done'],
+        }))
+
+    async def auto_label_job(self, event):
+        # This method is called when a message of type 'auto_label_job' is sent to the group (job status change)
+        if event['Job']['Job_id'] in self.auto_label_job_ids:  # Not the jobs of the other tabs of this user
+            await self.on_auto_label_job(event['Job'])
+
+    async def on_auto_label_job(self, job: dict):
+        # Sends the status of a job to the client, and once it is done, lets update_graph render its predictions
+        await self.send(text_data=json.dumps({'type': 'Auto_Label_Job', **job}))
+        logger.info(f"\n----- Django sent the status of auto labeling job {job['Job_id']} to the client: {job['Status']}\n")
+        if job['Status'] not in FINISHED_STATUSES or job['Job_id'] not in self.auto_label_job_ids:
+            return
+        self.auto_label_job_ids.discard(job['Job_id'])  # Rendered once, whether this comes from the group or from polling
+        if job['Status'] != 'done' or job['File_path'] != self.current_file_path:
+            return
+
+        if self.handle_condition:
+            if self.count_auto_label == 0: 
+                self.count_auto_label += 10
+            else:
+                self.count_auto_label = 0
+
+        # Send the User ID to Pipe
+        Data_to_Send = {'User_id': self.User_name}
+        await async_send_to_pipe_channel(
+                    channel_name = 'User_data_channel',  # Fixed channel name for the first pipe
+                    label = 'User_data_Label',  # Fixed label for the first pipe
+                    value = Data_to_Send)
+        logger.info(f"\n+++++ Django sent Message Channel data to dpd.Pipe: {Data_to_Send}\n\tfor self.User_name = {self.User_name}\n\tin on_auto_label_job")
+
+        # Sending message to Pipe in DjangoDash 
+        Data_to_Send = {'File-path': job['File_path'], 'SelectedModel': job['Model'], 'Click_Order': self.count_auto_label, 'Job_id': job['Job_id']}
+        await async_send_to_pipe_channel(
+                    channel_name = 'Receive_Django_Message_Channel',
+                    label = 'Path_and_Model_label',
+                    value = Data_to_Send)
+        logger.info(f"\n+++++ Django sent Message Channel data to ppd.Pipe: {Data_to_Send}\n\tfor self.User_name = {self.User_name}")
+
+        # Update reset condition on receiving a new file path
+        self.handle_condition = True
+        logger.info(f"\nself.handle_condition is set to {self.handle_condition} in on_auto_label_job\n")
+
+    async def auto_label_folder(self, folder: str, selected_model: str):
+        from .dash_apps.finished_apps.display_ecg_graph import get_list_of_labels  # Imports the Dash app, only when used
+        labels_list = await database_sync_to_async(get_list_of_labels)()
+        # In a thread of its own (thread_sensitive=False): the batch lasts minutes and must not hold the sync thread
+        # shared by every consumer and view of the process (the files are labeled by the worker processes)
+        summary = await database_sync_to_async(run_auto_labeling_batch, thread_sensitive=False)(
+            folder, selected_model, labels_list, progress_callback=self.make_auto_label_progress_sender())
+        await self.send(text_data=json.dumps({'type': 'Auto_Label_Batch_Result', 'Folder': folder, **summary}))
+        logger.info(f"\n----- Django sent Auto_Label_Batch_Result to the client: {summary['Message']}\n")
+
+    def make_auto_label_progress_sender(self):
+        """
+        Builds the progress callback of run_auto_labeling_batch, which runs in a thread: as for Save All
+        (see make_save_progress_sender), the progress is sent straight to the client.
+        """
+        def send_progress(files_done: int, files_to_label: int, failed_files: list, done: bool):
+            async_to_sync(self.send)(text_data=json.dumps({
+                'type': 'Auto_Label_Progress',
+                'Files_done': files_done,
+                'Files_to_label': files_to_label,
+                'Failed_files': failed_files,
+                'Done': done,
+            }))
+        return send_progress
+
+    def make_save_progress_sender(self):
+        """
+        Builds the progress callback of save_all_annotations_to_csv. It runs in the thread of the save, while this
+        consumer is still busy in receive() (group messages would only be handled after the save), so it sends
+        the progress straight to the client.
+        """
+        def send_progress(files_done: int, files_to_save: int, failed_files: list, done: bool):
+            async_to_sync(self.send)(text_data=json.dumps({
+                'type': 'Save_Progress',
+                'Files_done': files_done,
+                'Files_to_save': files_to_save,
+                'Failed_files': failed_files,
+                'Done': done,
+            }))
+        return send_progress
@@ -8,12 +8,17 @@ import datetime
 import dpd_components as dpd
 import pandas as pd
 from lxml import etree
-from dash import dcc, html, Output, Input, State
+from dash import dcc, html, Output, Input, State, Patch
 from django_plotly_dash import DjangoDash
 from dash.exceptions import PreventUpdate
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from home.utils import handle_annotation_to_csv, read_csv_file, plot_with_plotly
+from home.utils import (handle_annotation_to_csv, read_csv_file, plot_with_plotly, open_plot_series_store,
+                        compute_plot_rows, highlight_trace, segment_trace, merged_segment_values, merged_segment_trace,
+                        merged_segment_trace_name, label_display_status, get_figure_input_versions, get_annotations_with_index,
+                        get_annotation_version, PLOT_HIGHLIGHT_TRACE, PLOT_FIRST_SEGMENT_TRACE)
+from home.annotation_journal import StaleAnnotationVersion
+from home.auto_label_jobs import auto_label_jobs
 
 
 # Setup logger
@@ -112,6 +117,7 @@ app.layout = html.Div([
     dcc.Store(id='click-data', data= {'Indices': [], 'Manual': None}, storage_type='memory'),  # Store for click data
     # dcc.Store(id='Button_Action_Store', data=None, storage_type='memory'),  # Store for handling consecutive 'undo' or 'refresh' actions.
     dcc.Store(id='dummy-output', data=None, storage_type='memory'),
+    dcc.Store(id='figure-fingerprint', data=None, storage_type='memory'),  # File, versions, viewport and trace layout of the displayed figure
     dcc.Store(id='dummy-output_2', data=None, storage_type='memory'),  # I seem forced to use it, but it is not triggering anything
     dcc.Store(id='store_session_user_data', data={'User_name': None, 'Status': 'Empty'}, storage_type='memory'), # I am using this to prevent all instances of the app to be updated for all users.
     html.Div(
@@ -248,14 +254,12 @@ def handle_form_submission(submit_n_clicks, input_value, clicks, file_path_data,
                 'Label': sanitized_input,
                 'Color': segment_color,  # By default for now, later will include a condition for choosing the color
             }
-            handle_annotation_to_csv(relative_file_path=file_path_data, annotation_data=annotation_data, task_to_do='add')
-            logger.info(f"Executed handle_annotation_to_csv function to add new annotations to a CSV file.\n")
-            
-            existing_values = handle_annotation_to_csv(relative_file_path=file_path_data, task_to_do='retrieve')
-            logger.info(f"Executed handle_annotation_to_csv function: \n\t\tretrieved existing_values = \n{existing_values}\n")
+            # The added annotation comes back with its item number, no need to retrieve the whole file
+            added_values = handle_annotation_to_csv(relative_file_path=file_path_data, annotation_data=annotation_data, task_to_do='add')
+            logger.info(f"Executed handle_annotation_to_csv function to add new annotations: \n\t\tadded_values = {added_values}\n")
 
-            if existing_values:
-                last_item = existing_values[-1]
+            if added_values:
+                last_item = added_values[-1]
                 logger.info(f"The last item in existing_values is: \n{json.dumps(last_item, indent=4)}\n")
 
                 # Check if last item matches annotation_data
@@ -274,15 +278,16 @@ def handle_form_submission(submit_n_clicks, input_value, clicks, file_path_data,
                             "annotation": sanitized_input,
                             "click_indices": click_indices,  # Include click indices in the sent data
                             "item_number": last_item_number,  # Current item number
-                            'Color': segment_color # Color corresponding to the annotation
+                            'Color': segment_color, # Color corresponding to the annotation
+                            'Annotation_Version': get_annotation_version(file_path_data),  # Sent back with the next edits
                         }
                     )
                     logger.info(f"async_to_sync was executed to send sanitized_input data along with click indices to Django.\n")
-                    return annotation_data  # Return some dummy data
+                    return {**annotation_data, 'Item Number': last_item_number}  # The new annotation, patched into the figure by update_graph
                 else:
                     logger.warning("Last item does not match annotation_data. Group send aborted.\n")
             else:
-                logger.warning("The list of existing values is empty. Group send aborted.")
+                logger.warning("The annotation could not be added. Group send aborted.")
             raise PreventUpdate
         else:
             logger.warning(f"This is strange. The callback shouldn't have been triggered.\n")
@@ -397,20 +402,41 @@ def store_click_data(click_data, file_path_and_model_data, file_path_data, Actio
             logger.info(f"Resetting click-data to: {json.dumps(reset_dic, indent=4)}.\n\n")
             return reset_dic
         
-        elif trigger_id == 'Button_Action': # 'refresh' or 'undo' or 'delete
+        elif trigger_id == 'Button_Action': # 'refresh' or 'undo' or 'redo' or 'delete' or 'batch'
             logger.info(f"\t\t\tConditional executed in store_click_data callback:\n\t\t\t\t\t\t-Action_var: {Action_var}\n")
             action_to_take = Action_var['Action']
             data_to_delete = Action_var['Click_Order']
+            # Version of the annotations the user acted on, None from older clients (no check)
+            expected_version = Action_var.get('Annotation_Version')
             if file_path_data:
-                # Check if data_to_delete is a list and if it is empty or not
-                if action_to_take == 'delete':
-                # if isinstance(data_to_delete, list):
-                    # Handle 'Delete' button action
-                    logger.info(f"Data to delete: \n\t\tdata_to_delete = {data_to_delete}\n")
-                    handle_annotation_to_csv(relative_file_path=file_path_data, task_to_do=action_to_take, delete_data=data_to_delete)
-                else:
-                    # Handle 'refresh' or 'undo' action
-                    handle_annotation_to_csv(relative_file_path=file_path_data, task_to_do=action_to_take)
+                try:
+                    # Check if data_to_delete is a list and if it is empty or not
+                    if action_to_take == 'delete':
+                    # if isinstance(data_to_delete, list):
+                        # Handle 'Delete' button action
+                        logger.info(f"Data to delete: \n\t\tdata_to_delete = {data_to_delete}\n")
+                        handle_annotation_to_csv(relative_file_path=file_path_data, task_to_do=action_to_take, delete_data=data_to_delete,
+                                                 expected_version=expected_version)
+                    elif action_to_take == 'batch':
+                        # Already applied by the consumer (handle_annotation_batch), only the click data is updated
+                        logger.info(f"Annotation batch applied: \n\t\t{data_to_delete}\n")
+                    else:
+                        # Handle 'refresh' or 'undo' or 'redo' action
+                        handle_annotation_to_csv(relative_file_path=file_path_data, task_to_do=action_to_take, expected_version=expected_version)
+                except StaleAnnotationVersion as conflict:
+                    # Another tab or user changed the annotations since they were displayed: nothing was applied,
+                    # the client gets the current annotations (the graph is redrawn below like after an edit)
+                    logger.warning(f"Rejected a stale '{action_to_take}': {conflict}\n")
+                    channel_layer = get_channel_layer()
+                    async_to_sync(channel_layer.group_send)(
+                        f"ecg_analysis_{pipe_user_name}",  # This is the group name that your consumer should be listening to
+                        {
+                            "type": "annotation_conflict",  # This should match a method in consumer
+                            "Message": f"The annotations changed since they were displayed, the {action_to_take} was not applied.",
+                            "Annotation_Version": conflict.current_version,
+                            "Existing_Data": handle_annotation_to_csv(relative_file_path=file_path_data, task_to_do='retrieve'),
+                        }
+                    )
                 # Retrieve existing data
                 existing_values = handle_annotation_to_csv(relative_file_path=file_path_data, task_to_do='retrieve')
                 if existing_values:
@@ -472,22 +498,152 @@ def store_click_data(click_data, file_path_and_model_data, file_path_data, Actio
     else:
         raise PreventUpdate
 
+def parse_relayout_x_range(relayout_data: dict):
+    """
+    Extracts the x axis window from the graph's relayoutData.
+
+    Returns:
+    - tuple | None: ('range', [start, end]) after a zoom or pan, ('autorange', None) after a reset
+                    (double click, autoscale), or None for events that don't change the x axis (e.g. autosize).
+    """
+    if not relayout_data:
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return 'range', [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
+    if isinstance(relayout_data.get('xaxis.range'), list):
+        return 'range', list(relayout_data['xaxis.range'])
+    if relayout_data.get('xaxis.autorange'):
+        return 'autorange', None
+    return None
+
+def build_figure_fingerprint(file_path: str, viewport, highlight, labels_pipe_value: list) -> dict:
+    """
+    Lightweight description of a figure, kept in the 'figure-fingerprint' store instead of sending the whole
+    figure back as State: two figures with equal fingerprints (see same_figure) are identical, so it tells
+    update_graph whether anything must be resent, and can serve as the key of a server-side figure cache.
+
+    Parameters:
+    - file_path (str): Relative path of the plotted data file.
+    - viewport (list | None): [start, end] of the x axis window, None for the whole series.
+    - highlight (list | None): [x1, x2] of the highlighted click selection, if any.
+    - labels_pipe_value (list[dict]): Labels display status, only the hidden labels are recorded.
+
+    Returns:
+    - dict: 'file', 'data_version', 'annotation_version', 'viewport', 'highlight' and 'hidden_labels'
+            ('figure', the trace layout from fig.layout.meta, is added once the figure is built).
+    """
+    data_version, annotation_version = get_figure_input_versions(file_path)
+    return {
+        'file': file_path,
+        'data_version': data_version,
+        'annotation_version': annotation_version,
+        'viewport': viewport,
+        'highlight': highlight,
+        'hidden_labels': sorted(label['value'] for label in labels_pipe_value or [] if label.get('display', 0) != 1),
+    }
+
+def same_figure(fingerprint: dict, other_fingerprint: dict) -> bool:
+    return bool(fingerprint and other_fingerprint) and all(
+        fingerprint.get(key) == other_fingerprint.get(key)
+        for key in ('file', 'data_version', 'annotation_version', 'viewport', 'highlight', 'hidden_labels'))
+
+def clear_highlight(patched_figure: Patch):
+    highlight = patched_figure['data'][PLOT_HIGHLIGHT_TRACE]
+    highlight['x'] = []
+    highlight['y'] = []
+    highlight['showlegend'] = False
+
+def patch_figure(trigger_id: str, file_path_data: str, fingerprint: dict, clicks: dict, dummy_output: dict, labels_pipe_value: list):
+    """
+    Builds a partial update (dash.Patch) of the displayed figure for the triggers that only touch a few traces,
+    so the base waveform isn't sent again: a label visibility toggle restyles the annotation traces, a click
+    selection or a cancel replaces the highlight trace, and a new annotation adds (or extends) one trace.
+    Relies on the trace layout of plot_with_plotly (see PLOT_HIGHLIGHT_TRACE and fig.layout.meta).
+
+    Returns:
+    - tuple | None: The (figure, figure-fingerprint) outputs of update_graph, or None when the figure
+                    must be rebuilt (another file or data version displayed, unexpected trigger data).
+    """
+    figure_meta = (fingerprint or {}).get('figure')
+    if not (file_path_data and figure_meta and fingerprint.get('file') == file_path_data and 'trace_labels' in figure_meta):
+        return None
+    viewport = fingerprint.get('viewport')
+    patched_figure = Patch()
+
+    if trigger_id == 'Labels_Pipe':
+        for offset, label_name in enumerate(figure_meta['trace_labels']):
+            patched_figure['data'][PLOT_FIRST_SEGMENT_TRACE + offset]['visible'] = label_display_status(labels_pipe_value, label_name)
+        logger.info(f"\n update_graph patched the visibility of {len(figure_meta['trace_labels'])} annotation traces.\n")
+        return patched_figure, {**fingerprint, **build_figure_fingerprint(file_path_data, viewport, fingerprint.get('highlight'), labels_pipe_value)}
+
+    if trigger_id == 'cancel-button':
+        clear_highlight(patched_figure)
+        logger.info(f"\n update_graph patched out the highlighted segment.\n")
+        return patched_figure, {**fingerprint, **build_figure_fingerprint(file_path_data, viewport, None, labels_pipe_value)}
+
+    if trigger_id == 'click-data':
+        if not (clicks and clicks.get('Manual') and len(clicks.get('Indices', [])) == 2):
+            return None  # Programmatic click-data updates follow refresh/undo/delete, which change the annotations
+    elif trigger_id != 'dummy-output' or not (dummy_output and 'Item Number' in dummy_output):
+        return None
+
+    # Same rows as the displayed base trace, so the patched segments line up with it
+    if get_figure_input_versions(file_path_data)[0] != fingerprint.get('data_version'):
+        return None  # The data file changed since the figure was built
+    data, _ = read_csv_file(file_path_data, 3) # Function in home.utils (served from the series cache)
+    plot_rows = compute_plot_rows(data, x_range=viewport, series_store=open_plot_series_store(file_path_data))
+    render_mode = figure_meta['render_mode']
+
+    if trigger_id == 'click-data':
+        patched_figure['data'][PLOT_HIGHLIGHT_TRACE] = highlight_trace(data, plot_rows, clicks['Indices'], render_mode).to_plotly_json()
+        logger.info(f"\n update_graph patched the highlighted segment {clicks['Indices']}.\n")
+        return patched_figure, {**fingerprint, **build_figure_fingerprint(file_path_data, viewport, clicks['Indices'], labels_pipe_value)}
+
+    # New annotation: the highlight goes away and the annotation gets its trace (or joins its label's trace)
+    clear_highlight(patched_figure)
+    new_item = dummy_output
+    label_name = new_item.get('Label', 'Unknown trend')
+    visible = label_display_status(labels_pipe_value, label_name)
+    figure_meta = {**figure_meta, 'trace_labels': list(figure_meta['trace_labels']), 'trace_counts': list(figure_meta['trace_counts'])}
+    if figure_meta['segment_mode'] == 'merged' and label_name in figure_meta['trace_labels']:
+        offset = figure_meta['trace_labels'].index(label_name)
+        x, y, customdata = merged_segment_values(data, plot_rows, [new_item])
+        label_trace = patched_figure['data'][PLOT_FIRST_SEGMENT_TRACE + offset]
+        # A gap point first, to separate the new segment from the label's previous ones
+        label_trace['x'].extend([None] + [None if pd.isna(timestamp) else timestamp.isoformat() for timestamp in x])
+        label_trace['y'].extend([None] + [None if pd.isna(value) else float(value) for value in y])
+        label_trace['customdata'].extend([None] + list(customdata))
+        figure_meta['trace_counts'][offset] += 1
+        label_trace['name'] = merged_segment_trace_name(label_name, new_item['Color'], figure_meta['trace_counts'][offset])
+    else:
+        if figure_meta['segment_mode'] == 'merged':
+            new_trace = merged_segment_trace(data, plot_rows, label_name, [new_item], visible, render_mode)
+        else:
+            new_trace = segment_trace(data, plot_rows, new_item, visible, render_mode)
+        patched_figure['data'].append(new_trace.to_plotly_json())
+        figure_meta['trace_labels'].append(label_name)
+        figure_meta['trace_counts'].append(1)
+    logger.info(f"\n update_graph patched in the new annotation: Item {new_item['Item Number']} ({label_name}).\n")
+    return patched_figure, {**build_figure_fingerprint(file_path_data, viewport, None, labels_pipe_value), 'figure': figure_meta}
+
 # This callback will update the DjangoDash app
 @app.callback(
-    Output('ecg-graph', 'figure'),
+    [Output('ecg-graph', 'figure'),
+     Output('figure-fingerprint', 'data')],
     [Input('FilePath', 'value'),
      Input('FilePath_and_Model', 'value'),
      Input('click-data', 'data'), 
      Input('cancel-button', 'n_clicks'),
      Input('dummy-output', 'data'), # Dummy input after the annotation is entered in the working csv file in handle_form_submission callback
-     Input('Labels_Pipe', 'value')],  # Input for determining the display status of each label (display or not) 
+     Input('Labels_Pipe', 'value'),  # Input for determining the display status of each label (display or not) 
+     Input('ecg-graph', 'relayoutData')],  # Zoom/pan: re-fetch the zoomed window at full resolution
     [State('Button_Action', 'value'),
      State('session_user_id', 'value'),
      State('store_session_user_data', 'data'),
-     State('ecg-graph', 'figure'),] # ------------------------------------------------------Use this state to reduce redundancy
+     State('figure-fingerprint', 'data')]  # Describes the displayed figure, which is never sent back to the server
     # prevent_initial_call=False # Allow the initial call to trigger the callback 
 )
-def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clicks, dummy_output, labels_pipe_value, Action_var, user_id_pipe, stored_user_data_pipe, state_fig, callback_context):    
+def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clicks, dummy_output, labels_pipe_value, relayout_data, Action_var, user_id_pipe, stored_user_data_pipe, fingerprint, callback_context):    
     # if not callback_context.triggered:
     if not callback_context.triggered or (callback_context.triggered[0]['prop_id'].split('.')[0] == 'dummy-output' and dummy_output is None):
         logger.info(f"\n\nupdate_graph callback triggered for initialization of the Dashboard: \n")
@@ -506,8 +662,7 @@ def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clic
                     Button_Action: {Action_var}\n
                     Labels_Pipe: {labels_pipe_value}\n
                     """)
-                    # state_fig: {state_fig}\n
-        return fig
+        return fig, None
     
     # Only proceed if the (stored_user_name and pipe_user_name == stored_user_name)
     pipe_user_name = user_id_pipe['User_id']
@@ -532,7 +687,6 @@ def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clic
                     Button_Action: {Action_var}
                     Labels_Pipe: {labels_pipe_value}\n
                     """)
-                    # state_fig: {state_fig}\n
 
         panda_data_retrieved = pd.DataFrame()
         plot_title = f"No Data Available."
@@ -544,6 +698,16 @@ def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clic
         click_data_values = None
         global data_tz  # Use global variable to update data_tz, defined at the top of the file
 
+        viewport = fingerprint.get('viewport') if fingerprint else None
+        if trigger_id in ('FilePath', 'FilePath_and_Model'):
+            viewport = None  # A new file (or a fresh auto labeling) starts with the whole series in view
+
+        # Label toggles, click selections, cancels and new annotations only touch a few traces: patch them in place
+        if trigger_id in ('Labels_Pipe', 'cancel-button', 'click-data', 'dummy-output'):
+            patched_outputs = patch_figure(trigger_id, file_path_data, fingerprint, clicks, dummy_output, labels_pipe_value)
+            if patched_outputs is not None:
+                return patched_outputs
+
         if trigger_id == 'FilePath':
             logger.info(f"\n update_graph received \n\t-file_path_data: '{file_path_data}' (type: {type(file_path_data)})\n")
             channel_layer = get_channel_layer()
@@ -556,6 +720,7 @@ def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clic
                     {
                         "type": "retrieved_data",  # This should match a method in consumer
                         "Existing_Data": existing_values,
+                        "Annotation_Version": get_annotation_version(file_path_data),
                     }
                 )
                 logger.info(f"async_to_sync was executed to send Retrieved Data to Django.\n")
@@ -582,15 +747,20 @@ def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clic
             selected_model = file_path_and_model_data['SelectedModel']
             logger.info(f"\n update_graph received \n\t-file_path: '{file_path}' (type: {type(file_path)}) \n\t-and selected_model: '{selected_model}' (type: {type(selected_model)})\n")
             if file_path and selected_model:
-                labels_list = get_list_of_labels()
-                existing_values = handle_annotation_to_csv(relative_file_path=file_path, selected_model=selected_model, task_to_do='Auto_Label', labels_list=labels_list)
-                logger.info(f"In update_graph callback, \n\texecuted handle_annotation_to_csv function for auto labeling and \n\t\tretrieved existing_values = \n{existing_values}\n")
+                # The job queue ran the model (see home.auto_label_jobs): only render its predictions once they are written
+                job = auto_label_jobs.status(file_path_and_model_data.get('Job_id'))
+                if not job or job['Status'] != 'done' or job['File_path'] != file_path:
+                    logger.info(f"\n update_graph skips auto labeling job {file_path_and_model_data.get('Job_id')}, not done: {job and job['Status']}\n")
+                    raise PreventUpdate
+                existing_values = handle_annotation_to_csv(relative_file_path=file_path, task_to_do='retrieve')
+                logger.info(f"In update_graph callback, \n\tretrieved the annotations written by auto labeling job {job['Job_id']}: existing_values = \n{existing_values}\n")
                 channel_layer = get_channel_layer()
                 async_to_sync(channel_layer.group_send)(
                     f"ecg_analysis_{user_id}",  # This is the group name that your consumer should be listening to
                     {
                         "type": "retrieved_data",  # This should match a method in consumer
                         "Existing_Data": existing_values,
+                        "Annotation_Version": get_annotation_version(file_path),
                     }
                 )
                 logger.info(f"async_to_sync was executed to send Retrieved Data to Django.\n")
@@ -634,6 +804,7 @@ def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clic
                         {
                             "type": "retrieved_data",  # This should match a method in your consumer
                             "Existing_Data": existing_values,
+                            "Annotation_Version": get_annotation_version(file_path_data),
                         }
                     )
                     logger.info(f"async_to_sync was executed to send Retrieved Data to Django.\n")
@@ -661,11 +832,36 @@ def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clic
             else:
                 logger.info(f"\nNo valid file path or channel data received in DjangoDash: \n-file_path_data: '{file_path_data}' (type: {type(file_path_data)})\n")
                 logger.info(f"\n'else condition' panda_data_retrieved length: {len(panda_data_retrieved)}\n")
+
+        elif trigger_id == 'ecg-graph':
+            x_axis_change = parse_relayout_x_range(relayout_data)
+            if x_axis_change is None or not file_path_data:
+                raise PreventUpdate  # Autosize, y axis only changes, or nothing displayed yet
+            viewport = x_axis_change[1]
+            highlight = clicks['Indices'] if clicks and clicks.get('Manual') and len(clicks.get('Indices', [])) == 2 else None
+            if same_figure(build_figure_fingerprint(file_path_data, viewport, highlight, labels_pipe_value), fingerprint):
+                raise PreventUpdate  # The browser already displays this exact figure
+            logger.info(f"\n update_graph is re-rendering the x axis window {viewport} (relayoutData: {relayout_data})\n")
+            existing_values = handle_annotation_to_csv(relative_file_path=file_path_data, task_to_do='retrieve')
+            panda_data_retrieved, data_tz = read_csv_file(file_path_data, 3) # Function in home.utils
+            plot_title = f"Loading data with existing annotations!"
+            Title_Color = 'green'
+            click_data_values = highlight  # Keep the selection being annotated highlighted
         
         logger.info(f"len(panda_data_retrieved) = {len(panda_data_retrieved)}")
+        plotted_file_path = file_path_and_model_data['File-path'] if trigger_id == 'FilePath_and_Model' else file_path_data
         if len(panda_data_retrieved)==0:
             plot_title = 'There is no data to plot!'
             Title_Color = 'orange'
+            series_store = None
+        else:
+            # The precomputed min/max pyramid of the file makes the downsampling a simple slicing
+            series_store = open_plot_series_store(plotted_file_path)
+        annotation_index = None
+        if viewport and existing_values:
+            # Zoomed in: the interval index picks the annotations of the window (same snapshot as the index)
+            data_tz = str(panda_data_retrieved.index.tz) if getattr(panda_data_retrieved.index, 'tz', None) is not None else None
+            existing_values, annotation_index = get_annotations_with_index(plotted_file_path, data_tz)
         fig = plot_with_plotly(
             data=panda_data_retrieved,
             title=plot_title,
@@ -674,10 +870,19 @@ def update_graph(file_path_data, file_path_and_model_data, clicks, cancel_n_clic
             Title_Color=Title_Color,
             labels_pipe_value=labels_pipe_value,
             existing_values=existing_values,
-            click_data=click_data_values
+            click_data=click_data_values,
+            x_range=viewport,
+            series_store=series_store,
+            annotation_index=annotation_index
         )
         logger.info(f"Global data_tz time zone: {data_tz} (type: {type(data_tz)})")
-        return fig
+        # What the next callbacks need to skip or patch this figure instead of rebuilding it
+        if len(panda_data_retrieved):
+            fingerprint = build_figure_fingerprint(plotted_file_path, viewport, click_data_values, labels_pipe_value)
+            fingerprint['figure'] = fig.layout.meta
+        else:
+            fingerprint = None
+        return fig, fingerprint
     else:
         raise PreventUpdate
 
@@ -0,0 +1,18 @@
+
+# home/management/commands/auto_label_worker.py
+from django.conf import settings  # Import Django settings
+from django.core.management.base import BaseCommand, CommandError
+from home.auto_label_jobs import auto_label_jobs
+
+class Command(BaseCommand):
+    help = ("Runs the auto labeling jobs queued by the web server (Auto-label button), one after the other, until interrupted. "
+            "Start as many workers as wanted; they share the Redis broker (AUTO_LABEL_JOB_BROKER = 'redis').")
+
+    def handle(self, *args, **options):
+        if getattr(settings, 'AUTO_LABEL_JOB_BROKER', 'redis') != 'redis':
+            raise CommandError("The in-process job broker only runs jobs in the web server: set AUTO_LABEL_JOB_BROKER to 'redis'.")
+        self.stdout.write("Waiting for auto labeling jobs (Ctrl+C to stop)...")
+        try:
+            auto_label_jobs.work()
+        except KeyboardInterrupt:
+            self.stdout.write("Auto labeling worker stopped.")
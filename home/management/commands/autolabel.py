@@ -0,0 +1,31 @@
+
+# home/management/commands/autolabel.py
+from django.core.management.base import BaseCommand, CommandError
+from home.utils import get_models, run_auto_labeling_batch
+
+class Command(BaseCommand):
+    help = ("Auto labels every CSV data file of a folder under Raw_Time_Series_Data (subfolders included) with a model, "
+            "in a pool of worker processes. The predictions replace the annotations of each file, as the Auto-label button does.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('folder', help="Folder relative to MEDIA_ROOT, e.g. 'Raw_Time_Series_Data/SubFolder'")
+        parser.add_argument('--model', required=True, help="Model name, as listed in _Models_List.csv")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: AUTO_LABEL_WORKERS)")
+
+    def handle(self, *args, **options):
+        from home.dash_apps.finished_apps.display_ecg_graph import get_list_of_labels  # Same labels as the web interface
+
+        models_info = get_models()
+        if options['model'] not in models_info:
+            raise CommandError(f"Unknown model '{options['model']}'. Available models: {', '.join(m for m in models_info if m != 'error')}")
+
+        def report_progress(files_done: int, files_to_label: int, failed_files: list, done: bool):
+            self.stdout.write(f"{files_done}/{files_to_label} file(s) done, {len(failed_files)} failed")
+
+        summary = run_auto_labeling_batch(options['folder'], options['model'], get_list_of_labels(),
+                                          max_workers=options['workers'], progress_callback=report_progress)
+        for failed_file in summary['Failed_files']:
+            self.stderr.write(f"Failed: {failed_file}")
+        if not summary['Success']:
+            raise CommandError(summary['Message'])
+        self.stdout.write(self.style.SUCCESS(f"{summary['Message']} {summary['Ranges']} range(s) written."))
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.4 on 2026-10-16 22:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnnotationSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_path', models.CharField(max_length=500, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('next_sequence', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Annotation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveBigIntegerField()),
+                ('start_index', models.CharField(max_length=64)),
+                ('end_index', models.CharField(max_length=64)),
+                ('start_time', models.DateTimeField(null=True)),
+                ('end_time', models.DateTimeField(null=True)),
+                ('label', models.CharField(max_length=100)),
+                ('color', models.CharField(blank=True, max_length=50)),
+                ('annotation_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='annotations', to='home.annotationset')),
+            ],
+            options={
+                'ordering': ['annotation_set', 'sequence'],
+                'indexes': [models.Index(fields=['annotation_set', 'start_time'], name='annotation_set_start_idx'), models.Index(fields=['annotation_set', 'label'], name='annotation_set_label_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='annotation',
+            constraint=models.UniqueConstraint(fields=('annotation_set', 'sequence'), name='unique_annotation_sequence'),
+        ),
+    ]
@@ -0,0 +1,154 @@
+
+# home/model_registry.py
+import os
+import threading
+import logging
+from collections import OrderedDict
+from django.conf import settings  # Import Django settings
+
+# Setup logger
+logger = logging.getLogger('home')
+
+class ModelRegistry:
+    """
+    Process-wide, byte-bounded LRU of instantiated prediction models, already in eval() mode on their device.
+
+    Entries are keyed by (absolute model file path, mtime_ns, input_size), so a checkpoint replaced on disk
+    is loaded again instead of being served from a stale entry. The models are shared between callers:
+    only run them for inference (eval() mode, torch.no_grad()), never train or modify them in place.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (model, size_in_bytes)
+        self._lock = threading.Lock()  # Dash callbacks run in worker threads
+        self._load_lock = threading.Lock()  # One load at a time: concurrent requests for a model wait for its first load
+
+    @staticmethod
+    def make_key(model_path, input_size: int) -> tuple | None:
+        """
+        Returns:
+        - tuple | None: (absolute path, mtime_ns, input_size), or None if the model file cannot be stat'ed.
+        """
+        try:
+            absolute_path = os.path.abspath(model_path)
+            return absolute_path, os.stat(absolute_path).st_mtime_ns, int(input_size)
+        except OSError:
+            return None
+
+    @staticmethod
+    def model_bytes(model) -> int:
+        """Memory held by the parameters and buffers of a torch module."""
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+    def get(self, key: tuple, count_hit: bool = False):
+        """
+        Returns the model for the key (marking it as most recently used), or None on a miss.
+        count_hit adds a found model to the hits, under the same lock.
+        """
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            if count_hit:
+                self.hits += 1
+            return entry[0]
+
+    def get_or_load(self, model_path, input_size: int, loader):
+        """
+        Returns the resident model, loading it with loader() (which must return it in eval() mode) on a miss.
+
+        Parameters:
+        - model_path: Checkpoint file of the model.
+        - input_size (int): Number of input features the model is built for.
+        - loader (callable): Builds the model and loads its checkpoint, called without arguments.
+        """
+        key = self.make_key(model_path, input_size)
+        model = self.get(key, count_hit=True)
+        if model is not None:
+            return model
+        with self._load_lock:
+            model = self.get(key, count_hit=True)  # Loaded by another thread in the meantime
+            if model is not None:
+                return model
+            with self._lock:
+                self.misses += 1
+            model = loader()
+            self.put(key, model)
+        return model
+
+    def put(self, key: tuple, model, size_in_bytes: int = None) -> bool:
+        """
+        Stores a model, then evicts least recently used models until the byte budget is respected.
+        Models larger than the whole budget are not kept.
+
+        Returns:
+        - bool: True if the model is now resident.
+        """
+        if key is None:
+            return False
+        if size_in_bytes is None:
+            size_in_bytes = self.model_bytes(model)
+        if size_in_bytes > self.max_bytes:
+            logger.info(f"Not keeping {key[0]} resident: {size_in_bytes} bytes exceeds the model registry budget of {self.max_bytes} bytes.")
+            return False
+        with self._lock:
+            # Older versions of the same checkpoint can never be hit again, drop them right away
+            self._remove_locked(lambda entry_key: entry_key[0] == key[0] and entry_key[2] == key[2])
+            self._entries[key] = (model, size_in_bytes)
+            self.current_bytes += size_in_bytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+                logger.info(f"Evicted from model registry: {evicted_key[0]} ({evicted_size} bytes)")
+        return True
+
+    def has_room(self) -> bool:
+        with self._lock:
+            return self.current_bytes < self.max_bytes
+
+    def invalidate(self, model_path) -> int:
+        """
+        Drops every resident version of a model, e.g. after its checkpoint was deleted.
+
+        Returns:
+        - int: The number of entries removed.
+        """
+        absolute_path = os.path.abspath(model_path)
+        with self._lock:
+            return self._remove_locked(lambda entry_key: entry_key[0] == absolute_path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove_locked(self, matches) -> int:
+        stale_keys = [key for key in self._entries if matches(key)]
+        for key in stale_keys:
+            _, size_in_bytes = self._entries.pop(key)
+            self.current_bytes -= size_in_bytes
+        return len(stale_keys)
+
+# Single registry shared by every auto labeling run in this process
+model_registry = ModelRegistry(max_bytes=getattr(settings, 'MODEL_REGISTRY_MAX_BYTES', 256 * 1024 * 1024))
@@ -1,3 +1,42 @@
 from django.db import models
 
 # Create your models here.
+
+class AnnotationSet(models.Model):
+    """
+    The annotations of one raw data file (the database counterpart of its working CSV file).
+    """
+    file_path = models.CharField(max_length=500, unique=True)  # Data file path relative to MEDIA_ROOT
+    version = models.PositiveBigIntegerField(default=0)  # Incremented by every edit
+    next_sequence = models.PositiveBigIntegerField(default=0)  # Next Annotation.sequence to hand out
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_path} (version {self.version})"
+
+class Annotation(models.Model):
+    """
+    One annotated range. Item numbers are not stored: they are the 1-based positions in sequence order,
+    as in the CSV files, so deletions never require renumbering rows.
+    """
+    annotation_set = models.ForeignKey(AnnotationSet, on_delete=models.CASCADE, related_name='annotations')
+    sequence = models.PositiveBigIntegerField()  # Order of insertion within the set
+    start_index = models.CharField(max_length=64)  # Boundaries exactly as received ('Start Index' / 'End Index')
+    end_index = models.CharField(max_length=64)
+    start_time = models.DateTimeField(null=True)  # Parsed boundaries, for ranged queries
+    end_time = models.DateTimeField(null=True)
+    label = models.CharField(max_length=100)
+    color = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        ordering = ['annotation_set', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['annotation_set', 'sequence'], name='unique_annotation_sequence'),
+        ]
+        indexes = [
+            models.Index(fields=['annotation_set', 'start_time'], name='annotation_set_start_idx'),
+            models.Index(fields=['annotation_set', 'label'], name='annotation_set_label_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.label}: {self.start_index} - {self.end_index}"
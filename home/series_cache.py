@@ -0,0 +1,115 @@
+
+# home/series_cache.py
+import os
+import threading
+import logging
+from collections import OrderedDict
+from django.conf import settings  # Import Django settings
+
+# Setup logger
+logger = logging.getLogger('home')
+
+class SeriesCache:
+    """
+    Process-wide, byte-bounded LRU cache for parsed time-series DataFrames.
+
+    Entries are keyed by (absolute path, mtime_ns, size) so a file that changes on disk
+    can never be served from a stale entry. The cached DataFrames are shared between
+    callers and must be treated as read-only (filter or copy them, never modify in place).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, size_in_bytes)
+        self._lock = threading.Lock()  # Dash callbacks run in worker threads
+
+    @staticmethod
+    def make_key(full_file_path) -> tuple | None:
+        """
+        Builds the cache key of a file from its absolute path, modification time and size.
+
+        Returns:
+        - tuple | None: (absolute path, mtime_ns, size), or None if the file cannot be stat'ed.
+        """
+        try:
+            absolute_path = os.path.abspath(full_file_path)
+            stat_result = os.stat(absolute_path)
+            return absolute_path, stat_result.st_mtime_ns, stat_result.st_size
+        except OSError:
+            return None
+
+    def get(self, key: tuple):
+        """
+        Returns the cached value for the key (marking it as most recently used), or None on a miss.
+        """
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, value, size_in_bytes: int):
+        """
+        Stores a value, then evicts least recently used entries until the byte budget is respected.
+        Values larger than the whole budget are not cached.
+        """
+        if key is None:
+            return
+        if size_in_bytes > self.max_bytes:
+            logger.info(f"Not caching {key[0]}: {size_in_bytes} bytes exceeds the cache budget of {self.max_bytes} bytes.")
+            return
+        with self._lock:
+            # Older versions of the same file can never be hit again, drop them right away
+            self._remove_path_locked(key[0])
+            self._entries[key] = (value, size_in_bytes)
+            self.current_bytes += size_in_bytes
+            while self.current_bytes > self.max_bytes and self._entries:
+                evicted_key, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+                logger.info(f"Evicted from series cache: {evicted_key[0]} ({evicted_size} bytes)")
+
+    def invalidate(self, full_file_path) -> int:
+        """
+        Drops every cached version of a file, e.g. after an upload overwrote it.
+
+        Returns:
+        - int: The number of entries removed.
+        """
+        with self._lock:
+            return self._remove_path_locked(os.path.abspath(full_file_path))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove_path_locked(self, absolute_path: str) -> int:
+        stale_keys = [key for key in self._entries if key[0] == absolute_path]
+        for key in stale_keys:
+            _, size_in_bytes = self._entries.pop(key)
+            self.current_bytes -= size_in_bytes
+        return len(stale_keys)
+
+# Single cache shared by every caller of home.utils.read_csv_file in this process
+series_cache = SeriesCache(max_bytes=getattr(settings, 'SERIES_CACHE_MAX_BYTES', 512 * 1024 * 1024))
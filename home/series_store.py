@@ -0,0 +1,633 @@
+
+# home/series_store.py
+import os
+import json
+import logging
+import uuid
+import tempfile
+import threading
+import traceback
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from django.conf import settings  # Import Django settings
+
+# Setup logger
+logger = logging.getLogger('home')
+
+STORE_SUFFIX = '.series'
+STORE_FORMAT_VERSION = 1
+META_FILENAME = 'meta.json'
+_store_locks = {}  # Store directory -> AnnotationFileLock (see series_store_lock)
+_store_locks_guard = threading.Lock()
+
+def series_store_dir_for(full_csv_path) -> Path:
+    """
+    Returns the directory holding the memory-mappable store of a raw CSV file. Files under MEDIA_ROOT
+    are mirrored in a '<top folder>_Series_Store' directory (next to '<top folder>_CSV_Annotations'),
+    so the stores never show up in the raw data folders listed to the users.
+
+    Parameters:
+    - full_csv_path (str | Path): Absolute path of the raw CSV file.
+
+    Returns:
+    - Path: Absolute path of the '<file name>.series' store directory.
+    """
+    full_csv_path = Path(full_csv_path).resolve()
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    try:
+        relative_path = full_csv_path.relative_to(media_root)
+    except ValueError:
+        # Outside of MEDIA_ROOT, keep the store next to the file itself
+        return full_csv_path.with_name(full_csv_path.name + STORE_SUFFIX)
+    top_parent_dir = relative_path.parts[0]
+    store_root = media_root / f"{top_parent_dir}_Series_Store" / relative_path.relative_to(top_parent_dir).parent
+    return store_root / (relative_path.name + STORE_SUFFIX)
+
+def series_store_lock(store_dir):
+    """
+    Returns the lock serializing the writers of a store, across threads and processes (on '<store dir>.lock').
+    """
+    from .annotation_journal import AnnotationFileLock  # annotation_journal imports this module through annotation_index
+    store_dir = Path(store_dir)
+    with _store_locks_guard:
+        if store_dir not in _store_locks:
+            _store_locks[store_dir] = AnnotationFileLock(store_dir.with_name(store_dir.name + '.lock'))
+        return _store_locks[store_dir]
+
+def to_epoch_ns(value, tz: str = None) -> int:
+    """
+    Converts a timestamp-like value (ISO string, datetime, pd.Timestamp or epoch ns integer) to epoch
+    nanoseconds. Naive values are interpreted in the given time zone, if any.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None and tz:
+        timestamp = timestamp.tz_localize(tz)
+    return int(timestamp.as_unit('ns').value)
+
+def time_slice_positions(timestamps_ns: np.ndarray, start=None, end=None, tz: str = None) -> tuple[int, int]:
+    """
+    Finds the [start_position, end_position) rows of a sorted epoch ns vector covering [start, end],
+    both bounds included like DataFrame.loc[start:end]. Runs in O(log n).
+
+    Parameters:
+    - timestamps_ns (np.ndarray): Sorted int64 epoch ns timestamps.
+    - start, end: Timestamp-like bounds (see to_epoch_ns), None for an open bound.
+    - tz (str, optional): Time zone used for naive bounds.
+
+    Returns:
+    - tuple[int, int]: Start (inclusive) and end (exclusive) row positions.
+    """
+    start_position = 0 if start is None else int(np.searchsorted(timestamps_ns, to_epoch_ns(start, tz), side='left'))
+    end_position = len(timestamps_ns) if end is None else int(np.searchsorted(timestamps_ns, to_epoch_ns(end, tz), side='right'))
+    return start_position, max(start_position, end_position)
+
+class SeriesStore:
+    """
+    Read-only view of a raw series stored as memory-mapped arrays: an int64 epoch ns timestamp
+    vector plus one array per column. Nothing is read from disk until the arrays are sliced,
+    and every process mapping the same store shares the operating system's page cache.
+    """
+
+    def __init__(self, store_dir: Path, meta: dict):
+        self.store_dir = store_dir
+        self.meta = meta
+        self.rows = int(meta['rows'])
+        self.tz = meta['tz'] or None  # None for naive (wall-clock) dates
+        self.is_sorted = bool(meta['sorted'])
+        self.column_names = [column['name'] for column in meta['columns']]
+        self.timestamps = self._map(meta['index_file'], np.int64)
+        self.columns = {column['name']: self._map(column['file'], np.dtype(column['dtype'])) for column in meta['columns']}
+        # Column name -> min/max pyramid levels sorted by decimation factor (2, 4, 8, ...)
+        self.pyramids = {column: sorted(levels, key=lambda level: level['factor'])
+                         for column, levels in meta.get('pyramids', {}).items()}
+
+    def _map(self, filename: str, dtype, length: int = None) -> np.ndarray:
+        length = self.rows if length is None else length
+        if length == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.store_dir / filename, dtype=dtype, mode='r', shape=(length,))
+
+    def overview(self, column: str, factor: int) -> tuple[np.ndarray, np.ndarray] | None:
+        """
+        Returns a min/max pyramid level of a column: two int64 vectors holding, for every block of 'factor'
+        rows, the row positions of its minimum and maximum. None if the store has no such level.
+        """
+        for level in self.pyramids.get(column, []):
+            if level['factor'] == int(factor):
+                return (self._map(level['min_file'], np.int64, level['buckets']),
+                        self._map(level['max_file'], np.int64, level['buckets']))
+        return None
+
+    def envelope_positions(self, column: str, start_position: int, end_position: int, max_points: int) -> np.ndarray | None:
+        """
+        Row positions to plot for rows [start_position, end_position) within max_points, read from the finest
+        pyramid level whose min/max pairs fit in the budget: every spike survives since each bucket keeps
+        both its extremes, and no decimation work is done per request, only slicing of two small vectors.
+
+        Returns:
+        - np.ndarray | None: Sorted int64 row positions, or None if the column has no pyramid.
+        """
+        if end_position - start_position <= max_points:
+            return np.arange(start_position, end_position, dtype=np.int64)
+        levels = self.pyramids.get(column)
+        if not levels:
+            return None
+        needed_factor = 2 * (end_position - start_position) / max(max_points, 2)  # Two points per bucket
+        level = next((level for level in levels if level['factor'] >= needed_factor), levels[-1])
+        factor = level['factor']
+        min_positions, max_positions = self.overview(column, factor)
+        first_bucket, last_bucket = start_position // factor, -(-end_position // factor)
+        positions = np.concatenate([[start_position], min_positions[first_bucket:last_bucket],
+                                    max_positions[first_bucket:last_bucket], [end_position - 1]])
+        positions = np.unique(positions)
+        # The edge buckets may reach outside of the requested rows
+        return positions[(positions >= start_position) & (positions < end_position)]
+
+    def positions(self, start=None, end=None) -> tuple[int, int]:
+        """Row positions [start, end) covering the [start, end] time range (see time_slice_positions)."""
+        if not self.is_sorted:
+            raise ValueError(f"The series in {self.store_dir} is not sorted by date, time-range slicing is unavailable.")
+        return time_slice_positions(self.timestamps, start, end, self.tz)
+
+    def to_index(self, timestamps_ns: np.ndarray) -> pd.DatetimeIndex:
+        if self.tz:
+            index = pd.to_datetime(timestamps_ns, unit='ns', utc=True).tz_convert(self.tz)
+        else:
+            index = pd.to_datetime(timestamps_ns, unit='ns')
+        index.name = 'date'
+        return index
+
+    def to_dataframe(self, start_position: int = 0, end_position: int = None) -> pd.DataFrame:
+        """Materializes rows [start_position, end_position) as a DataFrame (copies only those rows)."""
+        end_position = self.rows if end_position is None else end_position
+        index = self.to_index(np.asarray(self.timestamps[start_position:end_position]))
+        return pd.DataFrame({name: np.array(values[start_position:end_position]) for name, values in self.columns.items()},
+                            index=index)
+
+def _pair_extremes(values: np.ndarray, min_positions: np.ndarray, max_positions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Merges consecutive pairs of buckets of a pyramid level into the buckets of the next level: the new
+    minimum (maximum) is whichever of the two candidate positions holds the lower (higher) value, NaN ignored.
+    """
+    if len(min_positions) % 2:
+        # A trailing odd bucket is paired with itself
+        min_positions = np.append(min_positions, min_positions[-1])
+        max_positions = np.append(max_positions, max_positions[-1])
+    min_pairs = np.asarray(min_positions).reshape(-1, 2)
+    max_pairs = np.asarray(max_positions).reshape(-1, 2)
+    min_values = np.asarray(values[min_pairs], dtype=np.float64)
+    max_values = np.asarray(values[max_pairs], dtype=np.float64)
+    pick_min = np.where(np.isnan(min_values), np.inf, min_values).argmin(axis=1)
+    pick_max = np.where(np.isnan(max_values), -np.inf, max_values).argmax(axis=1)
+    pairs = np.arange(len(min_pairs))
+    return min_pairs[pairs, pick_min], max_pairs[pairs, pick_max]
+
+class SeriesStoreWriter:
+    """
+    Appends rows to a series store chunk by chunk, so a file of any size is converted with bounded memory.
+    The timestamps and columns are streamed to temporary files in the store directory; commit() builds the
+    min/max pyramids from them, moves everything into place and writes 'meta.json' last, so readers never
+    see a partial store. When the directory holds the store of a previous version of the file, the rows are
+    compared on the fly and the pyramid buckets lying before the first changed row are reused as is.
+
+    Every writer names its arrays with its own generation token ('col_0_<token>.bin', ...), listed in 'meta.json':
+    files that readers may still have memory-mapped are never replaced (which fails on Windows), only deleted
+    once a newer generation is committed. Writers of the same store must hold series_store_lock.
+    """
+
+    def __init__(self, full_csv_path, column_dtypes: dict, pyramid_columns: list = None):
+        self.full_csv_path = Path(full_csv_path)
+        self.source_stat = self.full_csv_path.stat()  # Taken before reading, a concurrent rewrite makes the store stale
+        self.store_dir = series_store_dir_for(self.full_csv_path)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.previous = self._open_previous()
+        # Readers treat a store without meta file as missing while it is being rewritten
+        (self.store_dir / META_FILENAME).unlink(missing_ok=True)
+
+        if pyramid_columns is None:
+            pyramid_columns = getattr(settings, 'SERIES_OVERVIEW_COLUMNS', ['close'])
+        self.rows = 0
+        self.is_sorted = True
+        self.first_changed_row = None if self.previous is not None else 0  # None while equal to the previous store
+        self._last_timestamp = None
+        self._temp_files = {}  # final filename -> (open temporary file, temporary path)
+        self.generation = uuid.uuid4().hex[:12]
+        self.index_file = f"index_{self.generation}.bin"
+        self.column_dtypes = {str(name): np.dtype(dtype) for name, dtype in column_dtypes.items()}
+        self.column_files = {name: f"col_{position}_{self.generation}.bin" for position, name in enumerate(self.column_dtypes)}
+        self.pyramid_columns = [str(column) for column in pyramid_columns if str(column) in self.column_dtypes]
+        self._open_temp(self.index_file)
+        for filename in self.column_files.values():
+            self._open_temp(filename)
+
+    def _open_previous(self) -> SeriesStore | None:
+        # Any complete previous store (even stale) is a candidate for reuse, its files stay mapped until commit
+        try:
+            with open(self.store_dir / META_FILENAME, mode='r', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            if meta.get('format_version') != STORE_FORMAT_VERSION:
+                return None
+            return SeriesStore(self.store_dir, meta)
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _open_temp(self, filename: str):
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+        temp_file = os.fdopen(file_descriptor, 'wb')
+        self._temp_files[filename] = (temp_file, temp_path)
+        return temp_file
+
+    def append(self, timestamps_ns: np.ndarray, columns: dict):
+        """
+        Appends a chunk of rows.
+
+        Parameters:
+        - timestamps_ns (np.ndarray): int64 epoch ns timestamps of the chunk.
+        - columns (dict): Column name -> values of the chunk, for every column given at construction.
+        """
+        timestamps_ns = np.ascontiguousarray(timestamps_ns, dtype=np.int64)
+        if len(timestamps_ns) == 0:
+            return
+        if self.is_sorted:
+            previous_ok = self._last_timestamp is None or timestamps_ns[0] >= self._last_timestamp
+            self.is_sorted = bool(previous_ok and np.all(np.diff(timestamps_ns) >= 0))
+        self._last_timestamp = int(timestamps_ns[-1])
+        chunk = {name: np.ascontiguousarray(columns[name], dtype=dtype) for name, dtype in self.column_dtypes.items()}
+        if self.first_changed_row is None:
+            self._compare_with_previous(timestamps_ns, chunk)
+        timestamps_ns.tofile(self._temp_files[self.index_file][0])
+        for name, filename in self.column_files.items():
+            chunk[name].tofile(self._temp_files[filename][0])
+        self.rows += len(timestamps_ns)
+
+    def promote(self, name: str, dtype):
+        """
+        Changes the dtype of a column (e.g. int64 -> float64 once a chunk holds floats or missing values),
+        converting the rows already written in batches, so memory stays bounded.
+        """
+        dtype = np.dtype(dtype)
+        filename = self.column_files[name]
+        temp_file, temp_path = self._temp_files[filename]
+        temp_file.close()
+        batch_rows = getattr(settings, 'SERIES_PYRAMID_BATCH_BUCKETS', 1 << 20)
+        written = np.memmap(temp_path, dtype=self.column_dtypes[name], mode='r', shape=(self.rows,)) if self.rows else None
+        promoted_file = self._open_temp(filename)
+        for start in range(0, self.rows, batch_rows):
+            np.asarray(written[start:start + batch_rows]).astype(dtype).tofile(promoted_file)
+        del written
+        Path(temp_path).unlink(missing_ok=True)
+        self.column_dtypes[name] = dtype
+
+    def _compare_with_previous(self, timestamps_ns: np.ndarray, chunk: dict):
+        overlap = max(0, min(self.rows + len(timestamps_ns), self.previous.rows) - self.rows)
+        end = self.rows + overlap
+        changed = timestamps_ns[:overlap] != self.previous.timestamps[self.rows:end]
+        for name, values in chunk.items():
+            previous_values = self.previous.columns.get(name)
+            if previous_values is None:
+                changed[:] = True
+                break
+            new_values, old_values = values[:overlap], previous_values[self.rows:end]
+            if previous_values.dtype != values.dtype:
+                changed[:] = True
+                break
+            if values.dtype.kind == 'f':
+                changed |= ~((new_values == old_values) | (np.isnan(new_values) & np.isnan(old_values)))
+            else:
+                changed |= new_values != old_values
+        if changed.any():
+            self.first_changed_row = self.rows + int(np.argmax(changed))
+        elif overlap < len(timestamps_ns):
+            self.first_changed_row = end  # The previous version ended here
+
+    def commit(self, tz: str = None) -> dict:
+        """
+        Builds the min/max pyramids, moves every array into place and writes 'meta.json'.
+
+        Parameters:
+        - tz (str, optional): Time zone of the dates, None for naive dates.
+
+        Returns:
+        - dict: The meta data written.
+        """
+        for temp_file, _ in self._temp_files.values():
+            temp_file.close()
+        self._temp_files = {filename: (None, temp_path) for filename, (_, temp_path) in self._temp_files.items()}
+        if self.first_changed_row is None:
+            self.first_changed_row = self.rows  # Same rows as the previous version, possibly fewer
+        pyramids = {}
+        for name in self.pyramid_columns:
+            column_temp_path = self._temp_files[self.column_files[name]][1]
+            values = (np.memmap(column_temp_path, dtype=self.column_dtypes[name], mode='r', shape=(self.rows,))
+                      if self.rows else np.empty(0, dtype=self.column_dtypes[name]))
+            pyramids[name] = self._build_pyramid(name, values)
+        for filename, (_, temp_path) in self._temp_files.items():
+            os.replace(temp_path, self.store_dir / filename)
+        self._temp_files = {}
+
+        meta = {
+            'format_version': STORE_FORMAT_VERSION,
+            'source_mtime_ns': self.source_stat.st_mtime_ns,
+            'source_size': self.source_stat.st_size,
+            'rows': self.rows,
+            'tz': tz or '',
+            'sorted': self.is_sorted,
+            'index_file': self.index_file,
+            'columns': [{'name': name, 'dtype': dtype.str, 'file': self.column_files[name]}
+                        for name, dtype in self.column_dtypes.items()],
+            'pyramids': pyramids,
+        }
+        _write_json(self.store_dir / META_FILENAME, meta)
+        # Arrays of the previous generations (and older formats)
+        self.previous = None  # Unmaps them
+        current_files = {self.index_file, *self.column_files.values()}
+        current_files.update(level[key] for levels in pyramids.values() for level in levels for key in ('min_file', 'max_file'))
+        for path in self.store_dir.glob('*.bin'):
+            if path.name not in current_files:
+                try:
+                    path.unlink(missing_ok=True)
+                except OSError:
+                    pass  # Still mapped by a reader (Windows), removed by the next commit
+        if self.previous is not None:
+            logger.info(f"Series store of {self.full_csv_path} rebuilt from row {self.first_changed_row} of {self.rows}.")
+        return meta
+
+    def _build_pyramid(self, name: str, values: np.ndarray) -> list[dict]:
+        """
+        Writes the 2x, 4x, 8x, ... min/max levels of a column, each one built pairwise from the previous
+        one (the raw rows for 2x), in batches so memory stays bounded. Levels stop once they have fewer than
+        settings.SERIES_PYRAMID_MIN_BUCKETS buckets, coarser levels would never be needed to fit a plot budget.
+        """
+        min_buckets = getattr(settings, 'SERIES_PYRAMID_MIN_BUCKETS', 512)
+        batch_buckets = getattr(settings, 'SERIES_PYRAMID_BATCH_BUCKETS', 1 << 20)
+        position = list(self.column_dtypes).index(name)
+        levels = []
+        lower = None  # (min positions, max positions) of the previous level, None for the raw rows
+        factor = 2
+        while self.rows and -(-self.rows // factor) >= min_buckets:
+            buckets = -(-self.rows // factor)
+            min_filename = f"pyr_{position}_{factor}_{self.generation}_min.bin"
+            max_filename = f"pyr_{position}_{factor}_{self.generation}_max.bin"
+            min_temp_path = self._new_temp_path(min_filename)
+            max_temp_path = self._new_temp_path(max_filename)
+            previous_level = self.previous.overview(name, factor) if self.previous is not None else None
+            kept = min(len(previous_level[0]), self.first_changed_row // factor) if previous_level else 0
+            with open(min_temp_path, 'wb') as min_file, open(max_temp_path, 'wb') as max_file:
+                for start in range(0, kept, batch_buckets):
+                    np.asarray(previous_level[0][start:min(kept, start + batch_buckets)]).tofile(min_file)
+                    np.asarray(previous_level[1][start:min(kept, start + batch_buckets)]).tofile(max_file)
+                for start in range(kept, buckets, batch_buckets):
+                    end = min(buckets, start + batch_buckets)
+                    if lower is None:
+                        lower_min = lower_max = np.arange(2 * start, min(2 * end, self.rows), dtype=np.int64)
+                    else:
+                        lower_min, lower_max = lower[0][2 * start:2 * end], lower[1][2 * start:2 * end]
+                    min_positions, max_positions = _pair_extremes(values, lower_min, lower_max)
+                    min_positions.astype(np.int64).tofile(min_file)
+                    max_positions.astype(np.int64).tofile(max_file)
+            lower = (np.memmap(min_temp_path, dtype=np.int64, mode='r', shape=(buckets,)),
+                     np.memmap(max_temp_path, dtype=np.int64, mode='r', shape=(buckets,)))
+            levels.append({'factor': factor, 'buckets': buckets, 'min_file': min_filename, 'max_file': max_filename})
+            factor *= 2
+        return levels
+
+    def _new_temp_path(self, filename: str) -> str:
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self.store_dir, suffix='.tmp')
+        os.close(file_descriptor)
+        self._temp_files[filename] = (None, temp_path)
+        return temp_path
+
+    def abort(self):
+        """Removes the temporary files, leaving the store without meta file (i.e. missing)."""
+        for temp_file, temp_path in self._temp_files.values():
+            if temp_file is not None:
+                temp_file.close()
+            Path(temp_path).unlink(missing_ok=True)
+        self._temp_files = {}
+
+def write_series_store(full_csv_path, data: pd.DataFrame = None) -> bool:
+    """
+    Writes the memory-mappable store of a raw CSV file: the 'date' index as int64 epoch nanoseconds
+    ('index_<token>.bin') plus one raw array per column, keeping each column's int/uint/float dtype (other
+    numeric columns, e.g. bool or nullable integers, are stored as float64 with NaN for missing values), the
+    min/max pyramids, and a 'meta.json' describing them (written last, as commit marker).
+    Files larger than memory should go through ingest_series_store instead.
+    Concurrent calls for the same file are serialized: the later ones find the store fresh and return at once.
+
+    Parameters:
+    - full_csv_path (str | Path): Absolute path of the raw CSV file.
+    - data (pd.DataFrame, optional): The already parsed file, to avoid parsing it a second time.
+
+    Returns:
+    - bool: True if the store was written, False if the file can't be represented
+            (no datetime index or non-numeric columns) or an error occurred.
+    """
+    with series_store_lock(series_store_dir_for(full_csv_path)):
+        if open_series_store(full_csv_path) is not None:
+            return True  # Written by another request in the meantime
+        return _write_series_store(Path(full_csv_path), data)
+
+def _write_series_store(full_csv_path: Path, data: pd.DataFrame = None) -> bool:
+    writer = None
+    try:
+        if data is None:
+            data = pd.read_csv(full_csv_path, parse_dates=['date'], index_col='date')
+        if not _is_storable(full_csv_path, data):
+            return False
+
+        column_values = {str(column): data[column].to_numpy(dtype=_storage_dtype(data[column]), na_value=np.nan)
+                         for column in data.columns}
+        writer = SeriesStoreWriter(full_csv_path, {name: values.dtype for name, values in column_values.items()})
+        # Epoch ns, UTC based when the dates are time zone aware
+        writer.append(data.index.as_unit('ns').asi8, column_values)
+        writer.commit(str(data.index.tz) if data.index.tz is not None else None)
+        logger.info(f"Series store written for {full_csv_path}: \n\t{writer.store_dir}\n")
+        return True
+    except Exception:
+        logger.error(f"Error in write_series_store for {full_csv_path}: \n\t{traceback.format_exc()}\n")
+        if writer is not None:
+            writer.abort()
+        return False
+
+def ingest_series_store(full_csv_path, chunksize: int = None, progress_callback=None) -> bool:
+    """
+    Streaming variant of write_series_store for files larger than memory: the CSV is parsed with
+    pd.read_csv(chunksize=...) and each chunk is appended to the store arrays before the next one is
+    read, so memory stays bounded by the chunk size whatever the file size (the min/max pyramids are
+    then built in batches from the written arrays). The columns get the dtypes pd.read_csv gives the
+    whole file: an integer column is promoted to float64 once a chunk holds floats or missing values.
+
+    Parameters:
+    - full_csv_path (str | Path): Absolute path of the raw CSV file.
+    - chunksize (int, optional): Rows parsed per chunk. Defaults to settings.SERIES_INGEST_CHUNK_ROWS.
+    - progress_callback (callable, optional): Called after every chunk as
+                                              progress_callback(rows_done, percent, done).
+
+    Returns:
+    - bool: True if the store was written, False if the file can't be represented or an error occurred.
+    """
+    with series_store_lock(series_store_dir_for(full_csv_path)):
+        store = open_series_store(full_csv_path)
+        if store is not None:
+            # Written by another request in the meantime
+            if progress_callback is not None:
+                progress_callback(store.rows, 100.0, True)
+            return True
+        return _ingest_series_store(Path(full_csv_path), chunksize, progress_callback)
+
+def _ingest_series_store(full_csv_path: Path, chunksize: int = None, progress_callback=None) -> bool:
+    writer = None
+    tz = None
+    try:
+        if chunksize is None:
+            chunksize = getattr(settings, 'SERIES_INGEST_CHUNK_ROWS', 1_000_000)
+        total_bytes = max(full_csv_path.stat().st_size, 1)
+        if not _has_date_column(full_csv_path):
+            return False
+        with open(full_csv_path, mode='rb') as csv_file:
+            reader = pd.read_csv(csv_file, parse_dates=['date'], index_col='date', chunksize=chunksize)
+            for chunk in reader:
+                if not _is_storable(full_csv_path, chunk):
+                    if writer is not None:
+                        writer.abort()
+                    return False
+                chunk_tz = str(chunk.index.tz) if chunk.index.tz is not None else None
+                chunk_dtypes = {str(column): _storage_dtype(chunk[column]) for column in chunk.columns}
+                if writer is None:
+                    tz = chunk_tz
+                    writer = SeriesStoreWriter(full_csv_path, chunk_dtypes)
+                elif chunk_tz != tz:
+                    logger.info(f"No series store written for {full_csv_path}: the time zone changes from {tz} to {chunk_tz} within the file.")
+                    writer.abort()
+                    return False
+                else:
+                    for name, dtype in chunk_dtypes.items():
+                        # A column inferred as int in the first chunks may hold floats or missing values later on
+                        if not np.can_cast(dtype, writer.column_dtypes[name], casting='safe'):
+                            writer.promote(name, np.float64)
+                writer.append(chunk.index.as_unit('ns').asi8,
+                              {str(column): chunk[column].to_numpy(dtype=writer.column_dtypes[str(column)], na_value=np.nan)
+                               for column in chunk.columns})
+                if progress_callback is not None:
+                    # The reader buffers ahead, so the file position is a close upper bound of the parsed bytes
+                    progress_callback(writer.rows, min(99.0, round(100.0 * csv_file.tell() / total_bytes, 1)), False)
+        if writer is None:
+            logger.info(f"No series store written for {full_csv_path}: the file has no rows.")
+            return False
+        writer.commit(tz)
+        if progress_callback is not None:
+            progress_callback(writer.rows, 100.0, True)
+        logger.info(f"Series store ingested in chunks of {chunksize} rows for {full_csv_path} ({writer.rows} rows): \n\t{writer.store_dir}\n")
+        return True
+    except (ValueError, UnicodeDecodeError) as invalid_file:
+        # Not a CSV time series (pd.errors.ParserError is a ValueError): it is read as it is, without store
+        logger.info(f"No series store written for {full_csv_path}: {invalid_file}")
+        if writer is not None:
+            writer.abort()
+        return False
+    except Exception:
+        logger.error(f"Error in ingest_series_store for {full_csv_path}: \n\t{traceback.format_exc()}\n")
+        if writer is not None:
+            writer.abort()
+        return False
+
+def _storage_dtype(values: pd.Series) -> np.dtype:
+    # int/uint/float columns are stored as they are, other numeric ones (bool, nullable integers) as float64
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'iuf':
+        return values.dtype
+    return np.dtype(np.float64)
+
+def _has_date_column(full_csv_path: Path) -> bool:
+    try:
+        columns = pd.read_csv(full_csv_path, nrows=0).columns
+    except (ValueError, UnicodeDecodeError) as invalid_file:
+        logger.info(f"No series store written for {full_csv_path}: {invalid_file}")
+        return False
+    if 'date' not in columns:
+        logger.info(f"No series store written for {full_csv_path}: no 'date' column.")
+        return False
+    return True
+
+def _is_storable(full_csv_path: Path, data: pd.DataFrame) -> bool:
+    if not isinstance(data.index, pd.DatetimeIndex):
+        logger.info(f"No series store written for {full_csv_path}: the 'date' column could not be parsed as datetimes.")
+        return False
+    non_numeric = [column for column in data.columns if not pd.api.types.is_numeric_dtype(data[column])]
+    if non_numeric:
+        logger.info(f"No series store written for {full_csv_path}: non-numeric columns {non_numeric}.")
+        return False
+    return True
+
+def open_series_store(full_csv_path) -> SeriesStore | None:
+    """
+    Opens the memory-mapped store of a raw CSV file, if it exists and is fresh.
+
+    Parameters:
+    - full_csv_path (str | Path): Absolute path of the raw CSV file.
+
+    Returns:
+    - SeriesStore | None: The opened store, or None if the CSV must be parsed instead.
+    """
+    store_dir = series_store_dir_for(full_csv_path)
+    meta_path = store_dir / META_FILENAME
+    try:
+        if not meta_path.exists():
+            return None
+        with open(meta_path, mode='r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        stat_result = os.stat(full_csv_path)
+        if (meta.get('format_version') != STORE_FORMAT_VERSION
+                or meta.get('source_mtime_ns') != stat_result.st_mtime_ns
+                or meta.get('source_size') != stat_result.st_size):
+            logger.info(f"Stale series store ignored: {store_dir}")
+            return None
+        return SeriesStore(store_dir, meta)
+    except Exception:
+        logger.error(f"Error in open_series_store for {store_dir}, falling back to the CSV file: \n\t{traceback.format_exc()}\n")
+        return None
+
+def load_series_store(full_csv_path) -> pd.DataFrame | None:
+    """
+    Loads a whole raw CSV file from its store, if the store exists and is fresh.
+
+    Returns:
+    - pd.DataFrame | None: The data with its 'date' index (time zone aware if the CSV dates were),
+                           or None if there is no usable store.
+    """
+    store = open_series_store(full_csv_path)
+    if store is None:
+        return None
+    data = store.to_dataframe()
+    logger.info(f"Loaded {len(data)} rows from series store: {store.store_dir}")
+    return data
+
+def load_range(full_csv_path, start=None, end=None) -> tuple[np.ndarray, dict, str | None] | None:
+    """
+    Returns zero-copy views of the rows of a raw series within [start, end], found with
+    np.searchsorted on the memory-mapped timestamp vector; the rest of the file is never read.
+
+    Parameters:
+    - full_csv_path (str | Path): Absolute path of the raw CSV file.
+    - start, end: Timestamp-like bounds (ISO string, datetime, pd.Timestamp or epoch ns), None for open bounds.
+
+    Returns:
+    - tuple | None: (timestamps_ns view, {column name: values view}, time zone or None),
+                    or None if the file has no usable (fresh and sorted) store.
+    """
+    store = open_series_store(full_csv_path)
+    if store is None or not store.is_sorted:
+        return None
+    start_position, end_position = store.positions(start, end)
+    return (store.timestamps[start_position:end_position],
+            {name: values[start_position:end_position] for name, values in store.columns.items()},
+            store.tz)
+
+def _write_json(path: Path, content: dict):
+    # Write to a temporary file first, so a reader never sees a half written file
+    file_descriptor, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(file_descriptor, 'w', encoding='utf-8') as temp_file:
+        json.dump(content, temp_file, indent=4)
+    os.replace(temp_path, path)
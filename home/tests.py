@@ -1,3 +1,915 @@
-from django.test import TestCase
 
-# Create your tests here.
+# home/tests.py
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+import time
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from django.test import TestCase, override_settings
+from .series_store import write_series_store, ingest_series_store, open_series_store, load_series_store, series_store_dir_for
+from .annotation_journal import AnnotationJournal, AnnotationStates, StaleAnnotationVersion, read_annotation_csv, write_annotation_csv
+from . import annotation_db
+from .model_registry import ModelRegistry
+from .utils import (run_length_encode, format_timestamps_iso, process_predictions, prepare_uploaded_series_file, _series_ingest_queue, handle_annotation_to_csv,
+                    save_all_annotations_to_csv, copy_with_retries, load_save_manifest, lttb_downsample, select_plot_positions)
+from .utils import plot_with_plotly, compute_plot_rows, merged_segment_values, resolve_render_mode, run_auto_labeling_batch
+from .dash_apps.finished_apps.display_ecg_graph import patch_figure, build_figure_fingerprint
+from .annotation_snapshots import snapshot_root_for, object_path, file_digest, list_snapshots, restore_snapshot
+from .auto_label_jobs import AutoLabelJobQueue, InProcessJobBroker
+from .annotation_index import AnnotationIndex
+from .series_store import to_epoch_ns
+
+class SeriesStoreTests(TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def write_csv(self, data: pd.DataFrame) -> Path:
+        csv_path = Path(self.temp_dir.name) / 'series.csv'
+        data.to_csv(csv_path)
+        return csv_path
+
+    def make_data(self, rows: int) -> pd.DataFrame:
+        rng = np.random.default_rng(6)
+        index = pd.Index(pd.date_range('2024-01-01', periods=rows, freq='s'), name='date')
+        close = rng.normal(size=rows).cumsum()
+        close[rng.choice(rows, size=20, replace=False)] += rng.choice([-50.0, 50.0], size=20)  # Spikes
+        close[rng.choice(rows, size=10, replace=False)] = np.nan
+        return pd.DataFrame({'close': close, 'volume': rng.integers(0, 1000, size=rows)}, index=index)
+
+    @override_settings(SERIES_PYRAMID_MIN_BUCKETS=4, SERIES_OVERVIEW_COLUMNS=['close'])
+    def test_pyramid_levels_keep_the_true_extrema(self):
+        rows = 1003  # Odd bucket counts at several levels
+        csv_path = self.write_csv(self.make_data(rows))
+        self.assertTrue(write_series_store(csv_path))
+        store = open_series_store(csv_path)
+        values = np.asarray(store.columns['close'])
+        self.assertTrue(store.pyramids['close'])
+        for level in store.pyramids['close']:
+            factor = level['factor']
+            min_positions, max_positions = store.overview('close', factor)
+            self.assertEqual(len(min_positions), -(-rows // factor))
+            for bucket in range(len(min_positions)):
+                block = values[bucket * factor:(bucket + 1) * factor]
+                if np.isnan(block).all():
+                    continue
+                self.assertEqual(values[min_positions[bucket]], np.nanmin(block), f"factor {factor}, bucket {bucket}")
+                self.assertEqual(values[max_positions[bucket]], np.nanmax(block), f"factor {factor}, bucket {bucket}")
+
+    def test_integer_columns_keep_their_dtype(self):
+        data = self.make_data(100)
+        csv_path = self.write_csv(data)
+        parsed = pd.read_csv(csv_path, parse_dates=['date'], index_col='date')
+        for build in (lambda: write_series_store(csv_path), lambda: ingest_series_store(csv_path, chunksize=30)):
+            shutil.rmtree(series_store_dir_for(csv_path), ignore_errors=True)
+            self.assertTrue(build())
+            loaded = load_series_store(csv_path)
+            # Same dtypes as pd.read_csv, whichever way the store was built
+            self.assertEqual(loaded.dtypes.to_dict(), parsed.dtypes.to_dict())
+            self.assertEqual(loaded['volume'].dtype, np.int64)
+            np.testing.assert_array_equal(loaded['volume'].to_numpy(), data['volume'].to_numpy())
+
+    def test_ingest_promotes_integer_columns_turning_float(self):
+        data = self.make_data(100)
+        data['count'] = np.arange(100, dtype=np.int64) + 2 ** 53  # Only exact as int64
+        data['volume'] = data['volume'].astype('Int64')
+        data.loc[data.index[75], 'volume'] = pd.NA  # Written as '', in the third chunk only
+        data['ratio'] = np.array([1] * 90 + [1.5] * 10, dtype=object)  # Written as '1' first, then '1.5' in the last chunk
+        csv_path = self.write_csv(data)
+        self.assertTrue(ingest_series_store(csv_path, chunksize=30))
+        loaded = load_series_store(csv_path)
+        parsed = pd.read_csv(csv_path, parse_dates=['date'], index_col='date')
+        self.assertEqual(loaded.dtypes.to_dict(), parsed.dtypes.to_dict())
+        self.assertEqual((loaded['volume'].dtype, loaded['ratio'].dtype, loaded['count'].dtype), (np.float64, np.float64, np.int64))
+        np.testing.assert_array_equal(loaded['ratio'].to_numpy(), parsed['ratio'].to_numpy())
+        np.testing.assert_array_equal(loaded['volume'].to_numpy(), parsed['volume'].to_numpy())
+        np.testing.assert_array_equal(loaded['count'].to_numpy(), parsed['count'].to_numpy())
+
+def annotation(start, end, label='N', color='#d604a2') -> dict:
+    return {'Start Index': start, 'End Index': end, 'Label': label, 'Color': color}
+
+class AnnotationJournalTests(TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.csv_path = Path(temp_dir.name) / 'Working.csv'
+        write_annotation_csv(self.csv_path, [['2024-01-01 00:00:00', '2024-01-01 00:00:10', 'A', '#000000']])
+
+    def open_journal(self) -> AnnotationJournal:
+        # A journal of its own stands for the view of another process
+        journal = AnnotationJournal(self.csv_path)
+        self.addCleanup(journal.lock.close)
+        return journal
+
+    def rows(self, journal: AnnotationJournal) -> list[list[str]]:
+        return [[item['Start Index'], item['End Index'], item['Label']] for item in journal.annotations()]
+
+    def test_edits_are_appended_to_the_journal_not_the_csv(self):
+        journal = self.open_journal()
+        added = journal.add([annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        self.assertEqual(added[0]['Item Number'], '2')
+        self.assertEqual(len(read_annotation_csv(self.csv_path)), 1)
+        self.assertTrue(journal.journal_path.exists())
+        self.assertEqual(journal.pending_operations, 1)
+        self.assertEqual(len(self.rows(journal)), 2)
+
+    def test_other_views_replay_the_new_records(self):
+        journal, other = self.open_journal(), self.open_journal()
+        self.assertEqual(len(other.annotations()), 1)
+        journal.add([annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        journal.delete([journal.annotations()[0]])
+        self.assertEqual(self.rows(other), [['2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B']])
+        self.assertEqual(other.annotation_version, journal.annotation_version)
+
+    def test_torn_last_line_is_ignored(self):
+        journal = self.open_journal()
+        journal.add([annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        with open(journal.journal_path, mode='ab') as journal_file:
+            journal_file.write(b'{"op": "add", "items": [["x"')  # Crash during an append
+        self.assertEqual(len(self.open_journal().annotations()), 2)
+        journal.add([annotation('2024-01-01 00:02:00', '2024-01-01 00:02:05', 'C')])
+        self.assertEqual([row[2] for row in self.rows(self.open_journal())], ['A', 'B', 'C'])
+
+    def test_compaction_folds_the_journal_into_the_csv(self):
+        journal = self.open_journal()
+        journal.add([annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        journal.delete([journal.annotations()[0]])
+        version = journal.current_version()
+        self.assertTrue(journal.compact())
+        self.assertFalse(journal.journal_path.exists())
+        self.assertFalse(journal.is_dirty())
+        self.assertEqual(read_annotation_csv(self.csv_path), [['2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B', '#d604a2']])
+        self.assertFalse(journal.compact())
+        reopened = self.open_journal()
+        self.assertEqual(self.rows(reopened), [['2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B']])
+        self.assertEqual(reopened.current_version(), version)
+
+    def test_undo_and_redo_follow_the_edit_history(self):
+        journal = self.open_journal()
+        journal.add([annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        journal.delete([journal.annotations()[0]])
+        self.assertTrue(journal.undo())
+        self.assertEqual([row[2] for row in self.rows(journal)], ['A', 'B'])
+        self.assertTrue(journal.undo())
+        self.assertEqual([row[2] for row in self.rows(journal)], ['A'])
+        self.assertTrue(journal.redo())
+        self.assertEqual([row[2] for row in self.rows(journal)], ['A', 'B'])
+        self.assertTrue(journal.undo())
+        self.assertFalse(journal.undo())
+        self.assertEqual([row[2] for row in self.rows(journal)], ['A'])
+
+    def test_undo_without_history_changes_nothing(self):
+        journal = self.open_journal()
+        journal.add([annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        version = journal.current_version()
+        # Reopened (e.g. after a restart): the last annotation is not necessarily the last edit
+        reopened = self.open_journal()
+        self.assertFalse(reopened.undo())
+        self.assertEqual([row[2] for row in self.rows(reopened)], ['A', 'B'])
+        self.assertEqual(reopened.current_version(), version)
+        # Nor after another process edited the file
+        reopened.add([annotation('2024-01-01 00:02:00', '2024-01-01 00:02:05', 'C')])
+        self.assertFalse(journal.undo())
+        self.assertEqual([row[2] for row in self.rows(journal)], ['A', 'B', 'C'])
+
+    def test_journal_of_an_older_csv_is_discarded(self):
+        journal = self.open_journal()
+        journal.add([annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        # The CSV is rewritten outside of the journal (e.g. restored from a backup)
+        write_annotation_csv(self.csv_path, [['2024-01-01 00:05:00', '2024-01-01 00:05:10', 'Z', '#000000']])
+        self.assertEqual(self.rows(self.open_journal()), [['2024-01-01 00:05:00', '2024-01-01 00:05:10', 'Z']])
+        self.assertFalse(journal.journal_path.exists())
+
+class AnnotationIndexTimeZoneTests(TestCase):
+    """Naive boundaries (plotly clicks) are wall clock times of the data time zone, as are the window bounds."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.csv_path = Path(temp_dir.name) / 'Working.csv'
+        write_annotation_csv(self.csv_path, [['2024-03-01 10:00:00', '2024-03-01 10:30:00', 'A', '#000000']])
+
+    def test_window_of_a_non_utc_file_finds_its_annotations(self):
+        journal = AnnotationJournal(self.csv_path)
+        self.addCleanup(journal.lock.close)
+        _, index = journal.annotations_with_index('America/New_York')
+        window = [to_epoch_ns(bound, 'America/New_York') for bound in ('2024-03-01 09:55:00', '2024-03-01 10:35:00')]
+        self.assertEqual(list(index.overlapping(*window)), [0])
+        self.assertEqual(list(index.hit('2024-03-01 10:10:00')), [0])
+        self.assertEqual(index.next_gap('2024-03-01 10:10:00')[0], to_epoch_ns('2024-03-01 10:30:00', 'America/New_York'))
+        # Edits keep the time zone of the index
+        journal.add([annotation('2024-03-01 11:00:00', '2024-03-01 11:05:00', 'B')])
+        _, index = journal.annotations_with_index('America/New_York')
+        self.assertEqual(list(index.hit('2024-03-01 11:01:00')), [1])
+        self.assertEqual(list(index.overlapping(*window)), [0])
+
+    def test_utc_index_and_offsets(self):
+        rows = [['2024-03-01 10:00:00', '2024-03-01 10:30:00'], ['2024-03-01T15:00:00+00:00', '2024-03-01T15:10:00+00:00']]
+        utc_index = AnnotationIndex.from_rows(rows)
+        new_york_index = AnnotationIndex.from_rows(rows, 'America/New_York')
+        self.assertIsNone(utc_index.tz)
+        self.assertEqual(list(utc_index.hit('2024-03-01 10:10:00')), [0])
+        self.assertEqual(list(new_york_index.hit('2024-03-01 10:10:00')), [0, 1])  # 15:05 UTC is 10:05 in New York
+        self.assertEqual(list(new_york_index.hit('2024-03-01T15:20:00+00:00')), [0])
+
+    def test_database_range_queries_agree_with_the_index(self):
+        file_path = 'Raw_Time_Series_Data/new_york.csv'
+        annotations = [annotation('2024-03-01 10:00:00', '2024-03-01 10:30:00', 'A'),
+                       annotation('2024-03-01T15:00:00+00:00', '2024-03-01T15:10:00+00:00', 'B'),
+                       annotation('2024-03-01 14:00:00', '2024-03-01 14:20:00', 'C')]
+        annotation_db.add_annotations(file_path, annotations[:1], 'America/New_York')
+        annotation_db.apply_annotation_batch(file_path, {'delete': [], 'update': [], 'add': [[item['Start Index'], item['End Index'], item['Label'], item['Color']]
+                                                                                           for item in annotations[1:]]}, tz='America/New_York')
+        index = AnnotationIndex.from_annotations(annotation_db.retrieve_annotations(file_path), 'America/New_York')
+        for window in (('2024-03-01 09:55:00', '2024-03-01 10:02:00'), ('2024-03-01 10:20:00', '2024-03-01 13:00:00'),
+                       ('2024-03-01T14:10:00+00:00', '2024-03-01T15:05:00+00:00'), ('2024-03-01 14:10:00', '2024-03-01 14:15:00')):
+            expected = [str(position + 1) for position in index.overlapping(*window, 'America/New_York')]
+            found = [item['Item Number'] for item in annotation_db.retrieve_annotations(file_path, *window, tz='America/New_York')]
+            self.assertEqual(found, expected, window)
+        self.assertEqual([item['Label'] for item in annotation_db.retrieve_annotations(file_path, '2024-03-01 09:55:00', '2024-03-01 10:35:00', 'America/New_York')],
+                         ['A', 'B'])  # 15:00 UTC is 10:00 in New York
+
+class AnnotationStatesTests(TestCase):
+
+    def test_opened_state_is_not_evicted_when_the_others_are_dirty(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        states = AnnotationStates(idle_seconds=3600, flush_interval_seconds=3600, max_operations=1000,
+                                  evict_idle_seconds=3600, max_files=1)
+        dirty = states.get(Path(temp_dir.name) / 'Dirty.csv')
+        dirty.pending_operations = 1  # Not flushed yet, can't be evicted
+        opened = states.get(Path(temp_dir.name) / 'Opened.csv')
+        self.assertIs(states.get(opened.csv_path), opened)
+        self.assertEqual(states.stats(), {'files': 2, 'dirty': 1})
+        # Back under capacity once the dirty one is clean: the least recently used goes
+        dirty.pending_operations = 0
+        states.get(Path(temp_dir.name) / 'Third.csv')
+        self.assertEqual(states.stats()['files'], 1)
+
+class AnnotationBatchTests(TestCase):
+    """A batch gives the same annotations as its operations applied one by one (item numbers refer to the rows before the batch)."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.rows = [[f'2024-01-01 00:0{minute}:00', f'2024-01-01 00:0{minute}:30', label, '#000000']
+                     for minute, label in enumerate('ABCDEF')]
+        self.paths = []
+        for name in ('Batch.csv', 'Sequential.csv'):
+            path = Path(temp_dir.name) / name
+            write_annotation_csv(path, self.rows)
+            self.paths.append(path)
+
+    def open_journal(self, path) -> AnnotationJournal:
+        journal = AnnotationJournal(path)
+        self.addCleanup(journal.lock.close)
+        return journal
+
+    def test_mixed_batch_equals_sequential_operations(self):
+        batch_journal, sequential_journal = (self.open_journal(path) for path in self.paths)
+        original = {item['Label']: item for item in batch_journal.annotations()}
+        operations = [
+            {'op': 'delete', 'label': 'B'},
+            {'op': 'update', 'label': 'D', 'changes': {'Label': 'D2', 'End Index': '2024-01-01 00:03:45'}},  # After a delete
+            {'op': 'add', 'annotation': annotation('2024-01-01 00:09:00', '2024-01-01 00:09:30', 'G')},
+            {'op': 'delete', 'label': 'E'},
+            {'op': 'update', 'label': 'A', 'changes': {'Color': '#ffffff'}},  # Before the deletes
+            {'op': 'delete', 'label': 'F'},  # Last row
+        ]
+
+        def as_batch_operation(operation, annotations_by_label):
+            if operation['op'] == 'add':
+                return {'op': 'add', 'annotation': operation['annotation']}
+            batch_operation = {'op': operation['op'], 'annotation': annotations_by_label[operation['label']]}
+            if 'changes' in operation:
+                batch_operation['changes'] = operation['changes']
+            return batch_operation
+
+        counts = batch_journal.batch([as_batch_operation(operation, original) for operation in operations])
+        self.assertEqual(counts, {'added': 1, 'deleted': 3, 'updated': 2})
+        for operation in operations:
+            # One by one, with the item numbers of the rows at that time
+            current = {item['Label']: item for item in sequential_journal.annotations()}
+            sequential_journal.batch([as_batch_operation(operation, current)])
+
+        self.assertEqual(batch_journal.annotations(), sequential_journal.annotations())
+        self.assertEqual([item['Label'] for item in batch_journal.annotations()], ['A', 'C', 'D2', 'G'])
+        self.assertEqual(batch_journal.annotations()[0]['Color'], '#ffffff')
+        # The interval index follows the rows
+        rebuilt = AnnotationIndex.from_rows(batch_journal.rows)
+        np.testing.assert_array_equal(batch_journal.index.starts, rebuilt.starts)
+        np.testing.assert_array_equal(batch_journal.index.ends, rebuilt.ends)
+        # And a fresh view replaying the journal agrees
+        self.assertEqual(self.open_journal(self.paths[0]).annotations(), batch_journal.annotations())
+
+    def test_invalid_batch_applies_nothing(self):
+        journal = self.open_journal(self.paths[0])
+        first = journal.annotations()[0]
+        with self.assertRaises(ValueError):
+            journal.batch([{'op': 'delete', 'annotation': first}, {'op': 'move', 'annotation': first}])
+        self.assertEqual(len(journal.annotations()), len(self.rows))
+
+    def test_database_delete_matches_each_item_once(self):
+        file_path = 'Raw_Time_Series_Data/delete.csv'
+        annotation_db.add_annotations(file_path, [dict(zip(['Start Index', 'End Index', 'Label', 'Color'], row)) for row in self.rows])
+        existing = annotation_db.retrieve_annotations(file_path)
+        # A repeated item deletes one row, an item whose number no longer matches deletes nothing
+        stale_item = {**existing[3], 'Item Number': '5'}
+        self.assertEqual(annotation_db.delete_annotations(file_path, [existing[1], existing[1], existing[4], stale_item]), 2)
+        self.assertEqual([item['Label'] for item in annotation_db.retrieve_annotations(file_path)], ['A', 'C', 'D', 'F'])
+
+class StaleAnnotationVersionTests(TestCase):
+    """Edits made on an older annotation version (another tab or user edited the file since) are rejected."""
+
+    def test_journal_rejects_edits_on_an_older_version(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        csv_path = Path(temp_dir.name) / 'Working.csv'
+        write_annotation_csv(csv_path, [['2024-01-01 00:00:00', '2024-01-01 00:00:10', 'A', '#000000']])
+        tab, other_tab = AnnotationJournal(csv_path), AnnotationJournal(csv_path)
+        self.addCleanup(tab.lock.close)
+        self.addCleanup(other_tab.lock.close)
+        version = tab.current_version()
+        first = tab.annotations()[0]
+        other_tab.add([annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        for edit in (lambda: tab.delete([first], expected_version=version),
+                     lambda: tab.batch([{'op': 'delete', 'annotation': first}], expected_version=version),
+                     lambda: tab.refresh(expected_version=version),
+                     lambda: tab.undo(expected_version=version)):
+            with self.assertRaises(StaleAnnotationVersion) as raised:
+                edit()
+            self.assertEqual((raised.exception.expected_version, raised.exception.current_version), (version, version + 1))
+        self.assertEqual(len(tab.annotations()), 2)
+        self.assertEqual(tab.delete([first], expected_version=version + 1), 1)
+
+    def test_database_rejects_edits_on_an_older_version(self):
+        file_path = 'Raw_Time_Series_Data/stale.csv'
+        annotation_db.add_annotations(file_path, [annotation('2024-01-01 00:00:00', '2024-01-01 00:00:10', 'A')])
+        version = annotation_db.current_annotation_version(file_path)
+        first = annotation_db.retrieve_annotations(file_path)[0]
+        annotation_db.add_annotations(file_path, [annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        with self.assertRaises(StaleAnnotationVersion):
+            annotation_db.delete_annotations(file_path, [first], expected_version=version)
+        with self.assertRaises(StaleAnnotationVersion):
+            annotation_db.refresh_annotations(file_path, expected_version=version)
+        self.assertEqual(len(annotation_db.retrieve_annotations(file_path)), 2)
+        self.assertEqual(annotation_db.delete_annotations(file_path, [first], expected_version=version + 1), 1)
+
+class DatabaseUndoTests(TestCase):
+    """The database backend keeps no edit history: undo and redo change nothing (the consumer refuses them)."""
+
+    @override_settings(ANNOTATION_BACKEND='database')
+    def test_undo_and_redo_leave_the_annotations_intact(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        file_path = 'Raw_Time_Series_Data/undo.csv'
+        annotation_db.add_annotations(file_path, [annotation('2024-01-01 00:00:00', '2024-01-01 00:00:10', 'A'),
+                                                  annotation('2024-01-01 00:01:00', '2024-01-01 00:01:05', 'B')])
+        annotation_db.delete_annotations(file_path, [annotation_db.retrieve_annotations(file_path)[0]])
+        version = annotation_db.current_annotation_version(file_path)
+        with override_settings(MEDIA_ROOT=temp_dir.name):
+            for action in ('undo', 'redo'):
+                handle_annotation_to_csv(relative_file_path=file_path, task_to_do=action, expected_version=version)
+        self.assertEqual([row['Label'] for row in annotation_db.retrieve_annotations(file_path)], ['B'])
+        self.assertEqual(annotation_db.current_annotation_version(file_path), version)
+
+class SaveAllTests(TestCase):
+    """Save All copies only the working files changed since their last save (see the save manifest)."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.annotations_dir = Path(temp_dir.name)
+        self.relative_paths = ['a.csv', 'patient/b.csv', 'patient/c.csv']
+        for number, relative_path in enumerate(self.relative_paths):
+            working_file = self.annotations_dir / 'Working_Folder' / relative_path
+            working_file.parent.mkdir(parents=True, exist_ok=True)
+            write_annotation_csv(working_file, [[f'2024-01-01 00:0{number}:00', f'2024-01-01 00:0{number}:10', 'A', '#000000']])
+
+    def save_all(self):
+        progress = []
+        with mock.patch('home.utils.copy_with_retries', wraps=copy_with_retries) as copy:
+            message, status = save_all_annotations_to_csv(self.annotations_dir, lambda *report: progress.append(report))
+        copied = sorted(Path(call.args[1]).relative_to(self.annotations_dir / 'Saving_Folder').as_posix() for call in copy.call_args_list)
+        return message, status, copied, progress
+
+    def test_unchanged_files_are_not_copied_again(self):
+        _, status, copied, _ = self.save_all()
+        self.assertTrue(status)
+        self.assertEqual(copied, self.relative_paths)
+        message, status, copied, progress = self.save_all()
+        self.assertTrue(status)
+        self.assertEqual(copied, [])
+        self.assertEqual(progress, [])
+        self.assertIn('nothing changed', message)
+
+    def test_only_the_edited_file_is_copied(self):
+        self.save_all()
+        edited_file = self.annotations_dir / 'Working_Folder' / 'patient' / 'b.csv'
+        write_annotation_csv(edited_file, [['2024-01-01 00:05:00', '2024-01-01 00:05:10', 'B', '#ffffff'],
+                                           ['2024-01-01 00:06:00', '2024-01-01 00:06:10', 'C', '#ffffff']])
+        _, status, copied, progress = self.save_all()
+        self.assertTrue(status)
+        self.assertEqual(copied, ['patient/b.csv'])
+        self.assertEqual(progress[-1], (1, 1, [], True))
+        self.assertEqual((self.annotations_dir / 'Saving_Folder' / 'patient' / 'b.csv').read_bytes(), edited_file.read_bytes())
+
+    def test_failed_files_are_reported_and_left_out_of_the_manifest(self):
+        def copy_except_b(source_file, target_file, *args, **kwargs):
+            if source_file.name == 'b.csv':
+                raise OSError('Disk full')
+            return copy_with_retries(source_file, target_file, *args, **kwargs)
+        progress = []
+        with mock.patch('home.utils.copy_with_retries', side_effect=copy_except_b):
+            message, status = save_all_annotations_to_csv(self.annotations_dir, lambda *report: progress.append(report))
+        self.assertFalse(status)
+        self.assertIn('patient/b.csv', message)
+        self.assertEqual(progress[-1], (3, 3, ['patient/b.csv'], True))
+        saving_root = self.annotations_dir / 'Saving_Folder'
+        self.assertEqual(sorted(load_save_manifest(saving_root)), ['a.csv', 'patient/c.csv'])
+        # The next Save All retries the failed file only
+        _, status, copied, _ = self.save_all()
+        self.assertTrue(status)
+        self.assertEqual(copied, ['patient/b.csv'])
+        self.assertEqual(sorted(load_save_manifest(saving_root)), self.relative_paths)
+
+@override_settings(ANNOTATION_SAVE_MODE='snapshot')
+class AnnotationSnapshotTests(TestCase):
+    """Snapshot saves: objects are private copies of the working files, the saving files are linked to them."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.annotations_dir = Path(temp_dir.name)
+        self.working_file = self.annotations_dir / 'Working_Folder' / 'patient' / 'ecg.csv'
+        self.saving_file = self.annotations_dir / 'Saving_Folder' / 'patient' / 'ecg.csv'
+        self.working_file.parent.mkdir(parents=True)
+        write_annotation_csv(self.working_file, [['2024-01-01 00:00:00', '2024-01-01 00:00:10', 'A', '#000000']])
+
+    def test_save_links_only_the_saving_file_to_the_object(self):
+        message, status = save_all_annotations_to_csv(self.annotations_dir)
+        self.assertTrue(status, message)
+        digest = file_digest(self.working_file)
+        stored_file = object_path(snapshot_root_for(self.annotations_dir), digest)
+        self.assertEqual(self.working_file.stat().st_nlink, 1)
+        self.assertEqual(stored_file.stat().st_nlink, 2)
+        self.assertTrue(os.path.samefile(stored_file, self.saving_file))
+        # Editing the working file leaves the stored object (and the saving file) as saved
+        write_annotation_csv(self.working_file, [['2024-01-01 00:01:00', '2024-01-01 00:01:10', 'B', '#ffffff']])
+        self.assertEqual(file_digest(stored_file), digest)
+        self.assertEqual(file_digest(self.saving_file), digest)
+
+    def test_restore_an_earlier_save(self):
+        save_all_annotations_to_csv(self.annotations_dir)
+        first_content = self.saving_file.read_bytes()
+        write_annotation_csv(self.working_file, [['2024-01-01 00:01:00', '2024-01-01 00:01:10', 'B', '#ffffff'],
+                                                 ['2024-01-01 00:02:00', '2024-01-01 00:02:10', 'C', '#ffffff']])
+        save_all_annotations_to_csv(self.annotations_dir)
+        self.assertNotEqual(self.saving_file.read_bytes(), first_content)
+        snapshots = list_snapshots(self.annotations_dir)
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(restore_snapshot(self.annotations_dir, snapshots[0]), 1)
+        self.assertEqual(self.saving_file.read_bytes(), first_content)
+
+    def test_copy_over_a_linked_saving_file_leaves_the_object_intact(self):
+        save_all_annotations_to_csv(self.annotations_dir)
+        stored_file = object_path(snapshot_root_for(self.annotations_dir), file_digest(self.saving_file))
+        saved_content = stored_file.read_bytes()
+        write_annotation_csv(self.working_file, [['2024-01-01 00:01:00', '2024-01-01 00:01:10', 'B', '#ffffff']])
+        copy_with_retries(self.working_file, self.saving_file)
+        self.assertEqual(self.saving_file.read_bytes(), self.working_file.read_bytes())
+        self.assertEqual(stored_file.read_bytes(), saved_content)
+        self.assertEqual((stored_file.stat().st_nlink, self.saving_file.stat().st_nlink), (1, 1))
+
+class PlotDownsamplingTests(TestCase):
+    """The base trace rows: bounded by the point budget, ends kept, the visible window at full resolution when it fits."""
+
+    def setUp(self):
+        rows = 20000
+        self.index_ns = pd.date_range('2024-01-01', periods=rows, freq='s').as_unit('ns').asi8
+        self.values = np.sin(np.arange(rows) / 50.0)
+        self.values[12345] = 40.0  # A spike LTTB must keep
+
+    def test_output_is_bounded_and_keeps_the_ends(self):
+        for max_points, window in ((500, None), (500, (5000, 15000)), (100, (0, 20000)), (300, (19000, 20000))):
+            positions = select_plot_positions(self.index_ns, self.values, max_points, window)
+            self.assertLessEqual(len(positions), max_points + 2 * max(max_points // 4, 3))
+            self.assertEqual((positions[0], positions[-1]), (0, len(self.index_ns) - 1))
+            self.assertTrue(np.all(np.diff(positions) > 0))
+            self.assertIn(12345, positions)
+
+    def test_window_that_fits_is_at_full_resolution(self):
+        positions = select_plot_positions(self.index_ns, self.values, 1000, (8000, 8600))
+        np.testing.assert_array_equal(positions[(positions >= 8000) & (positions < 8600)], np.arange(8000, 8600))
+        self.assertLessEqual(len(positions), 1000 + 2 * 250)
+        # Below the budget everything is kept
+        np.testing.assert_array_equal(select_plot_positions(self.index_ns[:800], self.values[:800], 1000), np.arange(800))
+
+    def test_nan_runs(self):
+        values = self.values.copy()
+        values[3000:5000] = np.nan
+        n_out = 200
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')  # No 'Mean of empty slice' on the NaN run
+            kept = lttb_downsample(self.index_ns.astype(np.float64), values, n_out)
+        self.assertEqual(len(kept), n_out)
+        self.assertEqual((kept[0], kept[-1]), (0, len(values) - 1))
+        self.assertTrue(np.all(np.diff(kept) > 0))
+        # NaN points are only kept from the buckets that hold nothing else
+        bucket_size = (len(values) - 2) / (n_out - 2)
+        self.assertLessEqual(np.isnan(values[kept]).sum(), int(2000 / bucket_size))
+        self.assertIn(12345, kept)
+        leading_nan = self.values.copy()
+        leading_nan[:3000] = np.nan
+        kept = lttb_downsample(self.index_ns.astype(np.float64), leading_nan, n_out)
+        self.assertLessEqual(np.isnan(leading_nan[kept]).sum(), 1 + int(3000 / bucket_size))  # The first row is always kept
+        all_nan = np.full(1000, np.nan)
+        self.assertEqual(len(lttb_downsample(np.arange(1000, dtype=np.float64), all_nan, 50)), 50)
+
+class MergedSegmentTests(TestCase):
+    """'merged' segment mode: the segments of a label are one line, split by gap points, each point carrying its item number."""
+
+    def test_segments_are_separated_by_gaps(self):
+        data = pd.DataFrame({'close': np.arange(100, dtype=np.float64)},
+                            index=pd.date_range('2024-01-01', periods=100, freq='min', name='date'))
+        plot_rows = compute_plot_rows(data, max_points=1000)
+        items = [{**annotation('2024-01-01 00:10:00', '2024-01-01 00:12:00', 'Up'), 'Item Number': '4'},
+                 {**annotation('2024-03-01 00:00:00', '2024-03-01 00:05:00', 'Up'), 'Item Number': '5'},  # Outside the data
+                 {**annotation('2024-01-01 00:50:00', '2024-01-01 00:51:00', 'Up'), 'Item Number': '7'}]
+        x, y, customdata = merged_segment_values(data, plot_rows, items)
+        self.assertEqual(len(x), 3 + 1 + 2)  # No gap for the empty segment, nor after the last one
+        self.assertTrue(pd.isna(x[3]) and np.isnan(y[3]))
+        self.assertFalse(pd.isna(x[[0, 1, 2, 4, 5]]).any())
+        self.assertEqual(list(x[:3]), list(data.index[10:13]))
+        np.testing.assert_array_equal(y[[0, 1, 2, 4, 5]], [10, 11, 12, 50, 51])
+        self.assertEqual(list(customdata), ['4', '4', '4', None, '7', '7'])
+        x, y, customdata = merged_segment_values(data, plot_rows, items[1:2])
+        self.assertEqual((len(x), len(y), len(customdata)), (0, 0, 0))
+
+@override_settings(PLOT_WEBGL_THRESHOLD=50, PLOT_RENDER_MODE='auto')
+class RenderModeTests(TestCase):
+    """Every trace switches to WebGL when the base trace has more than PLOT_WEBGL_THRESHOLD points."""
+
+    def test_mode_switches_at_the_threshold(self):
+        self.assertEqual([resolve_render_mode(None, points) for points in (0, 50, 51)], ['svg', 'svg', 'webgl'])
+        self.assertEqual(resolve_render_mode('svg', 10 ** 6), 'svg')
+        self.assertEqual(resolve_render_mode('webgl', 1), 'webgl')
+
+    def test_figure_traces_follow_the_base_trace(self):
+        existing_values = [{**annotation('2024-01-01 00:10:00', '2024-01-01 00:12:00', 'Up'), 'Item Number': '1'}]
+        for rows, trace_type in ((50, 'scatter'), (51, 'scattergl')):
+            data = pd.DataFrame({'close': np.arange(rows, dtype=np.float64)},
+                                index=pd.date_range('2024-01-01', periods=rows, freq='min', name='date'))
+            figure = plot_with_plotly(data, 'Render mode', existing_values=existing_values, max_points=1000)
+            self.assertEqual([trace.type for trace in figure.data], [trace_type] * 3)
+            self.assertEqual(figure.layout.meta['render_mode'], 'svg' if rows == 50 else 'webgl')
+
+class PatchFigureTests(TestCase):
+    """update_graph patches the displayed figure in place for label toggles, click selections and new annotations."""
+
+    file_path = 'Raw_Time_Series_Data/patch.csv'
+
+    def setUp(self):
+        self.data = pd.DataFrame({'close': np.arange(100, dtype=np.float64)},
+                                 index=pd.date_range('2024-01-01', periods=100, freq='min', name='date'))
+        self.labels = [{'value': 'Up', 'display': 1}, {'value': 'Down', 'display': 0}]
+        existing_values = [annotation('2024-01-01 00:10:00', '2024-01-01 00:20:00', 'Up', '#00ff00'),
+                           annotation('2024-01-01 00:40:00', '2024-01-01 00:45:00', 'Down', '#ff0000')]
+        for item_number, item in enumerate(existing_values, start=1):
+            item['Item Number'] = str(item_number)
+        module = 'home.dash_apps.finished_apps.display_ecg_graph'
+        for name, value in (('read_csv_file', (self.data, None)), ('open_plot_series_store', None),
+                            ('get_figure_input_versions', ('data-1', 'annotations-2'))):
+            patcher = mock.patch(f'{module}.{name}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        figure = plot_with_plotly(self.data, 'Patched', labels_pipe_value=self.labels, existing_values=existing_values,
+                                  segment_mode='merged', render_mode='svg')
+        self.fingerprint = {**build_figure_fingerprint(self.file_path, None, None, self.labels),
+                            'figure': figure.to_plotly_json()['layout']['meta']}
+
+    def operations(self, patched_figure) -> dict:
+        return {tuple(operation['location']): operation for operation in patched_figure.to_plotly_json()['operations']}
+
+    def test_label_toggle_restyles_the_annotation_traces(self):
+        labels = [{'value': 'Up', 'display': 0}, {'value': 'Down', 'display': 1}]
+        patched_figure, fingerprint = patch_figure('Labels_Pipe', self.file_path, self.fingerprint, None, None, labels)
+        operations = self.operations(patched_figure)
+        self.assertEqual(operations[('data', 2, 'visible')]['params']['value'], False)
+        self.assertEqual(operations[('data', 3, 'visible')]['params']['value'], True)
+        self.assertEqual(len(operations), 2)
+        self.assertEqual(fingerprint['hidden_labels'], ['Up'])
+        self.assertEqual(fingerprint['figure'], self.fingerprint['figure'])
+
+    def test_click_selection_replaces_the_highlight(self):
+        clicks = {'Manual': True, 'Indices': ['2024-01-01 00:30:00', '2024-01-01 00:25:00']}
+        patched_figure, fingerprint = patch_figure('click-data', self.file_path, self.fingerprint, clicks, None, self.labels)
+        highlight = self.operations(patched_figure)[('data', 1)]['params']['value']
+        self.assertEqual(list(highlight['y']), list(range(25, 31)))
+        self.assertTrue(highlight['showlegend'])
+        self.assertEqual(fingerprint['highlight'], clicks['Indices'])
+        # Programmatic click-data updates (after refresh, undo or delete) rebuild the figure
+        self.assertIsNone(patch_figure('click-data', self.file_path, self.fingerprint, {'Indices': clicks['Indices']}, None, self.labels))
+
+    def test_new_annotation_extends_its_label_trace(self):
+        new_item = {**annotation('2024-01-01 01:00:00', '2024-01-01 01:02:00', 'Up', '#00ff00'), 'Item Number': '3'}
+        patched_figure, fingerprint = patch_figure('dummy-output', self.file_path, self.fingerprint, None, new_item, self.labels)
+        operations = self.operations(patched_figure)
+        self.assertEqual(operations[('data', 1, 'x')]['params']['value'], [])  # The highlight is cleared
+        self.assertEqual(operations[('data', 2, 'x')]['operation'], 'Extend')
+        self.assertEqual(operations[('data', 2, 'x')]['params']['value'],
+                         [None, '2024-01-01T01:00:00', '2024-01-01T01:01:00', '2024-01-01T01:02:00'])
+        self.assertEqual(operations[('data', 2, 'y')]['params']['value'], [None, 60.0, 61.0, 62.0])
+        self.assertEqual(operations[('data', 2, 'customdata')]['params']['value'], [None, '3', '3', '3'])
+        self.assertIn('(2 items)', operations[('data', 2, 'name')]['params']['value'])
+        self.assertEqual(fingerprint['figure']['trace_labels'], ['Up', 'Down'])
+        self.assertEqual(fingerprint['figure']['trace_counts'], [2, 1])
+        self.assertEqual((fingerprint['annotation_version'], fingerprint['highlight']), ('annotations-2', None))
+        self.assertEqual(self.fingerprint['figure']['trace_counts'], [1, 1])  # The displayed figure's fingerprint is left as is
+
+    def test_new_label_appends_a_trace(self):
+        new_item = {**annotation('2024-01-01 01:00:00', '2024-01-01 01:02:00', 'Flat', '#0000ff'), 'Item Number': '3'}
+        patched_figure, fingerprint = patch_figure('dummy-output', self.file_path, self.fingerprint, None, new_item, self.labels)
+        appended = self.operations(patched_figure)[('data',)]
+        self.assertEqual(appended['operation'], 'Append')
+        self.assertEqual(list(appended['params']['value']['customdata']), ['3', '3', '3'])
+        self.assertFalse(appended['params']['value']['visible'])  # 'Flat' is not a displayed label
+        self.assertEqual(fingerprint['figure']['trace_labels'], ['Up', 'Down', 'Flat'])
+        self.assertEqual(fingerprint['figure']['trace_counts'], [1, 1, 1])
+
+class ModelRegistryTests(TestCase):
+
+    def test_counters_are_exact_under_concurrent_lookups(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        model_path = Path(temp_dir.name) / 'model.pth'
+        model_path.write_bytes(b'checkpoint')
+        registry = ModelRegistry(max_bytes=1024)
+        registry.model_bytes = lambda model: 1  # Not a torch module
+        model = object()
+        loads = []
+
+        def look_up():
+            for _ in range(500):
+                registry.get_or_load(model_path, 4, lambda: loads.append(1) or model)
+
+        threads = [threading.Thread(target=look_up) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = registry.stats()
+        self.assertEqual(len(loads), 1)
+        self.assertEqual((stats['hits'], stats['misses']), (8 * 500 - 1, 1))
+
+TREND_DESCRIPTIONS = {0: 'Down', 1: 'Flat', 2: 'Up'}
+TREND_COLORS = {0: '#ff0000', 1: '#888888', 2: '#00ff00'}
+
+def loop_prediction_ranges(data: pd.DataFrame, predictions: np.ndarray, time_interval) -> list[dict]:
+    """The former row by row implementation (pd.date_range, then one isoformat() per boundary)."""
+    predictions_df = pd.DataFrame({'date': pd.date_range(start=data.index[0], periods=len(predictions), freq=time_interval),
+                                   'trend': predictions})
+    ranges_list = []
+    current_value, start_index = predictions_df['trend'].iloc[0], 0
+    for i in range(1, len(predictions_df) + 1):
+        if i == len(predictions_df) or predictions_df['trend'].iloc[i] != current_value:
+            ranges_list.append({'Item Number': len(ranges_list) + 1,
+                                'Start Index': predictions_df['date'].iloc[start_index].isoformat(),
+                                'End Index': predictions_df['date'].iloc[i - 1].isoformat(),
+                                'Label': TREND_DESCRIPTIONS[int(current_value)],
+                                'Color': TREND_COLORS[int(current_value)]})
+            if i < len(predictions_df):
+                start_index, current_value = i, predictions_df['trend'].iloc[i]
+    return ranges_list
+
+class PredictionRangesTests(TestCase):
+    """The numpy run-length encoding gives the same ranges as the former loop."""
+
+    def make_data(self, rows: int, start='2024-03-10 00:00:00', freq='1h', tz=None) -> pd.DataFrame:
+        index = pd.Index(pd.date_range(start, periods=rows, freq=freq, tz=tz), name='date')
+        return pd.DataFrame({'close': np.arange(rows, dtype=np.float64)}, index=index)
+
+    def assert_same_ranges(self, data: pd.DataFrame, predictions: np.ndarray):
+        time_interval = data.index.to_series().diff().dropna().mode()[0]
+        self.assertEqual(process_predictions(data, predictions, TREND_DESCRIPTIONS, TREND_COLORS),
+                         loop_prediction_ranges(data, predictions, time_interval))
+
+    def test_run_length_encode(self):
+        for values, expected in (([], ([], [], [])),
+                                 ([2], ([0], [0], [2])),
+                                 ([1, 1, 1], ([0], [2], [1])),
+                                 ([0, 0, 2, 2, 2, 1], ([0, 2, 5], [1, 4, 5], [0, 2, 1])),
+                                 ([1, 0, 1, 0], ([0, 1, 2, 3], [0, 1, 2, 3], [1, 0, 1, 0]))):
+            starts, ends, run_values = run_length_encode(np.array(values, dtype=np.int64))
+            self.assertEqual((starts.tolist(), ends.tolist(), run_values.tolist()), expected, values)
+
+    def test_single_row(self):
+        self.assert_same_ranges(self.make_data(3), np.array([1]))
+
+    def test_all_same_label(self):
+        self.assert_same_ranges(self.make_data(50), np.full(50, 2))
+
+    def test_trailing_run(self):
+        predictions = np.array([0, 0, 1, 1, 1, 2, 2, 0, 1])  # The last run is one row long
+        self.assert_same_ranges(self.make_data(len(predictions)), predictions)
+
+    def test_time_zones_and_sub_second_intervals(self):
+        rng = np.random.default_rng(23)
+        predictions = np.repeat(rng.integers(0, 3, size=40), rng.integers(1, 5, size=40))
+        # Across the daylight saving time change of New York, then with millisecond and sub-microsecond steps
+        self.assert_same_ranges(self.make_data(len(predictions), '2024-03-10 00:00:00', '15min', 'America/New_York'), predictions)
+        self.assert_same_ranges(self.make_data(len(predictions), '2024-01-01 00:00:00', '250ms', 'Asia/Kolkata'), predictions)
+        self.assert_same_ranges(self.make_data(len(predictions), '2024-01-01 00:00:00', '10ns'), predictions)
+
+    def test_format_timestamps_iso(self):
+        timestamps = pd.DatetimeIndex(['2024-03-10 06:59:59', '2024-03-10 07:00:00', '2024-11-03 05:30:00.5',
+                                       '2024-11-03 06:30:00.000001', '2024-11-03 06:30:00.000000001'], tz='UTC')
+        epoch_ns = timestamps.as_unit('ns').asi8
+        for tz in (None, 'UTC', 'America/New_York', 'Asia/Kolkata'):
+            expected = [(timestamp.tz_convert(tz) if tz else timestamp.tz_localize(None)).isoformat() for timestamp in timestamps]
+            self.assertEqual(format_timestamps_iso(epoch_ns, tz).tolist(), expected, tz)
+        self.assertEqual(len(format_timestamps_iso(np.empty(0, dtype=np.int64))), 0)
+
+class AutoLabelJobQueueTests(TestCase):
+
+    def setUp(self):
+        self.broker = InProcessJobBroker(ttl_seconds=3600)
+        self.jobs = AutoLabelJobQueue(self.broker)
+        self.notified = []
+        self.jobs.notify = lambda job: self.notified.append(job['Status'])
+        self.ranges = [{'Item Number': 1, 'Start Index': '2024-01-01T00:00:00', 'End Index': '2024-01-01T00:01:00',
+                        'Label': 'Up', 'Color': '#00ff00'}]
+        self.stored = []
+        for target, replacement in (('get_models', lambda: {'Model': {'Model File': 'model.pth'}}),
+                                    ('prediction_cache_key', lambda *args: 'key'),
+                                    ('get_annotation_backend', lambda: 'database'),
+                                    ('predict_auto_labels', lambda *args: self.predict()),
+                                    ('store_auto_labels', lambda file_path, csv_path, ranges: self.store(ranges))):
+            patcher = mock.patch(f'home.auto_label_jobs.{target}', replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.on_predict = self.on_store = lambda: None
+
+    def predict(self):
+        self.on_predict()
+        return self.ranges
+
+    def store(self, ranges):
+        self.on_store()
+        self.stored.append(ranges)
+
+    def submit(self) -> str:
+        return self.jobs.submit('user', 'Raw_Time_Series_Data/file.csv', 'Model', [])['Job_id']
+
+    def test_job_is_stored_then_done(self):
+        job = self.jobs.run_job(self.submit())
+        self.assertEqual((job['Status'], job['Ranges'], job['Cached']), ('done', 1, False))
+        self.assertEqual(self.stored, [self.ranges])
+        self.assertEqual(self.notified, ['running', 'done'])
+        # The second job of the same file, model and labels takes the cached predictions
+        self.on_predict = lambda: self.fail('predicted again')
+        self.assertTrue(self.jobs.run_job(self.submit())['Cached'])
+
+    def test_cancel_before_it_starts(self):
+        job_id = self.submit()
+        self.assertEqual(self.jobs.cancel(job_id)['Status'], 'cancelled')
+        self.assertIsNone(self.jobs.run_job(job_id))
+        self.assertEqual(self.stored, [])
+
+    def test_cancel_while_predicting_drops_the_predictions(self):
+        job_id = self.submit()
+        self.on_predict = lambda: self.jobs.cancel(job_id)
+        job = self.jobs.run_job(job_id)
+        self.assertEqual(job['Status'], 'cancelled')
+        self.assertEqual(self.stored, [])
+
+    def test_cancel_while_storing_is_refused(self):
+        job_id = self.submit()
+        cancel_results = []
+        self.on_store = lambda: cancel_results.append(self.jobs.cancel(job_id))
+        job = self.jobs.run_job(job_id)
+        self.assertEqual(job['Status'], 'done')
+        self.assertEqual(self.stored, [self.ranges])
+        self.assertFalse(cancel_results[0]['Cancel_requested'])
+
+    def test_job_expiring_while_running(self):
+        job_id = self.submit()
+        self.on_predict = lambda: self.broker._jobs.pop(job_id)
+        self.assertIsNone(self.jobs.run_job(job_id))
+        self.assertEqual(self.stored, [])
+        self.assertIsNone(self.jobs.status(job_id))
+
+class BoundedThreadPool(ThreadPoolExecutor):
+    """Stands in for the spawn process pool of run_auto_labeling_batch (the stubs are only patched in this process)."""
+    peak_in_flight = 0
+
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers)
+        self.in_flight = 0
+        self.guard = threading.Lock()
+
+    def submit(self, *args, **kwargs):
+        with self.guard:
+            self.in_flight += 1
+            BoundedThreadPool.peak_in_flight = max(BoundedThreadPool.peak_in_flight, self.in_flight)
+        future = super().submit(*args, **kwargs)
+        future.add_done_callback(lambda _: self.finished())
+        return future
+
+    def finished(self):
+        with self.guard:
+            self.in_flight -= 1
+
+class AutoLabelBatchTests(TestCase):
+    """Folder auto labeling: a bounded queue of files per worker, per-file failures collected, progress reported."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.media_root = Path(temp_dir.name)
+        folder = self.media_root / 'Raw_Time_Series_Data' / 'batch'
+        (folder / 'sub').mkdir(parents=True)
+        for number in range(9):
+            (folder / ('sub' if number % 3 == 0 else '') / f'file_{number}.csv').write_text('date,close\n')
+        settings_override = override_settings(MEDIA_ROOT=str(self.media_root))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        BoundedThreadPool.peak_in_flight = 0
+
+    def test_failures_are_collected_and_progress_is_reported(self):
+        def stub_prediction(relative_file_path, working_csv_file_path, selected_model, labels_list):
+            time.sleep(0.01)
+            if relative_file_path.endswith('file_4.csv'):
+                raise ValueError('Corrupt file')
+            if relative_file_path.endswith('file_6.csv'):
+                return []  # No predictions
+            return [annotation('2024-01-01 00:00:00', '2024-01-01 00:00:10', 'Up')] * 2
+        progress = []
+        with mock.patch('home.utils.get_models', return_value={'stub': {'Model File': 'stub.pth'}}), \
+             mock.patch('home.utils.ProcessPoolExecutor', BoundedThreadPool), \
+             mock.patch('home.utils.run_auto_labeling_of_annotations', side_effect=stub_prediction):
+            summary = run_auto_labeling_batch('Raw_Time_Series_Data/batch', 'stub', [], max_workers=2,
+                                              progress_callback=lambda *report: progress.append(report))
+        self.assertFalse(summary['Success'])
+        self.assertEqual((summary['Files_to_label'], summary['Files_labeled'], summary['Ranges']), (9, 7, 14))
+        self.assertEqual(sorted(summary['Failed_files']), ['Raw_Time_Series_Data/batch/file_4.csv', 'Raw_Time_Series_Data/batch/sub/file_6.csv'])
+        self.assertEqual(progress[-1][0:2] + progress[-1][3:], (9, 9, True))
+        self.assertEqual(sorted(progress[-1][2]), sorted(summary['Failed_files']))
+        self.assertLessEqual(BoundedThreadPool.peak_in_flight, 2 * 2)  # Two queued files per worker, not the whole folder
+
+    def test_unknown_model_and_folder(self):
+        with mock.patch('home.utils.get_models', return_value={}):
+            self.assertIn('not found', run_auto_labeling_batch('Raw_Time_Series_Data/batch', 'stub', [])['Message'])
+        self.assertFalse(run_auto_labeling_batch('Raw_Time_Series_Data/../..', 'stub', [])['Success'])
+
+class UploadIngestTests(TestCase):
+    """Uploaded files are ingested into their series store in the background, not within the upload request."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.media_root = Path(temp_dir.name)
+        (self.media_root / 'Raw_Time_Series_Data').mkdir()
+        settings_override = override_settings(MEDIA_ROOT=str(self.media_root))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_upload_is_ingested_in_the_background(self):
+        csv_path = self.media_root / 'Raw_Time_Series_Data' / 'upload.csv'
+        index = pd.Index(pd.date_range('2024-01-01', periods=50, freq='s'), name='date')
+        pd.DataFrame({'close': np.arange(50.0)}, index=index).to_csv(csv_path)
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_ingest(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return ingest_series_store(*args, **kwargs)
+
+        with mock.patch('home.utils.ingest_series_store', slow_ingest):
+            prepare_uploaded_series_file('Raw_Time_Series_Data/upload.csv')  # Returns while the ingest waits
+            self.assertTrue(started.wait(5))
+            self.assertIsNone(open_series_store(csv_path))
+            release.set()
+            _series_ingest_queue.join()
+        self.assertEqual(open_series_store(csv_path).rows, 50)
+
+    def test_invalid_uploads_log_no_errors(self):
+        files = {'no_date.csv': 'time,close\n1,2\n', 'empty.csv': '', 'binary.csv': b'\xff\xfe\x00\x81'.decode('latin-1'),
+                 'bad_dates.csv': 'date,close\nyesterday,1\n'}
+        for name, content in files.items():
+            (self.media_root / 'Raw_Time_Series_Data' / name).write_text(content, encoding='latin-1')
+        with self.assertNoLogs('home', level='ERROR'):
+            for name in files:
+                prepare_uploaded_series_file(f'Raw_Time_Series_Data/{name}')
+            _series_ingest_queue.join()
+        for name in files:
+            self.assertIsNone(open_series_store(self.media_root / 'Raw_Time_Series_Data' / name))
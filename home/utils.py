@@ -7,10 +7,14 @@ import os
 import csv
 import time
 import json
+import queue
 import logging
 import shutil
+import tempfile
+import threading
 import traceback
 import mimetypes
+import multiprocessing
 import pandas as pd
 import numpy as np
 import torch
@@ -20,14 +24,24 @@ import plotly.graph_objs as go
 from tkinter import messagebox
 from IPython.display import display
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from scipy.ndimage import gaussian_filter1d
 from typing import Optional, Dict, Union
 from django.conf import settings  # Import Django settings
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync
+from .series_cache import SeriesCache, series_cache
+from .model_registry import model_registry
+from .annotation_journal import get_annotation_journal, file_version, batch_record, JOURNAL_SUFFIX, StaleAnnotationVersion
+from .annotation_index import AnnotationIndex, boundaries_to_epoch_ns, NAT_NS
+from .annotation_snapshots import snapshot_root_for, save_snapshot_file, update_head
+from .series_store import open_series_store, load_series_store, write_series_store, ingest_series_store, time_slice_positions, to_epoch_ns
 
 # Setup logger
 logger = logging.getLogger('home')
 
-def handle_annotation_to_csv(relative_file_path=None, selected_model=None, annotation_data=None, task_to_do='', delete_data=None, labels_list=[]):
+def handle_annotation_to_csv(relative_file_path=None, selected_model=None, annotation_data=None, task_to_do='', delete_data=None, labels_list=[],
+                             progress_callback=None, expected_version=None):
     """
     Handles various operations on annotation CSV files, including adding, retrieving, saving, 
     and managing annotations, as well as auto-labeling with a selected model.
@@ -47,7 +61,8 @@ def handle_annotation_to_csv(relative_file_path=None, selected_model=None, annot
         - 'save': Save the working CSV file to the saving directory.
         - 'SaveAll': Save all working CSV files in their respective directories.
         - 'refresh': Reset the working CSV file to its initial state.
-        - 'undo': Undo the last annotation added to the working CSV file.
+        - 'undo': Undo the last edit of the working CSV file (CSV journal backend only, the database backend keeps no edit history).
+        - 'redo': Redo the last undone edit of the working CSV file (CSV journal backend only).
         - 'Auto_Label': Perform auto-labeling using the selected model and update the CSV file.
     - delete_data (list): List of dictionaries specifying rows to delete. Each dictionary must contain:
         - 'Item Number' (int): Unique identifier for the annotation.
@@ -59,8 +74,12 @@ def handle_annotation_to_csv(relative_file_path=None, selected_model=None, annot
         - 'label' (int): Numeric identifier for the label.
         - 'value' (str): Description or value of the label.
         - 'Color' (str): Color associated with the label.
+    - progress_callback (callable): Progress of 'SaveAll' (optional), see save_all_annotations_to_csv.
+    - expected_version (int): Annotation version the client made a 'delete', 'undo', 'redo' or 'refresh' on (optional).
+                              StaleAnnotationVersion is raised (nothing is changed) if the annotations changed since.
 
     Returns:
+    - For 'add': List of dictionaries of the added annotations, with their 'Item Number' (empty on failure).
     - For 'retrieve': List of dictionaries containing existing annotation values.
     - For 'save' and 'SaveAll': Tuple (str, bool) with a status message and success flag.
     - For 'Auto_Label': List of dictionaries with auto-labeled annotations.
@@ -69,32 +88,40 @@ def handle_annotation_to_csv(relative_file_path=None, selected_model=None, annot
 
     working_csv_file_path, saving_csv_file_path, annotations_dir = creating_file_paths(relative_file_path)
 
+    if get_annotation_backend() == 'database':
+        return handle_annotation_in_database(relative_file_path, selected_model, annotation_data, task_to_do, delete_data, labels_list,
+                                             saving_csv_file_path=saving_csv_file_path, annotations_dir=annotations_dir,
+                                             progress_callback=progress_callback, expected_version=expected_version)
+
     # selected_model, handle this case
 
     if task_to_do == 'add':
         logger.info(f"Adding data to a working CSV file...\n")
-        add_annotation_to_csv(working_csv_file_path, annotation_data)
+        return add_annotation_to_csv(working_csv_file_path, annotation_data)
     elif task_to_do == 'delete':
         logger.info(f"Deleting data from a working CSV file...\n")
-        delete_annotation_from_csv(working_csv_file_path, delete_data)
+        delete_annotation_from_csv(working_csv_file_path, delete_data, expected_version)
     elif task_to_do == 'retrieve':
         logger.info(f"Retrieving existing annotations from working CSV file...\n")
         existing_values = retrieve_existing_annotations(working_csv_file_path)
         return existing_values
     elif task_to_do == 'save':
         logger.info(f"Saving the working CSV file...\n")
-        message, status = save_annotations_to_csv(working_csv_file_path, saving_csv_file_path)
+        message, status = save_annotations_to_csv(working_csv_file_path, saving_csv_file_path, annotations_dir)
         return message, status
     elif task_to_do == 'SaveAll':
         logger.info(f"Saving All the working CSV files...\n")
-        message, status = save_all_annotations_to_csv(annotations_dir)
+        message, status = save_all_annotations_to_csv(annotations_dir, progress_callback)
         return message, status
     elif task_to_do == 'undo':
         logger.info(f"Undoing the last annotation in the working CSV file...\n")
-        undo_last_annotation(working_csv_file_path)
+        undo_last_annotation(working_csv_file_path, expected_version)
+    elif task_to_do == 'redo':
+        logger.info(f"Redoing the last undone edit in the working CSV file...\n")
+        redo_last_annotation(working_csv_file_path, expected_version)
     elif task_to_do == 'refresh':
         logger.info(f"Resetting the working CSV file...\n")
-        refresh_working_file(working_csv_file_path)
+        refresh_working_file(working_csv_file_path, expected_version)
     elif task_to_do == 'Auto_Label':
         logger.info(f"\nRunning auto labeling with the selected model: {selected_model}...")
         run_auto_labeling_of_annotations(relative_file_path=relative_file_path, 
@@ -109,6 +136,149 @@ def handle_annotation_to_csv(relative_file_path=None, selected_model=None, annot
         logger.info(message)
         return []
 
+def handle_annotation_batch(relative_file_path: str, operations: list[dict], expected_version: int = None) -> dict:
+    """
+    Applies many annotation edits at once (e.g. a multi-selection delete or relabel): one pass over the
+    annotations, one atomic journal append (or one transaction with the database backend) and item numbers
+    renumbered once, instead of one handle_annotation_to_csv call and one rewrite per edit.
+
+    Parameters:
+    - relative_file_path (str): Relative file path of the data file.
+    - operations (list[dict]): The edits, applied all or none. Each one is:
+        - {'op': 'add', 'annotation': {'Start Index', 'End Index', 'Label', 'Color'}}
+        - {'op': 'delete', 'annotation': {'Item Number', 'Start Index', 'End Index', 'Label', 'Color'}}
+        - {'op': 'update', 'annotation': {...same as delete...}, 'changes': {e.g. 'Label', 'Color'}}
+      Item numbers refer to the annotations before the batch, the added annotations go last.
+    - expected_version (int, optional): Annotation version the item numbers refer to. If the annotations changed
+                                        since, nothing is applied and the result has 'Conflict': True.
+
+    Returns:
+    - dict: The number of annotations 'added', 'deleted' and 'updated', plus 'Success' (bool), 'Message' (str)
+            and 'Annotation_Version' (int, the version after the batch).
+    """
+    summary = {'added': 0, 'deleted': 0, 'updated': 0}
+    try:
+        record = batch_record(operations or [])
+        if get_annotation_backend() == 'database':
+            from . import annotation_db  # See handle_annotation_in_database
+            summary = annotation_db.apply_annotation_batch(relative_file_path, record, expected_version, series_data_tz(relative_file_path))
+        else:
+            working_csv_file_path = creating_file_paths(relative_file_path)[0]
+            summary = get_annotation_journal(working_csv_file_path).batch(operations or [], expected_version)
+        requested = {'added': len(record['add']), 'deleted': len(record['delete']), 'updated': len(record['update'])}
+        message = f"Batch applied to {relative_file_path}: {summary['added']} added, {summary['deleted']} deleted, {summary['updated']} updated."
+        if summary != requested:
+            message += f" Some annotations were not found (requested: {requested})."
+            logger.warning(message)
+        else:
+            logger.info(message)
+        return {**summary, 'Success': True, 'Message': message, 'Annotation_Version': get_annotation_version(relative_file_path)}
+    except StaleAnnotationVersion as conflict:
+        logger.warning(f"Rejected a stale annotation batch for {relative_file_path}: {conflict}")
+        return {**summary, 'Success': False, 'Conflict': True, 'Message': str(conflict), 'Annotation_Version': conflict.current_version}
+    except ValueError as error:
+        logger.error(f"Invalid annotation batch for {relative_file_path}: {error}")
+        return {**summary, 'Success': False, 'Message': str(error)}
+    except Exception:
+        logger.error(f"Error in handle_annotation_batch: \n\t{traceback.format_exc()}\n")
+        return {**summary, 'Success': False, 'Message': 'The annotation batch could not be applied.'}
+
+def get_annotation_version(relative_file_path: str) -> int:
+    """
+    Returns:
+    - int: The current annotation version of a file, sent to the clients with its annotations: their edits carry
+           it back and are rejected if the annotations changed since (see StaleAnnotationVersion).
+    """
+    if get_annotation_backend() == 'database':
+        from . import annotation_db  # See handle_annotation_in_database
+        return annotation_db.current_annotation_version(relative_file_path)
+    return get_annotation_journal(creating_file_paths(relative_file_path)[0]).current_version()
+
+def get_annotation_backend() -> str:
+    """
+    Returns:
+    - str: 'csv' (working CSV files with their journals) or 'database' (home.models, CSV files as exports).
+    """
+    return getattr(settings, 'ANNOTATION_BACKEND', 'csv')
+
+def handle_annotation_in_database(relative_file_path=None, selected_model=None, annotation_data=None, task_to_do='', delete_data=None, labels_list=[],
+                                  saving_csv_file_path: Path = None, annotations_dir: Path = None, progress_callback=None,
+                                  expected_version=None):
+    """
+    Database counterpart of handle_annotation_to_csv (ANNOTATION_BACKEND = 'database'), same tasks and return values.
+    Edits are transactions on the AnnotationSet/Annotation models, 'save' and 'SaveAll' export the annotations
+    to the CSV files of the 'Saving_Folder' structure (only the files edited since their last export, with the
+    AnnotationSet versions in the manifest of save_all_annotations_to_csv).
+    """
+    # Imported here: home.utils is imported by home.consumers before the Django apps are loaded (see label_V04/asgi.py)
+    from . import annotation_db
+
+    try:
+        if task_to_do == 'add':
+            logger.info(f"Adding data to the database annotations of {relative_file_path}...\n")
+            annotations = [annotation_data] if isinstance(annotation_data, dict) else annotation_data
+            return annotation_db.add_annotations(relative_file_path, annotations, series_data_tz(relative_file_path))
+        elif task_to_do == 'delete':
+            logger.info(f"Deleting data from the database annotations of {relative_file_path}...\n")
+            deleted_count = annotation_db.delete_annotations(relative_file_path, delete_data or [], expected_version)
+            logger.info(f"Deleted {deleted_count} of the {len(delete_data or [])} requested annotations.\n")
+        elif task_to_do == 'retrieve':
+            existing_values = annotation_db.retrieve_annotations(relative_file_path)
+            logger.info(f"Retrieved {len(existing_values)} existing annotations of {relative_file_path} from the database\n")
+            return existing_values
+        elif task_to_do == 'save':
+            version = annotation_db.annotation_set_version(relative_file_path)
+            exported_count = annotation_db.export_annotations_to_csv(relative_file_path, saving_csv_file_path)
+            saving_root = annotations_dir / 'Saving_Folder'
+            record_saved_versions(saving_root, {saving_csv_file_path.relative_to(saving_root).as_posix(): version})
+            logger.info(f"Exported {exported_count} annotations of {relative_file_path} \n\tto {saving_csv_file_path}\n")
+            return 'Progress Saved successfully!', True
+        elif task_to_do == 'SaveAll':
+            # Every annotated file under the same top folder, like the 'Working_Folder' tree of the CSV backend
+            top_parent_dir = Path(relative_file_path).parts[0]
+            current_versions = annotation_db.annotation_set_versions(f"{top_parent_dir}/")
+            saving_root = annotations_dir / 'Saving_Folder'
+            saved_versions = load_save_manifest(saving_root)
+            newly_saved = {}
+            for files_done, (file_path, version) in enumerate(current_versions.items(), start=1):
+                file_saving_path = creating_file_paths(file_path)[1]
+                relative_path = file_saving_path.relative_to(saving_root).as_posix()
+                if saved_versions.get(relative_path) != version or not file_saving_path.exists():
+                    annotation_db.export_annotations_to_csv(file_path, file_saving_path)
+                    newly_saved[relative_path] = version
+                if progress_callback:
+                    progress_callback(files_done, len(current_versions), [], files_done == len(current_versions))
+            record_saved_versions(saving_root, newly_saved)
+            message = f'All {len(newly_saved)} modified annotation file(s) saved successfully! ({len(current_versions) - len(newly_saved)} unchanged)'
+            logger.info(message)
+            return message, True
+        elif task_to_do in ('undo', 'redo'):
+            # The database backend keeps no edit history (the consumer refuses these actions): nothing is changed
+            logger.info(f"Nothing to {task_to_do} for {relative_file_path}: not supported with the database backend\n")
+        elif task_to_do == 'refresh':
+            annotation_db.refresh_annotations(relative_file_path, expected_version)
+        elif task_to_do == 'Auto_Label':
+            logger.info(f"\nRunning auto labeling with the selected model: {selected_model}...")
+            run_auto_labeling_of_annotations(relative_file_path=relative_file_path,
+                                             working_csv_file_path=None,
+                                             selected_model=selected_model,
+                                             labels_list=labels_list)
+            existing_values = annotation_db.retrieve_annotations(relative_file_path)
+            logger.info(f"Auto labeling complete with the selected model: {selected_model}!\n")
+            return existing_values
+        else:
+            logger.info(f"Specify a valid task_to_do.\n")
+            return []
+    except StaleAnnotationVersion:
+        raise
+    except Exception:
+        message = f"Error in handle_annotation_in_database ({task_to_do}): \n\t{traceback.format_exc()}\n"
+        logger.error(message)
+        if task_to_do in ('save', 'SaveAll'):
+            return message, False
+        if task_to_do in ('add', 'retrieve', 'Auto_Label'):
+            return []
+
 def creating_file_paths(relative_file_path: str) -> tuple[Path, Path, Path]:
     """
         Creates file paths for working/saving CSV annotations based on a data file's
@@ -166,7 +336,7 @@ def creating_file_paths(relative_file_path: str) -> tuple[Path, Path, Path]:
 
 def add_annotation_to_csv(working_csv_file_path: Path, annotation_data: list[dict] | dict = None):
     """
-    Adds one or multiple annotation rows to a CSV file, creating the file and necessary directories if they don't exist.
+    Adds one or multiple annotations after the existing ones of a working CSV file, as one append to its journal.
 
     Parameters:
     - working_csv_file_path (Path): Full file path of the working CSV file..
@@ -178,12 +348,12 @@ def add_annotation_to_csv(working_csv_file_path: Path, annotation_data: list[dic
         - 'Color': (str) The color to be associated with the annotation (default is '#d604a2' if not provided).
 
     Description:
-    - Creates the specified CSV file with appropriate headers if it does not exist.
-    - Reads the existing file and either updates the first empty row or appends new rows for each annotation in the list or single dictionary.
-    - Ensures each annotation gets a unique item number for tracking.
+    - Appends an 'add' record to the journal of the file (see home.annotation_journal), the CSV file itself
+      is only rewritten when the journal is compacted.
+    - Item numbers are the positions of the annotations, so the new ones follow the existing ones.
 
     Returns:
-    - None
+    - list[dict]: The added annotations with their 'Item Number' (served from the in-memory state), empty on failure.
     """
     try:
         # Validate inputs
@@ -193,84 +363,18 @@ def add_annotation_to_csv(working_csv_file_path: Path, annotation_data: list[dic
         if isinstance(annotation_data, dict):
             logger.info(f"\n\nannotation_data is a dic: \n{json.dumps(annotation_data, indent=4)}\n")
             annotation_data = [annotation_data]
-            logger.info(f"annotation_data is now a list of dic: \n{json.dumps(annotation_data, indent=4)}\n")
-        # Create temporary file for manipulation 
-        temp_file_path = Path(working_csv_file_path).with_suffix('.tmp')
-        with open(temp_file_path, mode='w', newline='') as temp_file:
-            pass  # This ensures the file is truncated (emptied) if it exists
-        
-        # Initialize item number
-        item_number = 1
-
-        # Create the CSV file if it doesn't exist
-        if not working_csv_file_path.exists():
-            with open(working_csv_file_path, mode='w', newline='') as file:
-                writer = csv.writer(file)
-                # Write header row
-                writer.writerow(['Item Number', 'Start Index', 'End Index', 'Label', 'Color'])
-
-        # Open the working CSV file in read mode and the temporary file in write mode
-        with open(working_csv_file_path, mode='r', newline='') as csv_file, open(temp_file_path, mode='w', newline='') as temp_file:
-            reader = csv.reader(csv_file)
-            writer = csv.writer(temp_file)
-
-            headers = next(reader)  # Read the header row
-            writer.writerow(headers)  # Write the header to the temporary file
-
-            # Find the indices of the relevant columns
-            item_col_index = headers.index('Item Number')
-            start_index_col = headers.index('Start Index')
-            end_index_col = headers.index('End Index')
-            label_col = headers.index('Label')
-            color_col = headers.index('Color')
-
-            # Iterate through the rows after the headers row
-            for row in reader:
-                if not annotation_data:
-                    break
-                # Check if the row is empty for the current annotation
-                if all(not row[idx] for idx in [item_col_index, start_index_col, end_index_col, label_col, color_col]):
-                    # Use and remove the first dictionary in the list
-                    annotation = annotation_data.pop(0)
-                    logger.info(f"annotation_data.pop(0) is \n{annotation}\n\tfor item_number = {item_number}\n")
-                    # Update the empty row with the annotation data
-                    row[item_col_index] = item_number
-                    row[start_index_col] = annotation.get('Start Index', '')
-                    row[end_index_col] = annotation.get('End Index', '')
-                    row[label_col] = annotation.get('Label', '')
-                    row[color_col] = annotation.get('Color', '#d604a2')
-                else:
-                    # Assign an item number if it is missing or doesn't match the current item number
-                    if not row[item_col_index] or int(row[item_col_index]) != item_number:
-                        row[item_col_index] = item_number
-                writer.writerow(row)
-                # Increment the item number for the next iteration
-                item_number += 1
-
-            if annotation_data:
-                logger.info(f"Current item_number being added: {item_number}\n")
-                # If there are any remaining annotations, append them
-                for annotation in annotation_data:
-                    new_row = [''] * len(headers)
-                    new_row[item_col_index] = item_number
-                    new_row[start_index_col] = annotation.get('Start Index', '')
-                    new_row[end_index_col] = annotation.get('End Index', '')
-                    new_row[label_col] = annotation.get('Label', '')
-                    new_row[color_col] = annotation.get('Color', '#d604a2')
-                    writer.writerow(new_row)
-                    item_number += 1
-
-        # Replace the working CSV file with the temporary file
-        os.replace(temp_file_path, working_csv_file_path)
-        logger.info(f"Working CSV file was updated, and the temporary file was removed.\n")
+        added_annotations = get_annotation_journal(working_csv_file_path).add(annotation_data)
+        logger.info(f"Journaled {len(annotation_data)} new annotation(s) for {working_csv_file_path}\n")
+        return added_annotations
 
     except Exception:
         logger.error(f"Unexpected error in handle_annotation_to_csv / add_annotation_to_csv: \n{traceback.format_exc()}\n")
+        return []
 
-def delete_annotation_from_csv(working_csv_file_path: Path, delete_data: list):
+def delete_annotation_from_csv(working_csv_file_path: Path, delete_data: list, expected_version: int = None):
     """
-    Deletes specific annotations from the CSV file based on delete_data and ensures that 
-    the item numbers are reorganized to be continuous after deletion.
+    Deletes specific annotations from the working CSV file based on delete_data, as one append to its journal.
+    The item numbers of the remaining annotations stay continuous (they are the annotation positions).
 
     Parameters:
     - working_csv_file_path (Path): Full file path of the working CSV file.
@@ -280,84 +384,33 @@ def delete_annotation_from_csv(working_csv_file_path: Path, delete_data: list):
         - 'End Index': (str) The ending index of the annotation.
         - 'Label': (str) The label of the annotation.
         - 'Color': (str) The color of the annotation.
+    - expected_version (int, optional): Annotation version the item numbers refer to (see StaleAnnotationVersion, re-raised).
     
     Returns:
-    - None
+    - int: The number of annotations deleted.
     """
     try:
-        # Check if the file exists
-        if not working_csv_file_path.exists():
+        journal = get_annotation_journal(working_csv_file_path)
+        # Check if there is anything to delete from
+        if not working_csv_file_path.exists() and not journal.journal_path.exists():
             logger.info(f"File does not exist: {working_csv_file_path}\n")
-            return
+            return 0
         # Early exit if delete_data is empty
         if not delete_data:
             logger.info(f"No rows to delete. {working_csv_file_path} remains unchanged.\n")
-            return
-        # Create a temporary file for manipulation 
-        temp_file_path = Path(working_csv_file_path).with_suffix('.tmp')
-        with open(temp_file_path, mode='w', newline='') as temp_file:
-            pass  # This ensures the file is truncated (emptied) if it exists
-        # Open the working CSV file in read mode and the temporary file in write mode
-        with open(working_csv_file_path, mode='r', newline='') as csv_file, open(temp_file_path, mode='w', newline='') as temp_file:
-            reader = csv.reader(csv_file)
-            writer = csv.writer(temp_file)
-            # Read and write headers
-            headers = next(reader)
-            writer.writerow(headers)
-            # Get column indices dynamically
-            item_num_col = headers.index('Item Number')
-            start_idx_col = headers.index('Start Index')
-            end_idx_col = headers.index('End Index')
-            label_col = headers.index('Label')
-            color_col = headers.index('Color')
-            # Log the indices
-            logger.info(f"Column indices for annotations:")
-            logger.info(f"Item Number Column Index: {item_num_col}")
-            logger.info(f"Start Index Column Index: {start_idx_col}")
-            logger.info(f"End Index Column Index: {end_idx_col}")
-            logger.info(f"Label Column Index: {label_col}")
-            logger.info(f"Color Column Index: {color_col}\n")
-            # Initialize item number counter
-            item_number = 1
-            # Iterate through rows to process deletions and reorganization
-            for row in reader:
-                # Flag to indicate if data should be updated
-                match_found = False
-                # Check if the current row matches any item in delete_data
-                for delete_item in delete_data:
-                    if (
-                        row[item_num_col] == str(delete_item['Item Number']) and
-                        row[start_idx_col] == str(delete_item['Start Index']) and
-                        row[end_idx_col] == str(delete_item['End Index']) and
-                        row[label_col] == str(delete_item['Label']) and
-                        row[color_col] == str(delete_item['Color'])
-                    ):
-                        logger.info(f"\nDeleting row: {row}")
-                        logger.info(f"\nMatching delete_item: Item Number: {delete_item['Item Number']}, Start Index: {delete_item['Start Index']}, "
-                                    f"End Index: {delete_item['End Index']}, Label: {delete_item['Label']}, Color: {delete_item['Color']}")
-                        logger.info(f"\nMatching row:         Item Number: {row[item_num_col]}, Start Index: {row[start_idx_col]}, "
-                                    f"End Index: {row[end_idx_col]}, Label: {row[label_col]}, Color: {row[color_col]}\n\n")
-                        delete_data.remove(delete_item)  # Remove matched item from delete_data
-                        match_found = True
-                        break  # Stop checking further delete_items for this row
-
-                if not match_found:
-                    # If the row is not being deleted, reorganize the item number
-                    if any(row):  # Ensure the row is not completely empty
-                        row[item_num_col] = item_number  # Reassign continuous item numbers
-                        writer.writerow(row)
-                        logger.info(f"Retained row with updated item number: {row}\n")
-                        item_number += 1
-
-        # Replace the original working CSV file with the temporary file. This will delete the temporary file.
-        os.replace(temp_file_path, working_csv_file_path)
-        if not delete_data:
-            logger.info(f"Rows deleted and item numbers reorganized in {working_csv_file_path}, and the temporary file was removed.\n")
+            return 0
+        deleted_count = journal.delete(delete_data, expected_version)
+        if deleted_count == len(delete_data):
+            logger.info(f"Journaled the deletion of {deleted_count} row(s) from {working_csv_file_path}.\n")
         else:
-            logger.warning(f"Some rows from delete_data were not found in {working_csv_file_path}. \nRemaining items: \n\t{delete_data}\n")
+            logger.warning(f"Only {deleted_count} of the {len(delete_data)} rows of delete_data were found in {working_csv_file_path}. \nRequested items: \n\t{delete_data}\n")
+        return deleted_count
 
+    except StaleAnnotationVersion:
+        raise
     except Exception:
         logger.error(f"Error in handle_annotation_to_csv / delete_annotation_from_csv: \n\t{traceback.format_exc()}\n")
+        return 0
 
 def retrieve_existing_annotations(working_csv_file_path: Path) -> list:
     """
@@ -375,31 +428,8 @@ def retrieve_existing_annotations(working_csv_file_path: Path) -> list:
         - 'Color': (str) The color associated with the annotation.
     """
     try:
-        # List to store existing values
-        existing_values = []
-
-        if working_csv_file_path.exists():
-            with open(working_csv_file_path, mode='r', newline='') as csv_file:
-                reader = csv.reader(csv_file)
-                headers = next(reader)  # Read the header row
-
-                # Find the column indices dynamically
-                item_col_index = headers.index('Item Number')
-                start_index_col = headers.index('Start Index')
-                end_index_col = headers.index('End Index')
-                label_col = headers.index('Label')
-                color_col = headers.index('Color')
-
-                # Iterate through rows and collect non-empty rows
-                for row in reader:
-                    if row[item_col_index]:
-                        existing_values.append({
-                            'Item Number': row[item_col_index],
-                            'Start Index': row[start_index_col],
-                            'End Index': row[end_index_col],
-                            'Label': row[label_col],
-                            'Color': row[color_col],
-                        })
+        # Current state: the CSV file with its journal replayed (kept in memory between calls)
+        existing_values = get_annotation_journal(working_csv_file_path).annotations()
 
         logger.info(f"Retrieved {len(existing_values)} existing annotations from {working_csv_file_path}\n")
         return existing_values
@@ -407,18 +437,27 @@ def retrieve_existing_annotations(working_csv_file_path: Path) -> list:
         logger.error(f"Error in handle_annotation_to_csv / retrieve_existing_annotations: \n\t{traceback.format_exc()}\n")
         return []
 
-def save_annotations_to_csv(working_csv_file_path: Path, saving_csv_file_path: Path):
+def save_annotations_to_csv(working_csv_file_path: Path, saving_csv_file_path: Path, annotations_dir: Path = None):
     """
     Saves the working CSV file to the saving directory.
 
     Parameters:
     - working_csv_file_path (Path): Full file path of the working CSV file.
     - saving_csv_file_path (Path): Full file path where the CSV file should be saved.
+    - annotations_dir (Path, optional): Base directory of the 'Working_Folder' and 'Saving_Folder', to record the saved
+                                        version in the manifest (Save All then skips the file until it changes).
     """
     try:
-        # Copy the working CSV file to the saving directory
+        # Fold the pending journaled edits into the working CSV file, then copy it to the saving directory
+        get_annotation_journal(working_csv_file_path).compact()
         if working_csv_file_path.exists():
-            shutil.copy2(working_csv_file_path, saving_csv_file_path)
+            version = file_version(working_csv_file_path)
+            digest = save_working_file(working_csv_file_path, saving_csv_file_path, annotations_dir)
+            if annotations_dir is not None:
+                relative_path = working_csv_file_path.relative_to(annotations_dir / 'Working_Folder').as_posix()
+                record_saved_versions(annotations_dir / 'Saving_Folder', {relative_path: version})
+                if digest:
+                    update_head(snapshot_root_for(annotations_dir), {relative_path: digest})
             logger.info(f"CSV file saved \n\tfrom {working_csv_file_path} \n\tto {saving_csv_file_path}\n")
             message = 'Progress Saved successfully!'
             status = True
@@ -434,24 +473,140 @@ def save_annotations_to_csv(working_csv_file_path: Path, saving_csv_file_path: P
         logger.error(message)
         return message, status
 
-def save_all_annotations_to_csv(annotations_dir: Path) -> tuple[str, bool]:
+SAVE_MANIFEST_NAME = '.save_manifest.json'  # In the 'Saving_Folder': version of each working file when it was last saved
+_save_manifest_lock = threading.Lock()
+
+def load_save_manifest(saving_root: Path) -> dict:
+    """
+    Returns:
+    - dict: {working file path relative to the 'Working_Folder' (posix): its version (file_version) when last saved}.
+    """
+    try:
+        with open(Path(saving_root) / SAVE_MANIFEST_NAME, mode='r') as manifest_file:
+            return json.load(manifest_file).get('files', {})
+    except (OSError, ValueError):
+        return {}  # No manifest yet (or unreadable): every file is considered modified
+
+def write_save_manifest(saving_root: Path, saved_versions: dict):
+    """
+    Atomically writes the manifest of the saved versions (temporary file, then os.replace).
+    """
+    saving_root = Path(saving_root)
+    saving_root.mkdir(parents=True, exist_ok=True)
+    file_descriptor, temp_file_path = tempfile.mkstemp(dir=saving_root, prefix=SAVE_MANIFEST_NAME, suffix='.tmp')
+    try:
+        with os.fdopen(file_descriptor, mode='w') as temp_file:
+            json.dump({'files': saved_versions}, temp_file)
+        os.replace(temp_file_path, saving_root / SAVE_MANIFEST_NAME)
+    except BaseException:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+
+def record_saved_versions(saving_root: Path, saved_versions: dict, keep_only: set = None):
+    """
+    Updates the manifest with the versions of the files just saved.
+
+    Parameters:
+    - saved_versions (dict): {relative path: version saved}.
+    - keep_only (set, optional): Relative paths still in the 'Working_Folder', the others are dropped.
+    """
+    with _save_manifest_lock:
+        manifest = load_save_manifest(saving_root)
+        if keep_only is not None:
+            manifest = {relative_path: version for relative_path, version in manifest.items() if relative_path in keep_only}
+        manifest.update(saved_versions)
+        write_save_manifest(saving_root, manifest)
+
+def scan_working_files(working_root: Path) -> dict[str, Path]:
+    """
+    Walks the 'Working_Folder' tree once with os.scandir, folding the annotation journals found on the way
+    into their CSV files (they must hold every edit before being copied).
+
+    Returns:
+    - dict[str, Path]: {path relative to working_root (posix): full path} of every working CSV file.
+    """
+    working_files, journal_paths = {}, []
+    pending_dirs = [Path(working_root)]
+    while pending_dirs:
+        with os.scandir(pending_dirs.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending_dirs.append(Path(entry.path))
+                elif entry.name.endswith('.csv'):
+                    working_files[Path(entry.path).relative_to(working_root).as_posix()] = Path(entry.path)
+                elif entry.name.endswith(JOURNAL_SUFFIX):
+                    journal_paths.append(Path(entry.path))
+    compacted_count = 0
+    for journal_path in journal_paths:
+        csv_path = journal_path.with_suffix('.csv')
+        if get_annotation_journal(csv_path).compact():
+            compacted_count += 1
+        if csv_path.exists():
+            working_files[csv_path.relative_to(working_root).as_posix()] = csv_path
+    if compacted_count:
+        logger.info(f"Compacted {compacted_count} annotation journal(s) before saving.")
+    return working_files
+
+def get_annotation_save_mode() -> str:
+    """
+    Returns:
+    - str: 'copy' (Saving_Folder files are copies) or 'snapshot' (content-addressed store, see home.annotation_snapshots).
+    """
+    return getattr(settings, 'ANNOTATION_SAVE_MODE', 'copy')
+
+def save_working_file(working_file: Path, saving_file: Path, annotations_dir: Path = None) -> str | None:
+    """
+    Saves one working CSV file to its 'Saving_Folder' path, according to ANNOTATION_SAVE_MODE.
+    In 'snapshot' mode, the content is stored once in the 'Snapshots' store of annotations_dir and the saving
+    file is a hardlink (or reflink) to it: saving costs a few metadata operations.
+
+    Returns:
+    - str | None: The content hash in 'snapshot' mode, else None.
+    """
+    if get_annotation_save_mode() == 'snapshot' and annotations_dir is not None:
+        return save_snapshot_file(snapshot_root_for(annotations_dir), working_file, saving_file)
+    copy_with_retries(working_file, saving_file)
+    return None
+
+def copy_with_retries(source_file: Path, target_file: Path, max_retries: int = 3, retry_delay: float = 0.5):
+    """
+    Copies a file (shutil.copy2), retrying on PermissionError (file briefly locked, e.g. opened in Excel).
+    Other errors are raised at once.
+    """
+    target_file.parent.mkdir(parents=True, exist_ok=True)
+    if target_file.exists() and target_file.stat().st_nlink > 1:
+        os.remove(target_file)  # Hardlinked to a snapshot object (see save_working_file), which must not be overwritten
+    for attempt in range(max_retries):
+        try:
+            shutil.copy2(source_file, target_file)
+            return
+        except PermissionError as pe:
+            if attempt == max_retries - 1:
+                raise
+            logger.warning(f"Attempt {attempt + 1}/{max_retries} failed for '{source_file.name}' due to PermissionError: {pe}. Retrying in {retry_delay}s...")
+            time.sleep(retry_delay)
+
+def save_all_annotations_to_csv(annotations_dir: Path, progress_callback=None) -> tuple[str, bool]:
     """
-    Saves all working CSV files from the 'Working_Folder' structure to the
-    corresponding 'Saving_Folder' structure under the provided annotations_dir,
-    replicating any subdirectories. Includes retries for PermissionError during copy.
+    Saves the working CSV files of the 'Working_Folder' structure that changed since their last save to the
+    corresponding 'Saving_Folder' structure under the provided annotations_dir, replicating any subdirectories.
+
+    The version (mtime and size) of each working file when it was last saved is kept in a manifest in the
+    'Saving_Folder' (see load_save_manifest): unchanged files are skipped, the others are copied in parallel
+    by SAVE_ALL_WORKERS threads, with retries for PermissionError (or snapshotted, see save_working_file).
 
     Parameters:
     - annotations_dir (Path): Path object representing the base directory containing
                               'Working_Folder' and 'Saving_Folder'. Example:
                               '.../media/Raw_Time_Series_Data_CSV_Annotations'
+    - progress_callback (callable, optional): progress_callback(files_done, files_to_save, failed_files, done),
+                                              called from this thread as the copies complete.
 
     Returns:
     - tuple[str, bool]: A tuple containing a status message (str) and a success flag (bool).
                         The message summarizes the outcome, including any failures.
     """
-    max_retries = 3
-    retry_delay = 0.5 # seconds
-
     try:
         # --- Define Correct Root Paths ---
         if not annotations_dir or not annotations_dir.is_dir():
@@ -474,86 +629,54 @@ def save_all_annotations_to_csv(annotations_dir: Path) -> tuple[str, bool]:
             logger.info(message)
             return message, status
 
-        # Ensure the base saving directory exists.
-        # Subdirectories will be created as needed later.
-        saving_root.mkdir(parents=True, exist_ok=True)
-
-        files_copied = 0
-        files_failed = []
-        files_processed_count = 0
-
-        # --- Iterate, Calculate Paths, and Copy ---
-        for working_file in working_root.rglob('*.csv'):
-            files_processed_count += 1
-            try:
-                # Calculate the path relative to the working_root
-                relative_path = working_file.relative_to(working_root)
-                # Construct the corresponding saving file path
-                saving_file = saving_root / relative_path
-                # Ensure the specific subdirectory exists in the saving structure
-                saving_file.parent.mkdir(parents=True, exist_ok=True)
-
-                # --- Retry Logic ---
-                copied_successfully = False
-                for attempt in range(max_retries):
+        # --- Find the files modified since their last save ---
+        working_files = scan_working_files(working_root)
+        saved_versions = load_save_manifest(saving_root)
+        current_versions = {relative_path: file_version(working_file) for relative_path, working_file in working_files.items()}
+        dirty_files = [relative_path for relative_path, version in current_versions.items()
+                       if saved_versions.get(relative_path) != version or not (saving_root / relative_path).exists()]
+        logger.info(f"{len(dirty_files)} of the {len(working_files)} working CSV file(s) changed since they were last saved.")
+
+        # --- Copy (or snapshot) them in parallel ---
+        newly_saved, saved_digests, files_failed = {}, {}, []
+        last_report = 0.0
+        if dirty_files:
+            workers = max(1, min(getattr(settings, 'SAVE_ALL_WORKERS', 8), len(dirty_files)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='save-all') as executor:
+                futures = {executor.submit(save_working_file, working_files[relative_path], saving_root / relative_path, annotations_dir): relative_path
+                           for relative_path in dirty_files}
+                for files_done, future in enumerate(as_completed(futures), start=1):
+                    relative_path = futures[future]
                     try:
-                        # Attempt to copy the file
-                        shutil.copy2(working_file, saving_file)
-                        logger.info(f"Copied: {working_file.name} \n\t  to: {saving_file}")
-                        copied_successfully = True
-                        files_copied += 1
-                        break # Exit retry loop on success
-
-                    except PermissionError as pe:
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Attempt {attempt + 1}/{max_retries} failed for '{working_file.name}' due to PermissionError: {pe}. Retrying in {retry_delay}s...")
-                            time.sleep(retry_delay)
-                        else:
-                            logger.error(f"Failed to copy '{working_file.name}' after {max_retries} attempts due to persistent PermissionError: {pe}")
-                            logger.error(f"Source: {working_file}")
-                            logger.error(f"Target: {saving_file}")
-                            # Optionally log traceback for the last attempt's error
-                            # logger.error(f"Traceback:\n{traceback.format_exc()}")
-                            files_failed.append(str(relative_path)) # Log relative path of failed file
-
-                    except OSError as oe: # Catch other OS-level errors like disk full etc.
-                        logger.error(f"OS error copying '{working_file.name}': {oe}")
-                        logger.error(f"Source: {working_file}")
-                        logger.error(f"Target: {saving_file}")
-                        files_failed.append(str(relative_path))
-                        break # No point retrying most OS errors
-
-                    except Exception as e:
-                        # Catch any other unexpected errors during copy
-                        logger.error(f"Unexpected error copying '{working_file.name}': {e}")
-                        logger.error(f"Source: {working_file}")
-                        logger.error(f"Target: {saving_file}")
-                        logger.error(f"Traceback:\n{traceback.format_exc()}")
-                        files_failed.append(str(relative_path))
-                        break # Exit retry loop on unexpected error
-                # --- End Retry Logic ---
-
-                # If after retries it still failed, it would have been added to files_failed already.
-
-            except ValueError as ve: # Error likely from relative_to if structure is unexpected
-                logger.error(f"Error calculating relative path for {working_file} against {working_root}: {ve}")
-                files_failed.append(str(working_file) + " (path calculation error)")
-            except Exception as path_e:
-                logger.error(f"Error processing file {working_file} (path/directory creation): {path_e}")
-                logger.error(f"Traceback:\n{traceback.format_exc()}")
-                files_failed.append(str(working_file) + " (processing error)")
-
+                        digest = future.result()
+                        newly_saved[relative_path] = current_versions[relative_path]
+                        if digest:
+                            saved_digests[relative_path] = digest
+                    except Exception as copy_error:
+                        logger.error(f"Failed to copy '{relative_path}' \n\tfrom {working_root} \n\tto {saving_root}: {copy_error}")
+                        files_failed.append(relative_path)
+                    if progress_callback and (time.monotonic() - last_report >= 0.5 or files_done == len(dirty_files)):
+                        last_report = time.monotonic()
+                        progress_callback(files_done, len(dirty_files), list(files_failed), files_done == len(dirty_files))
+        record_saved_versions(saving_root, newly_saved, keep_only=set(working_files))
+        if get_annotation_save_mode() == 'snapshot' and saved_digests:
+            # One history snapshot per Save All that saved something: the saved state of every file (see restore_snapshot)
+            history_file = update_head(snapshot_root_for(annotations_dir), saved_digests, keep_only=set(working_files), record_history=True)
+            logger.info(f"Recorded the saved state as snapshot {history_file.stem}")
 
         # --- Final Status Reporting ---
+        files_copied = len(newly_saved)
+        files_unchanged = len(working_files) - len(dirty_files)
         if not files_failed:
-            if files_processed_count == 0:
+            if not working_files:
                 message = 'No CSV files found in the Working_Folder structure to save.'
-                status = True
+            elif not dirty_files:
+                message = f'All {files_unchanged} working CSV file(s) were already saved, nothing changed since.'
             else:
-                message = f'All {files_copied} working CSV file(s) saved successfully!'
-                status = True
+                message = f'All {files_copied} modified working CSV file(s) saved successfully! ({files_unchanged} unchanged)'
+            status = True
         else:
-            message = (f'Save All completed. Successfully saved {files_copied}/{files_processed_count} files. '
+            message = (f'Save All completed. Successfully saved {files_copied}/{len(dirty_files)} modified files. '
                        f'Failed to save {len(files_failed)} file(s): {", ".join(files_failed)} '
                        f'(Check logs for details).')
             status = False # Indicate partial or total failure
@@ -568,107 +691,87 @@ def save_all_annotations_to_csv(annotations_dir: Path) -> tuple[str, bool]:
         logger.error(message)
         return message, status
 
-def refresh_working_file(working_csv_file_path: Path):
+def refresh_working_file(working_csv_file_path: Path, expected_version: int = None):
     """
-    Refreshes the working CSV file by erasing its content while retaining the header row.
+    Refreshes the working CSV file by erasing all its annotations, as one append to its journal.
 
     Parameters:
     - working_csv_file_path (Path): Path to the working CSV file.
 
     Description:
-    - If the file exists, it clears all rows below the header.
+    - If the file exists (or has journaled edits), a 'refresh' record is journaled.
     - If the file does not exist, it logs a message and takes no action.
 
     Returns:
     - None
     """
     try:
-        if working_csv_file_path.exists():
-
-            # Create temporary file for manipulation 
-            temp_file_path = Path(working_csv_file_path).with_suffix('.tmp')
-            with open(temp_file_path, mode='w', newline='') as temp_file:
-                pass  # This ensures the file is truncated (emptied) if it exists
-                
-            with open(working_csv_file_path, mode='r', newline='') as csv_file, open(temp_file_path, mode='w', newline='') as temp_file:
-                reader = csv.reader(csv_file)
-                writer = csv.writer(temp_file)
-
-                # Retain the header row
-                headers = next(reader)  # Read the header row
-                writer.writerow(headers)  # Write the header to the temporary file
-
-                # Write blank rows for all rows below the header
-                for row in reader:
-                    blank_row = [''] * len(headers)  # Create an empty row with the same number of columns
-                    writer.writerow(blank_row)
-
-            # Replace the working CSV file with the temporary file
-            os.replace(temp_file_path, working_csv_file_path)
+        journal = get_annotation_journal(working_csv_file_path)
+        if working_csv_file_path.exists() or journal.journal_path.exists():
+            journal.refresh(expected_version)
             logger.info(f"Working CSV file refreshed: \n\t{working_csv_file_path}\n")
         else:
             logger.info(f"Nothing to reset. The working file does not exist: \n\t{working_csv_file_path}\n")
+    except StaleAnnotationVersion:
+        raise
     except Exception:
         logger.error(f"Error in handle_annotation_to_csv / refresh_working_file: \n\t{traceback.format_exc()}\n")
 
-def undo_last_annotation(working_csv_file_path: Path):
+def undo_last_annotation(working_csv_file_path: Path, expected_version: int = None):
     """
-    Undo the last annotation in the working CSV file.
+    Undo the last edit (add, delete, batch, refresh or redo) of the working CSV file.
 
     Parameters:
     - working_csv_file_path (Path): Path to the working CSV file.
 
     Description:
-    - If the file exists, it finds and clears the last non-empty row.
-    - If no annotations exist, it logs a message and takes no action.
+    - The operation reverting the last edit is journaled (see AnnotationJournal.undo), nothing is blanked.
+    - Without edit history (e.g. after a server restart), it logs a message and takes no action.
 
     Returns:
     - None
     """
     try:
-        if working_csv_file_path.exists():
-            # Create temporary file for manipulation 
-            temp_file_path = Path(working_csv_file_path).with_suffix('.tmp')
-            with open(temp_file_path, mode='w', newline='') as temp_file:
-                pass  # This ensures the file is truncated (emptied) if it exists
-                
-            with open(working_csv_file_path, mode='r', newline='') as csv_file, open(temp_file_path, mode='w', newline='') as temp_file:
-                reader = csv.reader(csv_file)
-                writer = csv.writer(temp_file)
-
-                # Read and write the header row
-                headers = next(reader)
-                writer.writerow(headers)
-
-                # Find the last non-empty row
-                last_non_empty_row_index = None
-                rows = list(reader)  # Read all rows into memory
-                for i, row in enumerate(rows):
-                    if any(row):  # Check if the row is not completely empty
-                        last_non_empty_row_index = i
-
-                # If no non-empty row is found, log and exit
-                if last_non_empty_row_index is None:
-                    logger.info(f"No annotations found in file: {working_csv_file_path}\n")
-                    return
-
-                # Rewrite the rows, clearing the last non-empty row
-                for i, row in enumerate(rows):
-                    if i == last_non_empty_row_index:
-                        row = [''] * len(headers)  # Clear the row
-                    writer.writerow(row)
-
-            # Replace the working csv file with the temporary file
-            os.replace(temp_file_path, working_csv_file_path)
-            logger.info(f"Last annotation undone: \n\t{working_csv_file_path}\n")
+        journal = get_annotation_journal(working_csv_file_path)
+        if working_csv_file_path.exists() or journal.journal_path.exists():
+            if journal.undo(expected_version):
+                logger.info(f"Last annotation undone: \n\t{working_csv_file_path}\n")
+            else:
+                logger.info(f"Nothing to undo (no edit history) in file: {working_csv_file_path}\n")
         else:
             logger.info(f"Nothing to undo. The working file does not exist: \n\t{working_csv_file_path}\n")
+    except StaleAnnotationVersion:
+        raise
     except Exception:
         logger.error(f"Error in undo_last_annotation: \n\t{traceback.format_exc()}\n")
 
+def redo_last_annotation(working_csv_file_path: Path, expected_version: int = None):
+    """
+    Redo the last undone edit of the working CSV file (possible until another edit is made).
+
+    Parameters:
+    - working_csv_file_path (Path): Path to the working CSV file.
+
+    Returns:
+    - None
+    """
+    try:
+        if get_annotation_journal(working_csv_file_path).redo(expected_version):
+            logger.info(f"Last undone edit redone: \n\t{working_csv_file_path}\n")
+        else:
+            logger.info(f"Nothing to redo for: {working_csv_file_path}\n")
+    except StaleAnnotationVersion:
+        raise
+    except Exception:
+        logger.error(f"Error in redo_last_annotation: \n\t{traceback.format_exc()}\n")
+
+# Parsed models file: [(models file key, models directory key), models_info]
+_models_list_cache = [None, {}]
+
 def get_models(): # Working with WebSocket 
     """
     Reads the models file and extracts information about each model.
+    The result is reused until the models file or the models directory changes (model uploaded or deleted).
 
     Returns:
         dict: A dictionary where each key is a model name and the value is its associated information.
@@ -684,6 +787,10 @@ def get_models(): # Working with WebSocket
         if not os.path.exists(models_path):
             logger.error(f"\nModels file not found at {models_path}.\n")
             return {"error": "Models file not found"}
+        models_key = (SeriesCache.make_key(models_path), SeriesCache.make_key(models_dir))
+        cached_key, cached_models = _models_list_cache
+        if cached_key == models_key:
+            return {model_name: dict(model_info) for model_name, model_info in cached_models.items()}
         # Read the CSV file
         with open(models_path, mode='r', newline='') as file:  # No explicit encoding
             reader = csv.DictReader(file)  # Automatically maps headers to values
@@ -706,6 +813,7 @@ def get_models(): # Working with WebSocket
                     logger.warning(f"\nSkipped a row due to missing 'Model Name': {row}\n")
         logger.info(f"\nModels loaded successfully from {models_path}.\n")
         logger.info(f"Here are the info: \n{json.dumps(models_info, indent=4)}\n")
+        _models_list_cache[:] = [models_key, {model_name: dict(model_info) for model_name, model_info in models_info.items()}]
         return models_info
     except Exception as e:
         logger.error(f"Error reading models file at {models_path}: {traceback.format_exc()}")
@@ -959,8 +1067,16 @@ def read_csv_file(file_path: str, preview_rows: int = 5,
         # Construct the full file path
         file_path = return_full_file_path(file_path)
 
-        # Read the CSV file
-        data = pd.read_csv(file_path, parse_dates=['date'], index_col='date')
+        # Date filtered reads only materialize the requested rows when the file has a series store
+        windowed = None
+        if days_towards_end is not None or days_from_start is not None:
+            windowed = load_time_series_window(file_path, days_towards_end, days_from_start, tz_default)
+        if windowed is not None:
+            data, detected_tz = windowed
+            days_towards_end = days_from_start = None  # Already applied
+        else:
+            # Read the CSV file, or reuse the already parsed and time zone localized copy
+            data, detected_tz = load_time_series(file_path, tz_default=tz_default)
         
         if not data.empty:
             # Filter by days towards the end
@@ -984,15 +1100,6 @@ def read_csv_file(file_path: str, preview_rows: int = 5,
                 display(data.tail(preview_rows))
                 logger.info("Task complete!")
                 logger.info(f"len(data) = {len(data)}")
-            
-            # Check if the index has timezone information
-            if data.index.tz is not None:
-                detected_tz = str(data.index.tz)
-                logger.info(f"Detected time zone: {detected_tz} (type: {type(detected_tz)})")
-            else:
-                data = data.tz_localize(tz_default)
-                detected_tz = tz_default
-                logger.info(f"Set time zone: {detected_tz} (type: {type(detected_tz)})")
 
         return data, detected_tz
     except FileNotFoundError:
@@ -1006,6 +1113,270 @@ def read_csv_file(file_path: str, preview_rows: int = 5,
     # Return an empty DataFrame in case of any exception
     return pd.DataFrame(), tz_default
 
+def load_time_series(full_file_path: str, tz_default: str = "UTC") -> tuple[pd.DataFrame, str]:
+    """
+    Loads a whole time-series CSV file with a time zone aware 'date' index, going through the
+    process-wide series cache so repeated redraws of an unchanged file skip the CSV parsing.
+
+    Parameters:
+    - full_file_path (str): Absolute path of the CSV file.
+    - tz_default (str): Time zone applied when the dates carry no time zone information.
+
+    Returns:
+    - tuple[pd.DataFrame, str]: The DataFrame (shared, do not modify in place) and its time zone.
+
+    Raises:
+    - The pandas/OS exceptions of pd.read_csv, handled by the caller (read_csv_file).
+    """
+    cache_key = SeriesCache.make_key(full_file_path)
+    if cache_key is not None:
+        cache_key = cache_key + (tz_default,)
+    cached = series_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Series cache hit for {full_file_path}: {series_cache.stats()}")
+        return cached
+
+    # Prefer the binary series store, it skips the text and datetime parsing entirely
+    data = load_series_store(full_file_path)
+    if data is None and os.path.getsize(full_file_path) >= getattr(settings, 'SERIES_STREAMING_INGEST_MIN_BYTES', 256 * 1024 * 1024):
+        # Large files are converted chunk by chunk first, parsing them in one go could exhaust the memory
+        logger.info(f"Series cache miss for {full_file_path}, ingesting the large CSV file in chunks.")
+        if ingest_series_store(full_file_path):
+            data = load_series_store(full_file_path)
+    if data is None:
+        logger.info(f"Series cache miss for {full_file_path}, parsing the CSV file.")
+        data = pd.read_csv(full_file_path, parse_dates=['date'], index_col='date')
+        if not data.empty:
+            write_series_store(full_file_path, data)  # So the next cold read is fast too
+    if data.empty:
+        return pd.DataFrame(), tz_default
+
+    # Check if the index has timezone information
+    if data.index.tz is not None:
+        detected_tz = str(data.index.tz)
+        logger.info(f"Detected time zone: {detected_tz} (type: {type(detected_tz)})")
+    else:
+        data = data.tz_localize(tz_default)
+        detected_tz = tz_default
+        logger.info(f"Set time zone: {detected_tz} (type: {type(detected_tz)})")
+
+    series_cache.put(cache_key, (data, detected_tz), int(data.memory_usage(deep=True).sum()))
+    return data, detected_tz
+
+def load_time_series_window(full_file_path: str, days_towards_end: int = None, days_from_start: int = None,
+                            tz_default: str = "UTC") -> tuple[pd.DataFrame, str] | None:
+    """
+    Applies read_csv_file's 'days_towards_end'/'days_from_start' filters directly on the memory-mapped
+    series store, with two binary searches on the timestamp vector, so only the selected rows are read.
+
+    Returns:
+    - tuple[pd.DataFrame, str] | None: The filtered data and its time zone, or None when the file has
+                                       no fresh and sorted store (the caller then filters the full DataFrame).
+    """
+    store = open_series_store(full_file_path)
+    if store is None or not store.is_sorted or store.rows == 0:
+        return None
+    timestamps = store.timestamps
+    start_position, end_position = 0, store.rows
+    if days_towards_end is not None:
+        end_cutoff_ns = int(timestamps[-1]) - pd.Timedelta(days=days_towards_end).value
+        start_position = int(np.searchsorted(timestamps, end_cutoff_ns, side='left'))
+        logger.info(f"\nRetrieving data from the past {days_towards_end} days (from {store.to_index(np.array([end_cutoff_ns]))[0].date()} onwards):")
+    if days_from_start is not None and start_position < end_position:
+        start_cutoff_ns = int(timestamps[start_position]) + pd.Timedelta(days=days_from_start).value
+        end_position = int(np.searchsorted(timestamps, start_cutoff_ns, side='right'))
+        logger.info(f"\nRetrieving the first {days_from_start} days from the filtered data (up to {store.to_index(np.array([start_cutoff_ns]))[0].date()}):")
+    data = store.to_dataframe(start_position, end_position)
+    if store.tz is None:
+        data = data.tz_localize(tz_default)
+    return data, str(data.index.tz)
+
+# Uploaded files waiting for their series store: (relative file path, user name), ingested one at a time
+_series_ingest_queue = queue.Queue()
+_series_ingest_thread = None
+_series_ingest_thread_lock = threading.Lock()
+
+def prepare_uploaded_series_file(relative_file_path: str, user_name: str = None):
+    """
+    Runs the post-upload steps of a raw data file: drops its stale cached copies at once, then queues
+    its chunked ingest into the binary series store (bounded memory whatever the file size) for a
+    background thread, so the upload request returns without waiting for the CSV parsing. A file read
+    before its ingest is done waits for it (see ingest_series_store), or is parsed if it is not queued yet.
+
+    Parameters:
+    - relative_file_path (str): Path of the uploaded file relative to MEDIA_ROOT.
+    - user_name (str, optional): User whose ECGConsumer websocket receives the ingest progress
+                                 (shown on the labeling page, if open).
+    """
+    global _series_ingest_thread
+    invalidate_series_cache(relative_file_path)
+    _series_ingest_queue.put((relative_file_path, user_name))
+    with _series_ingest_thread_lock:
+        if _series_ingest_thread is None or not _series_ingest_thread.is_alive():
+            _series_ingest_thread = threading.Thread(target=_run_series_ingests, name='series-ingest', daemon=True)
+            _series_ingest_thread.start()
+
+def _run_series_ingests():
+    while True:
+        relative_file_path, user_name = _series_ingest_queue.get()
+        try:
+            progress_callback = make_ingest_progress_reporter(user_name, relative_file_path) if user_name else None
+            ingest_series_store(return_full_file_path(relative_file_path), progress_callback=progress_callback)
+        except Exception:
+            logger.error(f"Error ingesting the uploaded file {relative_file_path}: \n\t{traceback.format_exc()}\n")
+        finally:
+            _series_ingest_queue.task_done()
+
+def make_ingest_progress_reporter(user_name: str, relative_file_path: str):
+    """
+    Builds the progress callback of ingest_series_store that forwards the progress to the
+    'ecg_analysis_{user_name}' group, where ECGConsumer.ingest_progress relays it to the client.
+
+    Returns:
+    - callable: progress_callback(rows_done, percent, done)
+    """
+    channel_layer = get_channel_layer()
+
+    def report_progress(rows_done: int, percent: float, done: bool):
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f"ecg_analysis_{user_name}",
+                {
+                    "type": "ingest_progress",  # This should match the method in the consumer
+                    "file_path": relative_file_path,
+                    "rows": rows_done,
+                    "percent": percent,
+                    "done": done,
+                }
+            )
+        except Exception:
+            # Progress is informative only, never fail the ingest because of it
+            logger.warning(f"Could not send the ingest progress of {relative_file_path} to {user_name}: \n\t{traceback.format_exc()}\n")
+
+    return report_progress
+
+def open_plot_series_store(relative_file_path: str):
+    """
+    Opens the binary series store of a raw data file for plot_with_plotly (min/max pyramid).
+
+    Parameters:
+    - relative_file_path (str): Path of the file relative to MEDIA_ROOT.
+
+    Returns:
+    - SeriesStore | None: The fresh store of the file, or None (plots then fall back to LTTB).
+    """
+    if not relative_file_path:
+        return None
+    return open_series_store(return_full_file_path(relative_file_path))
+
+def series_data_tz(relative_file_path: str) -> str | None:
+    """
+    Returns:
+    - str | None: Time zone of the data of a file (naive annotation boundaries are wall clock times of it),
+                  None for naive data or a file without a series store.
+    """
+    series_store = open_plot_series_store(relative_file_path)
+    return series_store.tz if series_store is not None else None
+
+def invalidate_series_cache(relative_file_path: str) -> int:
+    """
+    Drops the cached copies of a raw data file, e.g. after an upload wrote it.
+
+    Parameters:
+    - relative_file_path (str): Path of the file relative to MEDIA_ROOT.
+
+    Returns:
+    - int: The number of cache entries removed.
+    """
+    removed = series_cache.invalidate(return_full_file_path(relative_file_path))
+    if removed:
+        logger.info(f"Invalidated {removed} series cache entr{'y' if removed == 1 else 'ies'} for {relative_file_path}")
+    return removed
+
+def get_figure_input_versions(relative_file_path: str) -> tuple[str, str]:
+    """
+    Versions of what a figure of the file is built from: the raw data file and its working annotations.
+    Any write to either changes its version, so they can key (and invalidate) whatever is derived from the figure.
+
+    Parameters:
+    - relative_file_path (str): Path of the file relative to MEDIA_ROOT.
+
+    Returns:
+    - tuple[str, str]: (data_version, annotation_version): 'mtime_ns-size' of the data file ('' if it is missing)
+                       and the version of the working CSV file with its journal.
+    """
+    if not relative_file_path:
+        return '', ''
+    if get_annotation_backend() == 'database':
+        from .annotation_db import annotation_set_version  # See handle_annotation_in_database
+        annotation_version = annotation_set_version(relative_file_path)
+    else:
+        annotation_file_paths = creating_file_paths(relative_file_path)
+        # The working CSV file only changes on compaction, its journal records every edit
+        annotation_version = get_annotation_journal(annotation_file_paths[0]).version() if annotation_file_paths else ''
+    return file_version(return_full_file_path(relative_file_path)), annotation_version
+
+# Interval indexes of the database annotations: relative file path -> (version, time zone, annotations, index)
+_database_annotation_indexes = {}
+
+def get_annotations_with_index(relative_file_path: str, tz: str = None) -> tuple[list[dict], AnnotationIndex]:
+    """
+    The annotations of a file with their interval index (index positions are list positions).
+    With the CSV backend the index lives in the journal view and follows every add, delete and undo;
+    with the database backend it is rebuilt when the annotation set version changes.
+
+    Parameters:
+    - relative_file_path (str): Path of the data file relative to MEDIA_ROOT.
+    - tz (str, optional): Time zone of the data of the file (naive annotation boundaries are wall clock
+                          times of it), None for naive data.
+
+    Returns:
+    - tuple[list[dict], AnnotationIndex]: See retrieve_existing_annotations and home.annotation_index.
+    """
+    if get_annotation_backend() == 'database':
+        from .annotation_db import annotation_set_version, retrieve_annotations  # See handle_annotation_in_database
+        version = annotation_set_version(relative_file_path)
+        cached = _database_annotation_indexes.get(relative_file_path)
+        if cached is None or cached[:2] != (version, tz):
+            annotations = retrieve_annotations(relative_file_path)
+            cached = _database_annotation_indexes[relative_file_path] = (version, tz, annotations, AnnotationIndex.from_annotations(annotations, tz))
+        return cached[2], cached[3]
+    working_csv_file_path, _, _ = creating_file_paths(relative_file_path)
+    return get_annotation_journal(working_csv_file_path).annotations_with_index(tz)
+
+def query_annotations(relative_file_path: str, query: str, start=None, end=None, timestamp=None) -> dict:
+    """
+    Answers the annotation queries of the labeling page from the interval index, in O(log n + k).
+
+    Parameters:
+    - relative_file_path (str): Path of the data file relative to MEDIA_ROOT.
+    - query (str): 'visible' (annotations overlapping [start, end]), 'hit' (annotations under timestamp)
+                   or 'next_gap' (first unlabelled stretch at or after timestamp).
+    - start, end, timestamp: ISO timestamps (naive ones are wall clock times of the data time zone, like the
+                             annotation boundaries; UTC for naive data).
+
+    Returns:
+    - dict: {'Annotations': [...]} for 'visible' and 'hit', {'Gap_Start': iso, 'Gap_End': iso | None} for 'next_gap',
+            {'error': message} for an unknown query.
+    """
+    data_tz = series_data_tz(relative_file_path)
+    # Bounds and boundaries in the same time zone (the index reads naive boundaries in data_tz)
+    annotations, annotation_index = get_annotations_with_index(relative_file_path, data_tz)
+    if query == 'visible':
+        return {'Annotations': [annotations[position] for position in annotation_index.overlapping(start, end, data_tz)]}
+    if query == 'hit':
+        return {'Annotations': [annotations[position] for position in annotation_index.hit(timestamp, data_tz)]}
+    if query == 'next_gap':
+        # Consecutive rows labeled separately (auto labeling) leave one sampling interval between annotations
+        join_ns = 0
+        if series_store is not None and series_store.rows > 1:
+            steps = np.diff(np.asarray(series_store.timestamps[:1000]))
+            join_ns = int(steps[steps > 0].min()) if (steps > 0).any() else 0
+        gap_start, gap_end = annotation_index.next_gap(timestamp, join_ns, data_tz)
+        as_iso = lambda value_ns: None if value_ns is None else pd.Timestamp(value_ns, tz='UTC').tz_convert(data_tz or 'UTC').isoformat()
+        return {'Gap_Start': as_iso(gap_start), 'Gap_End': as_iso(gap_end)}
+    return {'error': f"Unknown annotation query: {query}"}
+
 def return_full_file_path(relative_file_path=None):
     """
     Returns the full file path by combining the base file path with the relative file path.
@@ -1078,6 +1449,42 @@ def calculate_log_returns_all_columns(data: pd.DataFrame, exclude_columns: list
     data = data.fillna(value=fillna_value)
     return data
 
+def validate_feature_array(features: np.ndarray, expected_features: int = None, name: str = 'features') -> np.ndarray:
+    """
+    Checks a (rows, features) model input array at once with numpy: 2-D, optionally the expected
+    number of features, a floating dtype (or only float values in an object array), and finite values.
+
+    Args:
+        features (np.ndarray): The array to validate.
+        expected_features (int, optional): Required number of columns.
+        name (str): Name of the array in the error messages.
+
+    Returns:
+        np.ndarray: The validated array, as a floating dtype array.
+
+    Raises:
+        ValueError: On the first invalid row and column found (in row-major order).
+    """
+    features = np.asarray(features)
+    if features.ndim != 2:
+        raise ValueError(f"Invalid shape for {name}: {features.shape}, expected (rows, features).")
+    if expected_features is not None and features.shape[1] != expected_features:
+        raise ValueError(f"Invalid shape for {name}: {features.shape}, expected {expected_features} feature(s).")
+    if features.dtype == object:
+        # Mixed values: only Python floats and numpy float32/float64 are accepted, as before
+        is_float = np.frompyfunc(lambda value: isinstance(value, (float, np.float32)), 1, 1)(features).astype(bool)
+        if not is_float.all():
+            row, column = np.argwhere(~is_float)[0]
+            raise ValueError(f"Invalid data type in {name} at row {row}, column {column}: {type(features[row, column]).__name__}.")
+        features = features.astype(np.float64)
+    elif not np.issubdtype(features.dtype, np.floating):
+        raise ValueError(f"Invalid data type for {name}: {features.dtype}, expected floating point values.")
+    finite = np.isfinite(features)
+    if not finite.all():
+        row, column = np.argwhere(~finite)[0]
+        raise ValueError(f"Non-finite value in {name} at row {row}, column {column}: {features[row, column]}.")
+    return features
+
 def build_GRU_prediction_model(input_size: int, hidden_size: int, output_size: int, num_layers: int, dropout: float = 0.0) -> nn.Module:
     """
     Creates and initializes a GRU-based classification model.
@@ -1180,66 +1587,80 @@ def detect_time_interval(df: pd.DataFrame) -> pd.Timedelta:
     logger.info(f"Detected Time Interval: {time_interval}")
     return time_interval
 
-def construct_prediction_df(df: pd.DataFrame, predictions: np.ndarray, time_interval: pd.Timedelta) -> pd.DataFrame:
+def run_length_encode(values: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Run-length encodes a 1-D array: the runs of identical consecutive values.
+
+    Parameters:
+    - values (np.ndarray): e.g. the predicted class of each row.
+
+    Returns:
+    - tuple[np.ndarray, np.ndarray, np.ndarray]: First and last positions (both included) and value of each run.
     """
-    Construct a DataFrame with timestamps and predictions.
+    values = np.asarray(values).ravel()
+    if len(values) == 0:
+        empty_positions = np.empty(0, dtype=np.int64)
+        return empty_positions, empty_positions, values
+    run_starts = np.concatenate([[0], np.flatnonzero(np.diff(values)) + 1])
+    run_ends = np.append(run_starts[1:] - 1, len(values) - 1)
+    return run_starts, run_ends, values[run_starts]
+
+def format_timestamps_iso(epoch_ns: np.ndarray, tz: str = None) -> np.ndarray:
     """
-    num_rows = len(predictions)
-    timestamps = pd.date_range(start=df.index[0], periods=num_rows, freq=time_interval)
-    logger.info(f"len(timestamps) = {len(timestamps)}")
-    
-    predictions_df = pd.DataFrame({
-        'date': timestamps,
-        'trend': predictions
-    })
-    return predictions_df
+    Formats epoch ns timestamps like pd.Timestamp.isoformat() in the tz time zone, for a whole array at once.
 
-def build_prediction_ranges(predictions_df: pd.DataFrame, 
+    Returns:
+    - np.ndarray: ISO 8601 strings, e.g. '2024-01-01T09:30:00+01:00' ('.ffffff' or '.fffffffff' when needed).
+    """
+    epoch_ns = np.asarray(epoch_ns, dtype=np.int64)
+    if len(epoch_ns) == 0:
+        return np.empty(0, dtype=str)
+    wall_ns = epoch_ns
+    if tz:
+        # Wall clock time in tz, its UTC offset is the difference
+        wall_ns = pd.DatetimeIndex(epoch_ns.view('datetime64[ns]'), tz='UTC').tz_convert(tz).tz_localize(None).as_unit('ns').asi8
+    fraction_ns = wall_ns % 1_000_000_000
+    iso_strings = np.datetime_as_string((wall_ns - fraction_ns).view('datetime64[ns]'), unit='s')
+    if fraction_ns.any():
+        fractions = np.array(['' if fraction == 0 else f".{fraction // 1000:06d}" if fraction % 1000 == 0 else f".{fraction:09d}"
+                              for fraction in fraction_ns.tolist()])
+        iso_strings = np.char.add(iso_strings, fractions)
+    if tz:
+        # A handful of distinct offsets (standard and daylight saving time): formatted once each
+        unique_offsets, offset_positions = np.unique((wall_ns - epoch_ns) // 60_000_000_000, return_inverse=True)
+        offset_strings = np.array([f"{'-' if offset < 0 else '+'}{abs(offset) // 60:02d}:{abs(offset) % 60:02d}"
+                                   for offset in unique_offsets.tolist()])
+        iso_strings = np.char.add(iso_strings, offset_strings[offset_positions])
+    return iso_strings
+
+def build_prediction_ranges(start_times: np.ndarray, end_times: np.ndarray, trend_values: np.ndarray,
                             trend_descriptions: dict, 
                             trend_colors: dict) -> list:
     """
-    Build a list of continuous prediction ranges from the predictions DataFrame.
+    Build the list of continuous prediction ranges from the runs of identical predictions (see run_length_encode).
 
     Parameters:
-    - predictions_df (pd.DataFrame): A DataFrame containing 'date' and 'trend' columns.
-                                     'date' is the timestamp, and 'trend' represents the prediction values.
+    - start_times, end_times (np.ndarray): ISO timestamps of the first and last row of each range.
+    - trend_values (np.ndarray): The predicted value of each range.
     - trend_descriptions (dict): A dictionary mapping trend values to descriptive labels.
     - trend_colors (dict): A dictionary mapping trend values to corresponding colors.
 
     Returns:
     - list: A list of dictionaries, where each dictionary contains:
         - 'Item Number' (int): Sequential number for the range.
-        - 'Start Timestamp' (datetime): The start timestamp of the continuous range.
-        - 'End Timestamp' (datetime): The end timestamp of the continuous range.
+        - 'Start Index' (str): The start timestamp of the continuous range (ISO format).
+        - 'End Index' (str): The end timestamp of the continuous range (ISO format).
         - 'Label' (str): A descriptive label for the trend.
         - 'Color' (str): A color representing the trend.
     """
-    ranges_list = []
-    current_value = predictions_df['trend'].iloc[0]
-    logger.info(f"current_value type: {type(current_value)}, current_value | predictions_df['trend'].iloc[0]: {current_value}")
-    start_index = 0
-    for i in range(1, len(predictions_df)):
-        # logger.info(f"predictions_df['trend'].iloc[i] type: {type(predictions_df['trend'].iloc[i])}, predictions_df['trend'].iloc[i]: {predictions_df['trend'].iloc[i]}")
-        if predictions_df['trend'].iloc[i] != current_value:
-            # End of the current range, save the range info
-            ranges_list.append({
-                'Item Number': len(ranges_list) + 1,
-                'Start Index': predictions_df['date'].iloc[start_index].isoformat(),  # Convert to ISO format
-                'End Index': predictions_df['date'].iloc[i - 1].isoformat(),          # Convert to ISO format
-                'Label': trend_descriptions[int(current_value)],  # Cast to int
-                'Color': trend_colors[int(current_value)]         # Cast to int
-            })
-            # Update start_index and current_value
-            start_index = i
-            current_value = predictions_df['trend'].iloc[i]
-    # Add the last range
-    ranges_list.append({
-        'Item Number': len(ranges_list) + 1,
-        'Start Index': predictions_df['date'].iloc[start_index].isoformat(),  # Convert to ISO format
-        'End Index': predictions_df['date'].iloc[-1].isoformat(),             # Convert to ISO format
-        'Label': trend_descriptions[int(current_value)],  # Cast to int
-        'Color': trend_colors[int(current_value)]         # Cast to int
-    })
+    ranges_list = [{
+        'Item Number': item_number,
+        'Start Index': start_time,
+        'End Index': end_time,
+        'Label': trend_descriptions[trend_value],
+        'Color': trend_colors[trend_value]
+    } for item_number, start_time, end_time, trend_value in zip(range(1, len(trend_values) + 1), start_times.tolist(),
+                                                                 end_times.tolist(), trend_values.astype(int).tolist())]
     logger.info(f"len(ranges_list) = {len(ranges_list)}")
     return ranges_list
 
@@ -1263,8 +1684,9 @@ def process_predictions(data: pd.DataFrame,
 
     This function performs the following steps:
     1. Detects the time interval of the input DataFrame's index.
-    2. Constructs a new DataFrame combining the input timestamps with predictions.
-    3. Groups continuous ranges of identical predictions and maps them to descriptive labels and colors.
+    2. Finds the continuous ranges of identical predictions (numpy run-length encoding).
+    3. Formats the timestamps of the range boundaries (first timestamp + position * interval) at once,
+       and maps the ranges to descriptive labels and colors.
     4. Optionally prints the results.
 
     Parameters:
@@ -1277,8 +1699,8 @@ def process_predictions(data: pd.DataFrame,
     Returns:
     - list: A list of dictionaries, where each dictionary represents a continuous trend range and includes:
         - 'Item Number' (int): A sequential number for the trend range.
-        - 'Start Timestamp' (datetime): The starting timestamp of the trend range.
-        - 'End Timestamp' (datetime): The ending timestamp of the trend range.
+        - 'Start Index' (str): The starting timestamp of the trend range (ISO format).
+        - 'End Index' (str): The ending timestamp of the trend range (ISO format).
         - 'Label' (str): A descriptive label for the trend.
         - 'Color' (str): A color representing the trend.
     """
@@ -1286,11 +1708,16 @@ def process_predictions(data: pd.DataFrame,
     # Step 1: Detect time interval
     time_interval = detect_time_interval(df=data)
     
-    # Step 2: Construct prediction DataFrame
-    predictions_df = construct_prediction_df(df=data, predictions=predictions, time_interval=time_interval)
+    # Step 2: Continuous ranges of identical predictions, as row positions
+    range_starts, range_ends, trend_values = run_length_encode(predictions)
     
-    # Step 3: Build prediction ranges
-    ranges_list = build_prediction_ranges(predictions_df=predictions_df, trend_descriptions=trend_descriptions, trend_colors=trend_colors)
+    # Step 3: Format only the range boundaries, then build prediction ranges
+    first_ns = data.index[:1].as_unit('ns').asi8[0]
+    interval_ns = pd.Timedelta(time_interval).value
+    data_tz = str(data.index.tz) if data.index.tz is not None else None
+    start_times = format_timestamps_iso(first_ns + range_starts * interval_ns, data_tz)
+    end_times = format_timestamps_iso(first_ns + range_ends * interval_ns, data_tz)
+    ranges_list = build_prediction_ranges(start_times, end_times, trend_values, trend_descriptions=trend_descriptions, trend_colors=trend_colors)
     
     if printing:
         # Step 4: Print the ranges
@@ -1298,30 +1725,142 @@ def process_predictions(data: pd.DataFrame,
 
     return ranges_list
 
+PREDICTION_HIDDEN_SIZE = 64
+PREDICTION_OUTPUT_SIZE = 5
+
+def load_prediction_model(selected_model: str, model_path: str, input_size: int = None, device=None) -> nn.Module:
+    """
+    Builds the network of an auto labeling model and loads its checkpoint.
+
+    Parameters:
+    - selected_model (str): Model name, which selects the architecture.
+    - model_path (str): Full path of the .pth checkpoint.
+    - input_size (int, optional): Number of input features, read from the checkpoint when not given.
+    - device (torch.device, optional): Defaults to CUDA when available.
+
+    Returns:
+    - nn.Module: The model on its device, in evaluation mode.
+    """
+    device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    # Load model checkpoint
+    checkpoint = torch.load(model_path, map_location=device, weights_only=True)
+    if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
+        logger.info("Loading model from dictionary checkpoint.")
+        state_dict = checkpoint['model_state_dict']
+    else:
+        logger.info("Loading model directly from state dict.")
+        state_dict = checkpoint
+    if input_size is None:
+        input_size = state_dict['gru.weight_ih_l0'].shape[1]  # (3 * hidden_size, input_size)
+    hidden_size = PREDICTION_HIDDEN_SIZE
+    output_size = PREDICTION_OUTPUT_SIZE
+    dropout=0.0
+
+    # Initialize the model
+    if re.search(r'\b(GRU\s+model|model\s+GRU)\b', selected_model, re.IGNORECASE):
+        num_layers = 2
+        logger.info(f"Model parameters: input_size={input_size}, hidden_size={hidden_size}, output_size={output_size}, num_layers={num_layers}, dropout={dropout}")
+        prediction_model = build_GRU_prediction_model(input_size=input_size, hidden_size=hidden_size, output_size=output_size, num_layers=num_layers, dropout=dropout)
+    else:
+        # num_layers = 4
+        # logger.info(f"Model parameters: input_size={input_size}, hidden_size={hidden_size}, output_size={output_size}, num_layers={num_layers}, dropout={dropout}")
+        # prediction_model = build_BiGRUWithAttention_model(input_size=input_size, hidden_size=hidden_size, output_size=output_size, num_layers=num_layers, dropout=dropout)
+        num_layers = 2
+        logger.info(f"Model parameters: input_size={input_size}, hidden_size={hidden_size}, output_size={output_size}, num_layers={num_layers}, dropout={dropout}")
+        prediction_model = build_GRU_prediction_model(input_size=input_size, hidden_size=hidden_size, output_size=output_size, num_layers=num_layers, dropout=dropout)
+    prediction_model.load_state_dict(state_dict)
+
+    prediction_model.to(device)
+    prediction_model.eval() # Set model to evaluation mode
+    return prediction_model
+
+def prewarm_model_registry() -> int:
+    """
+    Loads the models listed in _Models_List.csv into the model registry (with the input size of their
+    checkpoint), in listed order, until its memory budget is used. Meant to run once at startup.
+
+    Returns:
+    - int: The number of models loaded.
+    """
+    models_info = get_models()
+    if 'error' in models_info:
+        return 0
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    loaded_count = 0
+    for model_name, model_info in models_info.items():
+        if not model_registry.has_room():
+            logger.info(f"Model registry full, {len(models_info) - loaded_count} model(s) will be loaded on first use.")
+            break
+        try:
+            prediction_model = load_prediction_model(model_name, model_info['Model File'], device=device)
+            input_size = prediction_model.gru.input_size
+            if model_registry.put(model_registry.make_key(model_info['Model File'], input_size), prediction_model):
+                loaded_count += 1
+        except Exception:
+            logger.warning(f"Could not prewarm the model '{model_name}': \n{traceback.format_exc()}")
+    logger.info(f"Prewarmed {loaded_count} auto labeling model(s): {model_registry.stats()}")
+    return loaded_count
+
 # Funtion for auto labeling
-def run_auto_labeling_of_annotations(relative_file_path: str, working_csv_file_path: str, selected_model: str, labels_list: list[dict]):# -> list[dict]:
+def run_auto_labeling_of_annotations(relative_file_path: str, working_csv_file_path: str, selected_model: str, labels_list: list[dict]) -> list[dict]:
+    """
+        Automates the labeling process: predicts the annotations of a file (see predict_auto_labels),
+        then replaces its existing annotations with them (see store_auto_labels).
+
+        Args:
+            relative_file_path (str): Path to the source CSV file containing input data.
+            working_csv_file_path (str): Path to the working CSV file where predictions and annotations will be saved
+                                         (unused with ANNOTATION_BACKEND = 'database').
+            selected_model (str): Name of the model to be used for generating predictions.
+            labels_list (list[dict]): The label definitions, see predict_auto_labels.
+
+        Returns:
+            list[dict]: The prediction ranges written, see predict_auto_labels (empty if the file could not be labeled).
     """
-        Automates the labeling process by retrieving and preprocessing data, applying a pre-trained model, 
-        and generating predictions with trend analysis.
+    start_time = time.perf_counter()
+    ranges_list = predict_auto_labels(relative_file_path, selected_model, labels_list)
+    if ranges_list:
+        store_auto_labels(relative_file_path, working_csv_file_path, ranges_list)
+
+    end_time = time.perf_counter()
+    inference_time_ms = (end_time - start_time) * 1000 # Calculate inference speed
+    logger.info(f"\n\nInference time for auto labeling with selected_model '{selected_model}': {inference_time_ms:.2f} ms\n\n")
+    return ranges_list
+
+def store_auto_labels(relative_file_path: str, working_csv_file_path: str, ranges_list: list[dict]):
+    """
+        Replaces every existing annotation of a file with predicted ranges: one direct write of the working CSV file
+        (the journal is dropped), or one transaction with bulk inserts in the database.
+    """
+    if get_annotation_backend() == 'database':
+        from .annotation_db import replace_annotations  # See handle_annotation_in_database
+        replace_annotations(relative_file_path, ranges_list, series_data_tz(relative_file_path))
+    else:
+        logger.info(f"Writing the predictions to the working CSV file {working_csv_file_path}")
+        get_annotation_journal(working_csv_file_path).replace(ranges_list)
+
+def predict_auto_labels(relative_file_path: str, selected_model: str, labels_list: list[dict]) -> list[dict]:
+    """
+        Retrieves and preprocesses the data of a file, applies a pre-trained model, and generates predictions
+        with trend analysis. Nothing is written (see store_auto_labels).
 
         Args:
             relative_file_path (str): Path to the source CSV file containing input data.
-            working_csv_file_path (str): Path to the working CSV file where predictions and annotations will be saved.
             selected_model (str): Name of the model to be used for generating predictions.
             labels_list (list[dict]): A list of dictionaries representing label definitions. Each dictionary should include:
                 - 'label' (int): Numeric identifier for the label.
                 - 'value' (str): Description or value of the label.
                 - 'Color' (str): Color associated with the label.
 
-        # Returns:
-        #     list[dict]: A list of dictionaries where each dictionary represents a continuous prediction range with:
-        #         - 'Item Number' (int): Sequential number for the range.
-        #         - 'Start Index' (datetime): The start timestamp of the continuous range.
-        #         - 'End Index' (datetime): The end timestamp of the continuous range.
-        #         - 'Label' (str): A descriptive label for the trend.
-        #         - 'Color' (str): A color representing the trend.
+        Returns:
+            list[dict]: A list of dictionaries where each dictionary represents a continuous prediction range with
+                        (empty if the file could not be labeled):
+                - 'Item Number' (int): Sequential number for the range.
+                - 'Start Index' (datetime): The start timestamp of the continuous range.
+                - 'End Index' (datetime): The end timestamp of the continuous range.
+                - 'Label' (str): A descriptive label for the trend.
+                - 'Color' (str): A color representing the trend.
     """
-    start_time = time.perf_counter()
     # Retrieve the data
     logger.info(f"\nLoading data from file: {relative_file_path}")
     data, _ = read_csv_file(file_path=relative_file_path, preview_rows=0)
@@ -1350,11 +1889,11 @@ def run_auto_labeling_of_annotations(relative_file_path: str, working_csv_file_p
 
     # Validate data
     logger.info("Validating data format in NumPy array.")
-    for ind, feature_set in enumerate(processed_data):
-        for feature_idx, feature in enumerate(feature_set):
-            if not isinstance(feature, (float, np.float32)):
-                logger.error(f"Unexpected type in log_data_np at row {ind}, column {feature_idx}: {type(feature)}")
-                raise ValueError("Invalid data type detected in log_data_np.")
+    try:
+        processed_data = validate_feature_array(processed_data, expected_features=data.shape[1], name='log_data_np')
+    except ValueError:
+        logger.error(f"Invalid auto labeling input: {traceback.format_exc()}")
+        raise
 
     # Load the model
     logger.info(f"Loading models and retrieving path for selected model: {selected_model}")
@@ -1372,38 +1911,14 @@ def run_auto_labeling_of_annotations(relative_file_path: str, working_csv_file_p
     # Define model parameters
     Number_features = data.shape[1] # data same as the log processed data in here.
     input_size = Number_features
-    hidden_size = 64
-    output_size = 5
-    dropout=0.0
+    output_size = PREDICTION_OUTPUT_SIZE
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     logger.info(f"Using device: {device}")
 
-    # Initialize the model
-    if re.search(r'\b(GRU\s+model|model\s+GRU)\b', selected_model, re.IGNORECASE):
-        num_layers = 2
-        logger.info(f"Model parameters: input_size={input_size}, hidden_size={hidden_size}, output_size={output_size}, num_layers={num_layers}, dropout={dropout}")
-        prediction_model = build_GRU_prediction_model(input_size=input_size, hidden_size=hidden_size, output_size=output_size, num_layers=num_layers, dropout=dropout)
-    else:
-        # num_layers = 4
-        # logger.info(f"Model parameters: input_size={input_size}, hidden_size={hidden_size}, output_size={output_size}, num_layers={num_layers}, dropout={dropout}")
-        # prediction_model = build_BiGRUWithAttention_model(input_size=input_size, hidden_size=hidden_size, output_size=output_size, num_layers=num_layers, dropout=dropout)
-        num_layers = 2
-        logger.info(f"Model parameters: input_size={input_size}, hidden_size={hidden_size}, output_size={output_size}, num_layers={num_layers}, dropout={dropout}")
-        prediction_model = build_GRU_prediction_model(input_size=input_size, hidden_size=hidden_size, output_size=output_size, num_layers=num_layers, dropout=dropout)
-
-    # Load model checkpoint
-    checkpoint = torch.load(model_path, map_location=device, weights_only=True)
-    if isinstance(checkpoint, dict) and 'model_state_dict' in checkpoint:
-        logger.info("Loading model from dictionary checkpoint.")
-        prediction_model.load_state_dict(checkpoint['model_state_dict'])
-    else:
-        logger.info("Loading model directly from state dict.")
-        prediction_model.load_state_dict(checkpoint)
-
-    prediction_model.to(device)
-    prediction_model.eval() # Set model to evaluation mode
-
-    logger.info(f"prediction_model: \n{prediction_model}")
+    # Built and loaded on the first use only, then kept resident (see home.model_registry)
+    prediction_model = model_registry.get_or_load(model_path, input_size,
+                                                  lambda: load_prediction_model(selected_model, model_path, input_size, device))
+    logger.info(f"prediction_model: \n{prediction_model}\nModel registry: {model_registry.stats()}")
 
     # Prepare data tensor
     processed_data = torch.tensor(processed_data, dtype=torch.float32).to(device).unsqueeze(1)
@@ -1435,21 +1950,407 @@ def run_auto_labeling_of_annotations(relative_file_path: str, working_csv_file_p
                                       trend_colors=trend_colors,
                                       printing=False)
     logger.info(f"Obtained {len(ranges_list)} predictions with our selected {selected_model}.")
+    return ranges_list
 
-    if working_csv_file_path.exists():
-        logger.info(f"Deleting the existing CSV file at {working_csv_file_path}")
-        os.remove(working_csv_file_path)
-    
-    logger.info(f"Adding predictions to the emptied working CSV file...")
-    add_annotation_to_csv(working_csv_file_path, ranges_list)
+def list_data_files(relative_folder: str) -> list[str]:
+    """
+    Lists the CSV data files of a folder under 'Raw_Time_Series_Data' and its subfolders.
 
-    end_time = time.perf_counter()
-    inference_time_ms = (end_time - start_time) * 1000 # Calculate inference speed
-    logger.info(f"\n\nInference time for auto labeling with selected_model '{selected_model}': {inference_time_ms:.2f} ms\n\n")
-    # return ranges_list
+    Parameters:
+    - relative_folder (str): Folder path relative to MEDIA_ROOT, e.g. 'Raw_Time_Series_Data/SubFolder'.
+
+    Returns:
+    - list[str]: The data file paths relative to MEDIA_ROOT (with forward slashes), sorted.
+
+    Raises:
+    - ValueError: If the folder is not a directory inside MEDIA_ROOT/Raw_Time_Series_Data.
+    """
+    media_root = Path(settings.MEDIA_ROOT).resolve()
+    folder = (media_root / convert_path(relative_folder)).resolve()
+    if not folder.is_relative_to(media_root / 'Raw_Time_Series_Data') or not folder.is_dir():
+        raise ValueError(f"Not a folder of Raw_Time_Series_Data: {relative_folder}")
+    data_files = []
+    for root, _, files in os.walk(folder):
+        data_files.extend(Path(root, filename).relative_to(media_root).as_posix()
+                          for filename in files if filename.lower().endswith('.csv'))
+    return sorted(data_files)
+
+def _init_auto_label_worker(selected_model: str, torch_threads: int):
+    """
+    Initializer of the auto labeling worker processes: sets Django up (the database backend needs the ORM),
+    splits the CPU threads between the workers and loads the model once into the registry of the worker.
+    """
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'label_V04.settings')
+    django.setup()
+    torch.set_num_threads(torch_threads)
+    model_info = get_models().get(selected_model)
+    if not model_info:
+        return
+    try:
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        prediction_model = load_prediction_model(selected_model, model_info['Model File'], device=device)
+        model_registry.put(model_registry.make_key(model_info['Model File'], prediction_model.gru.input_size), prediction_model)
+    except Exception:
+        # Loaded on the first file instead (run_auto_labeling_of_annotations logs the error if it still fails)
+        logger.warning(f"Could not load the model '{selected_model}' in auto labeling worker {os.getpid()}: \n{traceback.format_exc()}")
+
+def _auto_label_file(relative_file_path: str, selected_model: str, labels_list: list[dict]) -> int:
+    # Runs in an auto labeling worker process (see run_auto_labeling_batch)
+    working_csv_file_path = None if get_annotation_backend() == 'database' else creating_file_paths(relative_file_path)[0]
+    ranges_list = run_auto_labeling_of_annotations(relative_file_path=relative_file_path,
+                                                   working_csv_file_path=working_csv_file_path,
+                                                   selected_model=selected_model,
+                                                   labels_list=labels_list)
+    if not ranges_list:
+        raise RuntimeError(f"No predictions for {relative_file_path} (see the worker logs)")
+    return len(ranges_list)
+
+def run_auto_labeling_batch(relative_folder: str, selected_model: str, labels_list: list[dict],
+                            max_workers: int = None, progress_callback=None) -> dict:
+    """
+    Auto labels every CSV data file of a folder under 'Raw_Time_Series_Data' (subfolders included) with one model,
+    in a pool of AUTO_LABEL_WORKERS processes. Each worker loads the model once and keeps it for all its files,
+    and at most two files per worker are queued at a time. As with one file, the predictions replace the
+    annotations of each file (its 'Working_Folder' CSV file, or its annotation set in the database).
+
+    Parameters:
+    - relative_folder (str): Folder path relative to MEDIA_ROOT, e.g. 'Raw_Time_Series_Data/SubFolder'.
+    - selected_model (str): Name of the model, as listed by get_models.
+    - labels_list (list[dict]): The label definitions ('label', 'value' and 'Color'), see run_auto_labeling_of_annotations.
+    - max_workers (int, optional): Number of worker processes, defaults to AUTO_LABEL_WORKERS.
+    - progress_callback (callable, optional): progress_callback(files_done, files_to_label, failed_files, done),
+                                              called from this thread as the files complete.
+
+    Returns:
+    - dict: 'Files_labeled', 'Files_to_label', 'Failed_files', 'Ranges' (number of predicted ranges written),
+            'Success' and 'Message'.
+    """
+    summary = {'Files_labeled': 0, 'Files_to_label': 0, 'Failed_files': [], 'Ranges': 0, 'Success': False}
+    try:
+        data_files = list_data_files(relative_folder)
+    except ValueError as folder_error:
+        logger.error(str(folder_error))
+        return {**summary, 'Message': str(folder_error)}
+    if selected_model not in get_models():
+        message = f"Selected model '{selected_model}' not found in available models."
+        logger.error(message)
+        return {**summary, 'Message': message}
+    summary['Files_to_label'] = len(data_files)
+    if not data_files:
+        message = f"No CSV data files found in {relative_folder}."
+        logger.info(message)
+        if progress_callback:
+            progress_callback(0, 0, [], True)
+        return {**summary, 'Success': True, 'Message': message}
+
+    workers = max(1, min(max_workers or getattr(settings, 'AUTO_LABEL_WORKERS', 4), len(data_files)))
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"Auto labeling {len(data_files)} file(s) of {relative_folder} with '{selected_model}' in {workers} worker process(es).")
+    start_time = time.perf_counter()
+    try:
+        pending_files = iter(data_files)
+        running, files_done, last_report = {}, 0, 0.0
+        # 'spawn': the workers must not inherit the threads, locks and event loop of the server process
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_auto_label_worker, initargs=(selected_model, torch_threads)) as executor:
+            while True:
+                # Bounded queue: a 5,000 file folder is not submitted (and pickled) all at once
+                for relative_file_path in pending_files:
+                    running[executor.submit(_auto_label_file, relative_file_path, selected_model, labels_list)] = relative_file_path
+                    if len(running) >= 2 * workers:
+                        break
+                if not running:
+                    break
+                completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    relative_file_path = running.pop(future)
+                    files_done += 1
+                    try:
+                        summary['Ranges'] += future.result()
+                        summary['Files_labeled'] += 1
+                    except Exception as labeling_error:
+                        logger.error(f"Failed to auto label '{relative_file_path}': {labeling_error}")
+                        summary['Failed_files'].append(relative_file_path)
+                if progress_callback and (time.monotonic() - last_report >= 0.5 or files_done == len(data_files)):
+                    last_report = time.monotonic()
+                    progress_callback(files_done, len(data_files), list(summary['Failed_files']), files_done == len(data_files))
+    except Exception:
+        # A worker that cannot start (or dies) breaks the whole pool
+        message = f"Critical error during batch auto labeling of {relative_folder}: \n\t{traceback.format_exc()}"
+        logger.error(message)
+        return {**summary, 'Message': message}
+
+    elapsed_time = time.perf_counter() - start_time
+    if summary['Failed_files']:
+        message = (f"Auto labeled {summary['Files_labeled']}/{len(data_files)} file(s) of {relative_folder} with '{selected_model}'. "
+                   f"Failed to label {len(summary['Failed_files'])} file(s) (Check logs for details).")
+    else:
+        message = f"All {len(data_files)} file(s) of {relative_folder} auto labeled with '{selected_model}' in {elapsed_time:.1f} s."
+    logger.info(message)
+    return {**summary, 'Success': not summary['Failed_files'], 'Message': message}
 ############################
 
 # Function to plot pd.DataFrame data using Plotly
+def lttb_downsample(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling: keeps the first and last points, and from each of the
+    n_out - 2 buckets in between the point forming the largest triangle with the point kept in the
+    previous bucket and the mean of the next bucket. Unlike plain striding it preserves peaks and troughs.
+
+    Parameters:
+    - x (np.ndarray): Increasing x values (e.g. epoch ns as float).
+    - y (np.ndarray): y values, NaN allowed (NaN points are never preferred).
+    - n_out (int): Number of points to keep.
+
+    Returns:
+    - np.ndarray: Sorted int64 positions of the kept points (all positions if len(x) <= n_out).
+    """
+    n = len(x)
+    if n <= n_out:
+        return np.arange(n, dtype=np.int64)
+    if n_out < 3:
+        return np.array([0, n - 1], dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket edges over the points between the first and the last ones
+    edges = np.linspace(1, n - 1, num=n_out - 1).astype(np.int64)
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0  # Last kept point with a value: the point kept in an all-NaN bucket can't anchor a triangle
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        previous_y = y[previous]
+        next_y = np.nanmean(y[next_start:next_end]) if not np.all(np.isnan(y[next_start:next_end])) else previous_y
+        if np.isnan(previous_y):
+            previous_y = next_y  # Leading NaN run
+        # Twice the triangle area, the constant factor doesn't change the argmax
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - previous_y)
+                       - (x[previous] - x[start:end]) * (next_y - previous_y))
+        kept[bucket + 1] = start + int(np.argmax(np.nan_to_num(areas, nan=-1.0)))
+        if not np.isnan(y[kept[bucket + 1]]):
+            previous = kept[bucket + 1]
+    return kept
+
+def select_plot_positions(index_ns: np.ndarray, values: np.ndarray, max_points: int, window: tuple[int, int] = None,
+                          series_store=None, column: str = 'close') -> np.ndarray:
+    """
+    Chooses the rows sent to the browser for the base trace: the visible window at full resolution when it
+    fits in max_points (downsampled to max_points otherwise), plus a coarse context of the rows on each
+    side of the window so panning doesn't show an empty plot. At most about 1.5 * max_points rows.
+    The downsampling reads the precomputed min/max pyramid of the series store when there is one,
+    and falls back to LTTB on the rows otherwise.
+
+    Parameters:
+    - index_ns (np.ndarray): Sorted int64 epoch ns timestamps.
+    - values (np.ndarray): Values of the plotted column.
+    - max_points (int): Point budget of the visible window.
+    - window (tuple[int, int], optional): [start, end) row positions of the visible window, None for all rows.
+    - series_store (SeriesStore, optional): Store of the same rows, providing the min/max pyramid.
+    - column (str): Name of the plotted column in the store.
+
+    Returns:
+    - np.ndarray: Sorted int64 row positions.
+    """
+    n = len(index_ns)
+    start, end = window if window is not None else (0, n)
+    # Float x relative to the window start keeps sub-second precision on large epoch values
+    origin = index_ns[start] if start < n else 0
+    def downsample(first: int, last: int, budget: int) -> np.ndarray:
+        if last <= first:
+            return np.empty(0, dtype=np.int64)
+        if series_store is not None:
+            positions = series_store.envelope_positions(column, first, last, budget)
+            if positions is not None:
+                return positions
+        return first + lttb_downsample((index_ns[first:last] - origin).astype(np.float64), values[first:last], budget)
+    context_budget = max(max_points // 4, 3)
+    return np.concatenate([downsample(0, start, context_budget),
+                           downsample(start, end, max_points),
+                           downsample(end, n, context_budget)])
+
+# Trace layout of the figures built by plot_with_plotly, relied upon by the partial (Patch) updates of update_graph
+PLOT_BASE_TRACE = 0  # Base waveform
+PLOT_HIGHLIGHT_TRACE = 1  # Clicked 'New Segment', empty when nothing is selected
+PLOT_FIRST_SEGMENT_TRACE = 2  # Annotation traces, in fig.layout.meta['trace_labels'] order
+PLOT_HIGHLIGHT_COLOR = 'yellow'  # Color for new segments (via click_data), before 'green'
+PLOT_ANNOTATED_WIDTH = 4  # Line width of annotated and highlighted segments
+
+def compute_plot_rows(data: pd.DataFrame, max_points: int = None, x_range: list = None, series_store=None) -> dict:
+    """
+    Selects the rows of a figure's base trace (see select_plot_positions). Deterministic, so the traces
+    patched into an existing figure line up with the ones it was built with.
+
+    Parameters:
+    - data (pd.DataFrame): Plotted data, with a sorted 'date' index and a 'close' column.
+    - max_points (int): Point budget of the visible window. Defaults to settings.PLOT_MAX_POINTS.
+    - x_range (list): [start, end] of the zoomed window, None for the whole series.
+    - series_store (SeriesStore): Store of the same rows, for its min/max pyramid. Ignored if its rows don't match.
+
+    Returns:
+    - dict: 'index_ns' (epoch ns of the index), 'data_tz' (time zone or None) and 'positions' (plotted rows).
+    """
+    # Sorted epoch ns view of the index, segments are located with binary searches on it
+    index_ns = data.index.as_unit('ns').asi8
+    data_tz = str(data.index.tz) if data.index.tz is not None else None
+    if max_points is None:
+        max_points = getattr(settings, 'PLOT_MAX_POINTS', 5000)
+    window = time_slice_positions(index_ns, x_range[0], x_range[1], data_tz) if x_range else None
+    if series_store is not None and series_store.rows != len(data):
+        logger.info(f"Ignoring the series store {series_store.store_dir}: {series_store.rows} rows, {len(data)} plotted.")
+        series_store = None
+    positions = select_plot_positions(index_ns, data['close'].to_numpy(dtype=np.float64), max_points, window, series_store)
+    logger.info(f"Plotting {len(positions)} of {len(data)} rows (window: {window}, max_points: {max_points})")
+    return {'index_ns': index_ns, 'data_tz': data_tz, 'positions': positions}
+
+def annotation_row_bounds(plot_rows: dict, items: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Row positions of annotations in the plotted data. Their ISO boundaries are converted to epoch ns in one
+    vectorized parse (naive ones in the data time zone), then located with binary searches on the index:
+    the segments are only handled as integers afterwards.
+
+    Returns:
+    - tuple[np.ndarray, np.ndarray]: Start (inclusive) and end (exclusive) row positions of each item,
+                                     an empty range for boundaries that are not timestamps.
+    """
+    starts_ns = boundaries_to_epoch_ns([item['Start Index'] for item in items], plot_rows['data_tz'])
+    ends_ns = boundaries_to_epoch_ns([item['End Index'] for item in items], plot_rows['data_tz'])
+    start_positions = np.searchsorted(plot_rows['index_ns'], starts_ns, side='left')
+    end_positions = np.searchsorted(plot_rows['index_ns'], ends_ns, side='right')
+    end_positions[(starts_ns == NAT_NS) | (ends_ns == NAT_NS)] = 0
+    return start_positions, np.maximum(start_positions, end_positions)
+
+def segment_plot_rows(plot_rows: dict, start_time, end_time) -> np.ndarray:
+    """
+    Rows drawn for a segment: the base trace rows within [start_time, end_time], plus its exact first and last rows.
+    """
+    start_position, end_position = time_slice_positions(plot_rows['index_ns'], start_time, end_time, plot_rows['data_tz'])
+    return segment_rows_between(plot_rows, start_position, end_position)
+
+def segment_rows_between(plot_rows: dict, start_position: int, end_position: int) -> np.ndarray:
+    """
+    Rows drawn for the [start_position, end_position) rows of a segment (see annotation_row_bounds).
+    """
+    if end_position <= start_position:
+        return np.empty(0, dtype=np.int64)
+    positions = plot_rows['positions']
+    inside = positions[np.searchsorted(positions, start_position):np.searchsorted(positions, end_position)]
+    # inside is sorted within [start_position, end_position): only the exact ends may be missing
+    head = [start_position] if len(inside) == 0 or inside[0] != start_position else []
+    tail = [end_position - 1] if end_position - 1 != (inside[-1] if len(inside) else start_position) else []
+    return np.concatenate([head, inside, tail]).astype(np.int64)
+
+def resolve_render_mode(render_mode: str, plotted_points: int) -> str:
+    """Resolves 'auto' (or None, i.e. settings.PLOT_RENDER_MODE) to 'svg' or 'webgl' for a base trace size."""
+    if render_mode is None:
+        render_mode = getattr(settings, 'PLOT_RENDER_MODE', 'auto')
+    if render_mode == 'auto':
+        render_mode = 'webgl' if plotted_points > getattr(settings, 'PLOT_WEBGL_THRESHOLD', 4000) else 'svg'
+    return render_mode
+
+def resolve_segment_mode(segment_mode: str, item_count: int) -> str:
+    """Resolves 'auto' (or None, i.e. settings.PLOT_SEGMENT_MODE) to 'per_item' or 'merged' for a number of annotations."""
+    if segment_mode is None:
+        segment_mode = getattr(settings, 'PLOT_SEGMENT_MODE', 'auto')
+    if segment_mode == 'auto':
+        segment_mode = 'merged' if item_count >= getattr(settings, 'PLOT_MERGE_SEGMENTS_MIN_ITEMS', 50) else 'per_item'
+    return segment_mode
+
+def label_display_status(labels_pipe_value: list[dict], label_name: str) -> bool:
+    """Display status of a label in the Labels_Pipe value (hidden when the label is unknown)."""
+    for label_data in labels_pipe_value or []:
+        if label_data['value'] == label_name:
+            # Retrieve the display status (default to False if 'display' key is missing)
+            return label_data.get('display', 0) == 1
+    return False
+
+def highlight_trace(data: pd.DataFrame, plot_rows: dict, click_data: list = None, render_mode: str = 'svg'):
+    """
+    Builds the 'New Segment' trace of the [x1, x2] click selection, empty (and out of the legend) without selection.
+    """
+    scatter_trace = go.Scattergl if render_mode == 'webgl' else go.Scatter
+    if click_data:
+        # Ordered as instants, not as strings
+        segment = data.iloc[segment_plot_rows(plot_rows, *sorted(to_epoch_ns(click, plot_rows['data_tz']) for click in click_data))]
+    else:
+        segment = data.iloc[0:0]
+    return scatter_trace(
+        x=segment.index,
+        y=segment['close'],
+        line=dict(color=PLOT_HIGHLIGHT_COLOR, width=PLOT_ANNOTATED_WIDTH),  # Highlight the new segment
+        mode='lines',
+        showlegend=bool(click_data),
+        name=f"<span style='color:{PLOT_HIGHLIGHT_COLOR}'>New Segment</span>"
+    )
+
+def segment_trace(data: pd.DataFrame, plot_rows: dict, item: dict, visible: bool = True, render_mode: str = 'svg',
+                  row_bounds: tuple[int, int] = None):
+    """
+    Builds the trace of one annotation ('per_item' segment mode). row_bounds are its row positions when
+    already computed for many annotations at once (see annotation_row_bounds).
+    """
+    scatter_trace = go.Scattergl if render_mode == 'webgl' else go.Scatter
+    color = item['Color']
+    segment_name = f"Item {item['Item Number']}: {item.get('Label', 'Unknown trend')}"  # Use the label from the item for the trace name
+    if row_bounds is None:
+        segment = data.iloc[segment_plot_rows(plot_rows, item['Start Index'], item['End Index'])]
+    else:
+        segment = data.iloc[segment_rows_between(plot_rows, *row_bounds)]
+    return scatter_trace(
+        x=segment.index,
+        y=segment['close'],
+        line=dict(color=color, width=PLOT_ANNOTATED_WIDTH),  # Thicker annotated line
+        mode='lines',
+        visible=visible,
+        name=f"<span style='color:{color}'>{segment_name}</span>",  # Custom name with color
+    )
+
+def merged_segment_values(data: pd.DataFrame, plot_rows: dict, items: list[dict]) -> tuple[pd.DatetimeIndex, np.ndarray, np.ndarray]:
+    """
+    x, y and customdata of several segments drawn as one line: the segments are separated by a gap
+    (NaT/NaN point) and every point carries the item number of its segment.
+    """
+    position_chunks, item_chunks = [], []
+    start_positions, end_positions = annotation_row_bounds(plot_rows, items)
+    for item, start_position, end_position in zip(items, start_positions, end_positions):
+        positions = segment_rows_between(plot_rows, start_position, end_position)
+        if len(positions) == 0:
+            continue
+        position_chunks.extend([positions, [-1]])  # -1 marks the gap after the segment
+        item_chunks.extend([np.full(len(positions), item['Item Number'], dtype=object), [None]])
+    if not position_chunks:
+        return data.index[0:0], np.empty(0), np.empty(0, dtype=object)
+    positions = np.concatenate(position_chunks)[:-1].astype(np.int64)  # No gap after the last segment
+    gaps = positions < 0
+    rows = np.where(gaps, 0, positions)
+    close_values = data['close'].to_numpy(dtype=np.float64)
+    return data.index[rows].where(~gaps), np.where(gaps, np.nan, close_values[rows]), np.concatenate(item_chunks)[:-1]
+
+def merged_segment_trace_name(label_name: str, color: str, item_count: int) -> str:
+    return f"<span style='color:{color}'>{label_name} ({item_count} items)</span>"  # Custom name with color
+
+def merged_segment_trace(data: pd.DataFrame, plot_rows: dict, label_name: str, items: list[dict], visible: bool = True, render_mode: str = 'svg'):
+    """
+    Builds the single trace of every annotation of a label ('merged' segment mode): the trace count
+    stays O(labels), and the hover still tells the annotations apart through the item number in customdata.
+    """
+    scatter_trace = go.Scattergl if render_mode == 'webgl' else go.Scatter
+    color = items[0]['Color']
+    x, y, customdata = merged_segment_values(data, plot_rows, items)
+    return scatter_trace(
+        x=x,
+        y=y,
+        customdata=customdata,
+        hovertemplate=f"Item %{{customdata}}: {label_name}<br>%{{x}}<br>%{{y}}<extra></extra>",
+        connectgaps=False,
+        line=dict(color=color, width=PLOT_ANNOTATED_WIDTH),  # Thicker annotated line
+        mode='lines',
+        visible=visible,
+        name=merged_segment_trace_name(label_name, color, len(items)),
+    )
+
 def plot_with_plotly(data: pd.DataFrame, 
                      title: str, 
                      save_path: str = None, 
@@ -1457,7 +2358,13 @@ def plot_with_plotly(data: pd.DataFrame,
                      Title_Color: str = None,
                      labels_pipe_value: list[dict] = [],
                      existing_values: list[dict] = [],
-                     click_data:dict = None) -> go.Figure:
+                     click_data:dict = None,
+                     max_points: int = None,
+                     x_range: list = None,
+                     series_store=None,
+                     segment_mode: str = None,
+                     render_mode: str = None,
+                     annotation_index: AnnotationIndex = None) -> go.Figure:
     """
     Generates an interactive Plotly graph of a DataFrame with optional trend-based annotations 
     and display logic for segments.
@@ -1480,16 +2387,34 @@ def plot_with_plotly(data: pd.DataFrame,
                                     - 'Color': Color for the segment line.
     - click_data (dict): A dictionary containing the start and end indices of a newly selected segment 
                          (e.g., from interactive clicks on the graph).
+    - max_points (int): Point budget of the visible window. Defaults to settings.PLOT_MAX_POINTS.
+    - x_range (list): [start, end] dates of the zoomed window, drawn at full resolution when it fits
+                      in max_points. None to show the whole series.
+    - series_store (SeriesStore): Binary store of the same file (see open_plot_series_store), whose min/max
+                                  pyramid replaces the LTTB downsampling. Ignored if its rows don't match.
+    - segment_mode (str): 'per_item' (one trace and legend entry per annotation), 'merged' (one trace per label,
+                          segments separated by gaps, the item number shown on hover through customdata) or
+                          'auto' (merged from settings.PLOT_MERGE_SEGMENTS_MIN_ITEMS annotations on).
+                          Defaults to settings.PLOT_SEGMENT_MODE.
+    - render_mode (str): 'svg' (go.Scatter), 'webgl' (go.Scattergl) or 'auto' (WebGL when the base trace has more
+                         than settings.PLOT_WEBGL_THRESHOLD points). Defaults to settings.PLOT_RENDER_MODE.
+                         The mode used is reported in fig.layout.meta['render_mode'].
+    - annotation_index (AnnotationIndex): Interval index of existing_values (see get_annotations_with_index).
+                                          With x_range, only the annotations near the window are drawn.
 
     Returns:
     - go.Figure: The generated Plotly figure object.
 
     Features:
-    1. Plots the entire "close" column as a base line with a neutral gray color.
-    2. Adds annotations for existing segments (`existing_values`) with custom colors and labels.
+    1. Plots the "close" column as a base line with a neutral gray color, downsampled to the point budget with
+       the min/max pyramid or LTTB (see select_plot_positions), so the figure size stays bounded whatever the file size.
+    2. Adds annotations for existing segments (`existing_values`) with custom colors and labels, one trace per
+       annotation or one trace per label (see segment_mode), so thousands of auto-labeled ranges stay light.
        - Segments are only plotted if their corresponding `display` flag in `labels_pipe_value` is set to 1.
     3. Highlights newly selected segments (via `click_data`) with a green line overlay.
     4. Allows saving the plot to an HTML file and optional display.
+    5. Switches every trace to WebGL (go.Scattergl) for large point counts (see render_mode), so panning and
+       zooming stay interactive without thousands of SVG path nodes.
 
     Notes:
     - The function uses a clean white theme (`plotly_white`) with a dark background for better contrast.
@@ -1499,8 +2424,6 @@ def plot_with_plotly(data: pd.DataFrame,
     
     # Create the Plotly figure
     base_plot_color = '#808080'  # Neutral gray for the base plot (before '#4fa1ee')
-    highlight_color = 'yellow' #'green'    # Color for new segments (via click_data)
-    annotated_width = 4 # Annotation width for annotated segments
 
     fig = go.Figure(
         layout={
@@ -1562,62 +2485,73 @@ def plot_with_plotly(data: pd.DataFrame,
         ))
         return fig
 
-    def get_display_status(label_name):
-        for label_data in labels_pipe_value:
-            if label_data['value'] == label_name:
-                # Retrieve the display status (default to False if 'display' key is missing)
-                return label_data.get('display', 0) == 1
-        return False
-
-    def plot_segments(existing_values, data, color_override=None):
-        for item in existing_values:
-            start_time = item['Start Index']
-            end_time = item['End Index']
-            color = color_override if color_override else item['Color']
-            label_name = item.get('Label', 'Unknown trend')
-            segment_name = f"Item {item['Item Number']}: {label_name}"  # Use the label from the item for the trace name
-            display_status = get_display_status(label_name)  # Retrieve display status for this segment
-            # logger.info(f"Display value: {display_status}")
-            if display_status:
-                # Plot only the annotated segments (they'll overlay on the full plot)
-                segment = data.loc[start_time:end_time]
-                fig.add_trace(go.Scatter(
-                    x=segment.index,
-                    y=segment['close'],
-                    line=dict(color=color, width=annotated_width),  # Thicker annotated line
-                    mode='lines',
-                    name=f"<span style='color:{color}'>{segment_name}</span>",  # Custom name with color
-                ))
-            else:
-                logger.info(f"Skipping segment: {segment_name} due to display_status being set to 0")
-
-    # First, plot the entire "close" column as a base waveform
-    fig.add_trace(go.Scatter(
-        x=data.index,
-        y=data['close'],
+    # Rows actually sent to the browser: the zoomed window (if any) at full resolution when it fits the budget
+    plot_rows = compute_plot_rows(data, max_points, x_range, series_store)
+    if x_range:
+        fig.update_xaxes(range=list(x_range), autorange=False)
+    # WebGL traces for large point counts, the annotation overlays follow the base trace's mode
+    render_mode = resolve_render_mode(render_mode, len(plot_rows['positions']))
+    scatter_trace = go.Scattergl if render_mode == 'webgl' else go.Scatter
+
+    # Trace 0: the "close" column as a base waveform
+    base = data.iloc[plot_rows['positions']]
+    fig.add_trace(scatter_trace(
+        x=base.index,
+        y=base['close'],
         line=dict(color=base_plot_color),  # Default color for the entire line (before '#4fa1ee')
         mode='lines',
         # name='Default',  # Custom trace name
         name=f"<span style='color:{base_plot_color}'>{'Default'}</span>"  # Custom name with color
     ))
-    
-    if existing_values:
-        logger.info(f"In plot_with_plotly function, \n\t\t\trebuilding annotations from existing_values\n")
-        plot_segments(existing_values, data)
 
+    # Trace 1: the clicked segment, always present (empty without click_data) so it can be patched in place
     if click_data:
-        x1, x2 = sorted(click_data)
-        logger.info(f"In plot_segments function, \n\t\t\tif click_data = True ({click_data})\n")
-        # Plot the clicked segment (it will overlay the default line)
-        segment = data.loc[x1:x2]
-        fig.add_trace(go.Scatter(
-            x=segment.index, 
-            y=segment['close'], 
-            line=dict(color=highlight_color, width=annotated_width),  # Highlight the new segment
-            mode='lines',
-            name=f"<span style='color:{highlight_color}'>New Segment</span>"
-        ))
-        logger.info(f"\n\nThe [x1, x2] segment from click_data was updated.\n\n")
+        logger.info(f"In plot_with_plotly function, \n\t\t\tif click_data = True ({click_data})\n")
+    fig.add_trace(highlight_trace(data, plot_rows, click_data, render_mode))
+
+    # Traces 2+: the annotations, hidden labels included (visible=False) so toggling them is a restyle
+    trace_labels, trace_counts = [], []
+    segment_mode = resolve_segment_mode(segment_mode, len(existing_values or []))
+    if x_range and existing_values and annotation_index is not None and len(annotation_index) == len(existing_values):
+        # Zoomed in: only the annotations of the window, and of one window width on each side to pan into
+        # before the release re-renders, are drawn (the low resolution context spans the whole series)
+        if (annotation_index.tz or 'UTC') != (plot_rows['data_tz'] or 'UTC'):
+            # The index must read naive boundaries in the time zone of the window bounds
+            annotation_index = AnnotationIndex.from_annotations(existing_values, plot_rows['data_tz'])
+        window_start_ns, window_end_ns = (to_epoch_ns(bound, plot_rows['data_tz'] or 'UTC') for bound in x_range)
+        window_width_ns = window_end_ns - window_start_ns
+        visible_positions = annotation_index.overlapping(window_start_ns - window_width_ns, window_end_ns + window_width_ns)
+        logger.info(f"In plot_with_plotly function, {len(visible_positions)} of the {len(existing_values)} annotations overlap the x axis window.\n")
+        existing_values = [existing_values[position] for position in visible_positions]
+    if existing_values:
+        logger.info(f"In plot_with_plotly function, \n\t\t\trebuilding annotations from existing_values ({len(existing_values)} items, segment_mode: {segment_mode})\n")
+        if segment_mode == 'merged':
+            items_by_label = {}
+            for item in existing_values:
+                items_by_label.setdefault(item.get('Label', 'Unknown trend'), []).append(item)
+            for label_name, items in items_by_label.items():
+                fig.add_trace(merged_segment_trace(data, plot_rows, label_name, items,
+                                                   label_display_status(labels_pipe_value, label_name), render_mode))
+                trace_labels.append(label_name)
+                trace_counts.append(len(items))
+        else:
+            start_positions, end_positions = annotation_row_bounds(plot_rows, existing_values)
+            for item, start_position, end_position in zip(existing_values, start_positions, end_positions):
+                label_name = item.get('Label', 'Unknown trend')
+                fig.add_trace(segment_trace(data, plot_rows, item, label_display_status(labels_pipe_value, label_name), render_mode,
+                                            row_bounds=(start_position, end_position)))
+                trace_labels.append(label_name)
+                trace_counts.append(1)
+
+    # Everything update_graph needs to patch this figure instead of rebuilding it
+    fig.update_layout(meta={
+        'render_mode': render_mode,
+        'segment_mode': segment_mode,
+        'plotted_points': int(len(plot_rows['positions'])),
+        'rows': len(data),
+        'trace_labels': trace_labels,
+        'trace_counts': trace_counts,
+    })
 
     # Save the plot as an HTML file if a save path is provided
     if save_path:
@@ -16,7 +16,7 @@ from django.core.exceptions import PermissionDenied, TooManyFilesSent
 from datetime import datetime
 from .utils import (
     add_metadata_to_csv, get_directory_structure, get_directory_contents_for_event,
-    file_iterator
+    file_iterator, prepare_uploaded_series_file
 )
 from pathlib import Path
 import os
@@ -366,6 +366,9 @@ def upload_directory_view(request):
                     saved_path = default_storage.save(final_save_path_str, uploaded_file)
                     logger.info(f"Successfully saved '{original_intended_path_str}' to MEDIA_ROOT relative path: '{saved_path}'")
                     uploaded_files_count += 1
+                    # Never serve a previously parsed copy of a file that was just (re)written, and queue its chunked
+                    # ingest into its binary series store (in the background, not within this request)
+                    prepare_uploaded_series_file(saved_path, user_name=request.user.username)
                 except Exception as save_error:
                     logger.error(f"Error saving file '{original_intended_path_str}' to '{final_save_path_str}': {save_error}", exc_info=True)
                     save_errors.append(f"Save Error ({original_intended_path_str}): {save_error}")
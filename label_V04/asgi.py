@@ -9,6 +9,8 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 import logging
+import threading
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
@@ -18,6 +20,7 @@ from home.consumers import ECGConsumer
 from django_plotly_dash.consumers import MessageConsumer
 from django_plotly_dash.util import pipe_ws_endpoint_name
 from home.routing import websocket_urlpatterns # For if you later have many patterns the move them in .routing.py
+from home.utils import prewarm_model_registry
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'label_V04.settings')
 # Initialize Django ASGI application early to ensure the AppRegistry
@@ -27,6 +30,10 @@ django_asgi_app = get_asgi_application()
 # Get logger for the current file
 logger = logging.getLogger('home')
 
+# Load the auto labeling models in the background, so the first Auto-label click only runs the inference
+if getattr(settings, 'MODEL_REGISTRY_PREWARM', False):
+    threading.Thread(target=prewarm_model_registry, name='model-registry-prewarm', daemon=True).start()
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
@@ -29,6 +29,35 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 10*MAX_UPLOAD_SIZE_BYTES # Or slightly larger
 FILE_UPLOAD_MAX_MEMORY_SIZE = MAX_UPLOAD_SIZE_BYTES # Or slightly larger
 DATA_UPLOAD_MAX_NUMBER_FILES = 1000 # Allow up to 1000 files in one upload
 
+# In-memory cache of parsed time-series DataFrames (see home/series_cache.py)
+SERIES_CACHE_MAX_BYTES = int(os.environ.get('SERIES_CACHE_MAX_BYTES', 512 * 1024 * 1024)) # 512MB per process by default
+# Binary series store (see home/series_store.py)
+SERIES_INGEST_CHUNK_ROWS = 1_000_000 # Rows parsed per chunk by the streaming CSV ingest
+SERIES_STREAMING_INGEST_MIN_BYTES = 256 * 1024 * 1024 # CSV files from this size are never parsed in one go
+SERIES_OVERVIEW_COLUMNS = ['close'] # Columns getting a min/max pyramid (2x, 4x, 8x, ... decimation levels)
+SERIES_PYRAMID_MIN_BUCKETS = 512 # Coarsest pyramid level kept, in buckets (each bucket plots as 2 points)
+PLOT_MAX_POINTS = 5000 # Points of the base trace sent to the browser for the visible window (LTTB downsampling)
+PLOT_SEGMENT_MODE = 'auto' # Annotation traces: 'per_item', 'merged' (one trace per label) or 'auto'
+PLOT_MERGE_SEGMENTS_MIN_ITEMS = 50 # In 'auto' mode, annotations are merged per label from this many items on
+PLOT_RENDER_MODE = 'auto' # Trace renderer: 'svg' (go.Scatter), 'webgl' (go.Scattergl) or 'auto'
+PLOT_WEBGL_THRESHOLD = 4000 # In 'auto' mode, WebGL is used above this many points in the base trace (below PLOT_MAX_POINTS)
+ANNOTATION_JOURNAL_COMPACT_IDLE_SECONDS = 30 # Annotation edits are journaled, the working CSV file is rewritten once idle for this long
+ANNOTATION_JOURNAL_COMPACT_OPS = 500 # ... or as soon as its journal holds this many operations
+ANNOTATION_FLUSH_INTERVAL_SECONDS = 120 # ... and at least this often while the user keeps editing
+ANNOTATION_JOURNAL_FSYNC = True # fsync journal appends and flushed CSV files, so no acknowledged edit is lost on a crash
+ANNOTATION_STATE_IDLE_SECONDS = 900 # In-memory annotation states of files not used for this long are evicted
+ANNOTATION_STATE_MAX_FILES = 64 # ... and at most this many are kept (least recently used clean ones evicted first)
+ANNOTATION_UNDO_DEPTH = 100 # Edits that can be undone (then redone) per file, while its annotation state is in memory
+SAVE_ALL_WORKERS = 8 # Threads copying the working CSV files modified since their last save on 'Save All'
+ANNOTATION_SAVE_MODE = os.environ.get('ANNOTATION_SAVE_MODE', 'copy') # 'copy' or 'snapshot' (content-addressed store, Saving_Folder files hardlinked to it)
+ANNOTATION_BACKEND = os.environ.get('ANNOTATION_BACKEND', 'csv') # 'csv' (working CSV files) or 'database' (home.models, CSV files become exports)
+MODEL_REGISTRY_MAX_BYTES = int(os.environ.get('MODEL_REGISTRY_MAX_BYTES', 256 * 1024 * 1024)) # Auto labeling models kept loaded per process (see home/model_registry.py)
+MODEL_REGISTRY_PREWARM = os.environ.get('MODEL_REGISTRY_PREWARM', '1') == '1' # Load the models of _Models_List.csv when the ASGI server starts
+AUTO_LABEL_WORKERS = int(os.environ.get('AUTO_LABEL_WORKERS', min(4, os.cpu_count() or 1))) # Processes auto labeling a whole folder (each loads the model once, see run_auto_labeling_batch)
+AUTO_LABEL_JOB_BROKER = os.environ.get('AUTO_LABEL_JOB_BROKER', 'redis') # Auto labeling job queue: 'redis' (REDIS_HOST/PORT/DB below) or 'inprocess' (tests, single process)
+AUTO_LABEL_JOB_WORKER_THREADS = int(os.environ.get('AUTO_LABEL_JOB_WORKER_THREADS', 1)) # Threads of the web server running queued jobs (0: only `manage.py auto_label_worker` processes)
+AUTO_LABEL_JOB_TTL_SECONDS = 24 * 3600 # Job statuses and cached predictions are kept this long
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 